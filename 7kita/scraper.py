@@ -1,11 +1,23 @@
 from pathlib import Path
 from typing import List, Dict, Optional
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright
 import re
 
+from common.browser_pool import acquire_context
+from common.html_text import parse_tables
+from common.http_session import get_client
+from common.price_cache import SavedFiles
+
 SEVEN_KITA_URL = "https://7kitadagitim.com/index.php/utts/fiyat/"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
 
 def _ensure_cookie_accepted(page) -> None:
 	try:
@@ -87,6 +99,22 @@ def _extract_all_rows(page) -> List[CityPriceRow]:
 			header_labels.append(_normalize_header_label(header_cells.nth(i).inner_text()))
 		except Exception:
 			header_labels.append("")
+	rows = table.locator("tbody tr")
+	body_rows: List[List[str]] = []
+	for r in range(rows.count()):
+		tds = rows.nth(r).locator("td")
+		cells: List[str] = []
+		for c in range(tds.count()):
+			try:
+				cells.append(tds.nth(c).inner_text().replace("\xa0", " ").strip())
+			except Exception:
+				cells.append("")
+		body_rows.append(cells)
+	return _rows_from_cells(header_labels, body_rows)
+
+
+def _rows_from_cells(header_labels: List[str], body_rows: List[List[str]]) -> List[CityPriceRow]:
+	"""Build city rows from the normalized header labels and the cell texts of each body row."""
 	# Identify city column index (prefer 'İl' or 'Şehir') then fallback 0
 	city_idx = 0
 	for idx, lbl in enumerate(header_labels):
@@ -94,25 +122,18 @@ def _extract_all_rows(page) -> List[CityPriceRow]:
 			city_idx = idx
 			break
 	# Collect rows
-	rows = table.locator("tbody tr")
-	rc = rows.count()
 	results: List[CityPriceRow] = []
 	skip_labels = {"Tarih"}
-	for r in range(rc):
-		tr = rows.nth(r)
-		tds = tr.locator("td")
-		if tds.count() == 0:
+	for tds in body_rows:
+		if not tds:
 			continue
 		def cell(idx: int) -> str:
-			try:
-				return tds.nth(idx).inner_text().replace("\xa0", " ").strip()
-			except Exception:
-				return ""
+			return tds[idx] if idx < len(tds) else ""
 		city = cell(city_idx)
 		if not city or city.upper() in {"IL", "İL"}:
 			continue
 		values: Dict[str, str] = {}
-		for c in range(tds.count()):
+		for c in range(len(tds)):
 			if c == city_idx:
 				continue
 			lbl = header_labels[c] if c < len(header_labels) else f"C{c}"
@@ -127,6 +148,49 @@ def _extract_all_rows(page) -> List[CityPriceRow]:
 	return results
 
 
+def _fetch_rows_http(url: str) -> List[CityPriceRow]:
+	"""wpDataTables renders the whole table into the page HTML, so a plain GET is usually enough; [] if not."""
+	try:
+		resp = get_client().get(url, headers={"Accept": "text/html,application/xhtml+xml"})
+	except Exception:
+		return []
+	if not resp.ok:
+		return []
+	tables = parse_tables(resp.text())
+	# Same preference as the browser path: #table_1, else the first wpDataTable with at least 5 rows
+	candidates = [t for t in tables if t["attrs"].get("id") == "table_1"] or [t for t in tables if "wpDataTable" in (t["attrs"].get("class") or "").split()]
+	if not candidates:
+		return []
+	table = next((t for t in candidates if len(t["rows"]) >= 5), candidates[0])
+	return _rows_from_cells([_normalize_header_label(h) for h in table["head"]], table["rows"])
+
+
+def _load_rows(url: str, debug: bool = False) -> List[CityPriceRow]:
+	"""All city rows: over plain HTTP when the table is in the HTML, else from a rendered page."""
+	if not debug:
+		rows = _fetch_rows_http(url)
+		if rows:
+			return rows
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context:
+		page = context.new_page()
+		page.set_default_navigation_timeout(45000)
+		page.goto(url, wait_until="domcontentloaded")
+		try:
+			page.wait_for_load_state("networkidle", timeout=8000)
+		except Exception:
+			pass
+		_ensure_cookie_accepted(page)
+		# Wait table present
+		try:
+			page.wait_for_function(
+				"() => (document.querySelectorAll('#table_1 tbody tr').length || document.querySelectorAll('table.wpDataTable tbody tr').length) > 0",
+				timeout=15000
+			)
+		except Exception:
+			pass
+		return _extract_all_rows(page)
+
+
 def _write_city_file(row: CityPriceRow, output_file: Path) -> None:
 	lines: List[str] = []
 	lines.append(row.city)
@@ -147,80 +211,31 @@ def _write_city_file(row: CityPriceRow, output_file: Path) -> None:
 
 def save_all_cities_prices_txt(output_dir: Path, url: str = SEVEN_KITA_URL, debug: bool = False) -> List[Path]:
 	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
-		# Wait table present
-		try:
-			page.wait_for_function(
-				"() => (document.querySelectorAll('#table_1 tbody tr').length || document.querySelectorAll('table.wpDataTable tbody tr').length) > 0",
-				timeout=15000
-			)
-		except Exception:
-			pass
-		rows = _extract_all_rows(page)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		for r in rows:
-			fp = output_dir / f"7kita_{_safe_city_for_filename(r.city)}_prices.txt"
-			_write_city_file(r, fp)
-			saved.append(fp)
-		browser.close()
-	return saved
+	rows = _load_rows(url, debug=debug)
+	output_dir.mkdir(parents=True, exist_ok=True)
+	for r in rows:
+		fp = output_dir / f"7kita_{_safe_city_for_filename(r.city)}_prices.txt"
+		_write_city_file(r, fp)
+		saved.append(fp)
+	# The whole table comes from one response, so every city in it is written
+	return SavedFiles(saved)
 
 
 def save_city_prices_txt(city_name: str, output_dir: Path, url: str = SEVEN_KITA_URL, debug: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
-		try:
-			page.wait_for_selector("table tbody tr", timeout=12000)
-		except Exception:
-			pass
-		rows = _extract_all_rows(page)
-		target: Optional[CityPriceRow] = None
+	rows = _load_rows(url, debug=debug)
+	target: Optional[CityPriceRow] = None
+	for r in rows:
+		if (r.city or "").strip().upper() == city_name.strip().upper():
+			target = r
+			break
+	if target is None:
 		for r in rows:
-			if (r.city or "").strip().upper() == city_name.strip().upper():
+			if city_name.strip().upper() in (r.city or "").strip().upper():
 				target = r
 				break
-		if target is None:
-			for r in rows:
-				if city_name.strip().upper() in (r.city or "").strip().upper():
-					target = r
-					break
-		if target is None:
-			raise RuntimeError(f"Şehir bulunamadı: {city_name}")
-		output_dir.mkdir(parents=True, exist_ok=True)
-		fp = output_dir / f"7kita_{_safe_city_for_filename(target.city)}_prices.txt"
-		_write_city_file(target, fp)
-		browser.close()
-		return fp
-
-
+	if target is None:
+		raise RuntimeError(f"Şehir bulunamadı: {city_name}")
+	output_dir.mkdir(parents=True, exist_ok=True)
+	fp = output_dir / f"7kita_{_safe_city_for_filename(target.city)}_prices.txt"
+	_write_city_file(target, fp)
+	return fp
@@ -1,13 +1,25 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from playwright.sync_api import TimeoutError as PWTimeoutError
 import re
 import time
 import random
 
+from common.browser_pool import acquire_context
+from common.file_writer import BackgroundWriter, write_file
+from common.price_cache import SavedFiles
+
 ALPET_URL = "https://www.alpet.com.tr/tr-TR/akaryakit-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
 
 def _ensure_cookie_accepted(page) -> None:
 	try:
@@ -19,11 +31,11 @@ def _ensure_cookie_accepted(page) -> None:
 		pass
 
 
+_FILENAME_TR = str.maketrans({"İ": "I", "ı": "i", "Ş": "S", "ş": "s", "Ğ": "G", "ğ": "g", "Ü": "U", "ü": "u", "Ö": "O", "ö": "o", "Ç": "C", "ç": "c", "-": "_", " ": "_"})
+
+
 def _normalize_city_name(city_name: str) -> str:
-	replacements = {"İ": "I", "ı": "i", "Ş": "S", "ş": "s", "Ğ": "G", "ğ": "g", "Ü": "U", "ü": "u", "Ö": "O", "ö": "o", "Ç": "C", "ç": "c", "-": "_", " ": "_"}
-	n = city_name
-	for src, dst in replacements.items():
-		n = n.replace(src, dst)
+	n = city_name.translate(_FILENAME_TR)
 	return re.sub(r"[^A-Z0-9_]", "", n.upper())
 
 
@@ -82,7 +94,7 @@ def _extract_prices_from_table(page) -> List[AlpetPriceRow]:
 	return results
 
 
-def _write_file(city_name: str, prices: List[AlpetPriceRow], output_file: Path) -> None:
+def _write_file(city_name: str, prices: List[AlpetPriceRow], output_file: Path, writer: Optional[BackgroundWriter] = None) -> None:
 	if not prices:
 		return
 	labels = ["Motorin", "Motorin Performans +", "95 Oktan Kurşunsuz", "Fuel Oil 4", "Fuel Oil 3", "Fuel Oil 6(Yüksek kükürt)"]
@@ -92,7 +104,7 @@ def _write_file(city_name: str, prices: List[AlpetPriceRow], output_file: Path)
 		if parts:
 			lines.append(f"{p.district}: {', '.join(parts)}")
 	if lines:
-		output_file.write_text("\n".join(lines), encoding="utf-8")
+		write_file(output_file, "\n".join(lines).encode("utf-8"), writer)
 
 
 def _select_and_get_prices(page, select_handle, city_value: str) -> List[AlpetPriceRow]:
@@ -114,14 +126,7 @@ def _select_and_get_prices(page, select_handle, city_value: str) -> List[AlpetPr
 		return []
 
 
-def _init_page(browser, url: str):
-	context = browser.new_context(
-		user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-		locale="tr-TR",
-		timezone_id="Europe/Istanbul",
-		viewport={"width": 1280, "height": 900},
-		ignore_https_errors=True,
-	)
+def _init_page(context, url: str):
 	page = context.new_page()
 	page.set_default_navigation_timeout(45000)
 	page.goto(url, wait_until="domcontentloaded")
@@ -135,9 +140,8 @@ def _init_page(browser, url: str):
 
 
 def save_city_prices_txt(city_name: str, output_dir: Path, url: str = ALPET_URL, debug: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		page = _init_page(browser, url)
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context:
+		page = _init_page(context, url)
 		city_select = _get_city_select(page)
 		if not city_select:
 			raise RuntimeError("Şehir seçimi için select bulunamadı.")
@@ -151,21 +155,18 @@ def save_city_prices_txt(city_name: str, output_dir: Path, url: str = ALPET_URL,
 		output_dir.mkdir(parents=True, exist_ok=True)
 		output_file = output_dir / f"alpet_{_normalize_city_name(city_name)}_prices.txt"
 		_write_file(city_name, prices, output_file)
-		browser.close()
 		return output_file
 
 
 def save_all_cities_prices_txt(output_dir: Path, url: str = ALPET_URL, debug: bool = False, min_delay: float = 0.8, max_delay: float = 1.6) -> List[Path]:
 	output_dir.mkdir(parents=True, exist_ok=True)
-	saved_files = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		page = _init_page(browser, url)
+	saved_files = SavedFiles()
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context, BackgroundWriter() as writer:
+		page = _init_page(context, url)
 		city_select = _get_city_select(page)
 		if not city_select:
 			if debug:
 				page.screenshot(path=str(output_dir / "debug_no_select.png"))
-			browser.close()
 			return saved_files
 		options = city_select.evaluate("""s => Array.from(s.options).map(o => ({ value: o.value, text: (o.textContent||'').trim() })).filter(o => o.value && o.text !== 'Tüm Şehirler')""")
 		print(f"Alpet: {len(options)} şehir bulundu.")
@@ -184,23 +185,25 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = ALPET_URL, debug: bo
 				page.wait_for_timeout(1000)
 				city_select = _get_city_select(page)
 				if not city_select:
+					saved_files.failed.append(city_text)
 					print(f"  ⚠ Select bulunamadı: {city_text}")
 					continue
 				prices = _select_and_get_prices(page, city_select, city_value)
 				if not prices:
+					saved_files.failed.append(city_text)
 					print(f"  ⚠ Fiyat alınamadı: {city_text}")
 					continue
 				print(f"  {len(prices)} ilçe için fiyat bulundu")
 				output_file = output_dir / f"alpet_{_normalize_city_name(city_text)}_prices.txt"
-				_write_file(city_text, prices, output_file)
+				_write_file(city_text, prices, output_file, writer)
 				saved_files.append(output_file)
 				print(f"  ✓ Kaydedildi: {output_file.name}")
 				time.sleep(random.uniform(min_delay, max_delay))
 			except Exception as e:
+				saved_files.failed.append(city_text)
 				print(f"  ✗ Hata: {city_text} -> {e}")
 				if debug:
 					import traceback
 					traceback.print_exc()
-		browser.close()
 	print(f"\nToplam {len(saved_files)} dosya yazıldı -> {output_dir}")
 	return saved_files
@@ -1,13 +1,23 @@
 from pathlib import Path
 from typing import List, Dict, Optional
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError, Page
+from playwright.sync_api import TimeoutError as PWTimeoutError, Page
 import random
 import re
+from common.browser_pool import acquire_context
 from common.istanbul_districts import get_istanbul_district_region, ISTANBUL_DISTRICT_REGIONS
+from common.price_cache import SavedFiles
 
 AYTEMIZ_URL = "https://www.aytemiz.com.tr/akaryakit-fiyatlari/benzin-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 800},
+	ignore_https_errors=True,
+)
+
 @dataclass
 class AytemizBenzinPriceRow:
 	"""Benzin price row for a city/district."""
@@ -244,15 +254,7 @@ def _fetch_all_lpg_prices_dict(debug: bool = False) -> Dict[str, List[AytemizLPG
 	After clicking the LPG button, extracts all LPG prices that are shown on the main page.
 	"""
 	all_lpg_prices: Dict[str, List[AytemizLPGPriceRow]] = {}
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 800},
-			ignore_https_errors=True,
-		)
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context:
 		page = context.new_page()
 		page.set_default_navigation_timeout(60000)
 
@@ -267,7 +269,6 @@ def _fetch_all_lpg_prices_dict(debug: bool = False) -> Dict[str, List[AytemizLPG
 		print("Clicking LPG button to switch to LPG prices...")
 		if not _click_lpg_button(page, debug):
 			print("Could not switch to LPG prices. Exiting LPG fetch.")
-			browser.close()
 			return {}
 
 		# Wait for LPG prices table to load after clicking the button
@@ -321,7 +322,6 @@ def _fetch_all_lpg_prices_dict(debug: bool = False) -> Dict[str, List[AytemizLPG
 					import traceback
 					traceback.print_exc()
 
-		browser.close()
 	return all_lpg_prices
 
 def _merge_lpg_for_single_city(
@@ -463,7 +463,7 @@ def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Pa
 	"""
 	output_dir.mkdir(parents=True, exist_ok=True)
 	
-	saved_files: List[Path] = []
+	saved_files = SavedFiles()
 	
 	try:
 		# Step 1: Fetch all LPG prices first (one browser session)
@@ -473,15 +473,7 @@ def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Pa
 		
 		# Step 2: Fetch benzin prices city by city and write files immediately
 		print("Fetching benzin prices and writing files...")
-		with sync_playwright() as p:
-			browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-			context = browser.new_context(
-				user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-				locale="tr-TR",
-				timezone_id="Europe/Istanbul",
-				viewport={"width": 1280, "height": 800},
-				ignore_https_errors=True,
-			)
+		with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context:
 			page = context.new_page()
 			page.set_default_navigation_timeout(60000)
 
@@ -515,13 +507,16 @@ def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Pa
 							saved_files.append(fp)
 							print(f"  Saved: {fp.name} ({len(merged_prices)} row(s))")
 						except Exception as e:
+							saved_files.failed.append(city_name)
 							print(f"  Error writing file for {city_name}: {e}")
 							if debug:
 								import traceback
 								traceback.print_exc()
 					else:
+						saved_files.failed.append(city_name)
 						print(f"  Warning: No Benzin prices found for {city_name}.")
 				except Exception as e:
+					saved_files.failed.append(city_name)
 					print(f"  Error fetching prices for {city_name}: {e}")
 					if debug:
 						import traceback
@@ -529,13 +524,13 @@ def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Pa
 
 				page.wait_for_timeout(random.uniform(500, 1500))
 
-			browser.close()
-		
 	except Exception as e:
 		print(f"Error in save_all_cities_prices_txt: {e}")
 		if debug:
 			import traceback
 			traceback.print_exc()
+		# The city list was not finished: hand back a plain list so the run is not reused
+		return list(saved_files)
 	
 	return saved_files
 
@@ -1,19 +1,31 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from playwright.sync_api import TimeoutError as PWTimeoutError
 import re
 import time
 import random
 
+from common.browser_pool import acquire_context
+from common.file_writer import BackgroundWriter, write_file
+from common.price_cache import SavedFiles
+
 BPET_URL = "https://www.bpet.com.tr/tr/akaryakit-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+
+_FILENAME_TR = str.maketrans({"İ": "I", "ı": "i", "Ş": "S", "ş": "s", "Ğ": "G", "ğ": "g", "Ü": "U", "ü": "u", "Ö": "O", "ö": "o", "Ç": "C", "ç": "c", "-": "_", " ": "_"})
+
 
 def _normalize_city_name(city_name: str) -> str:
-	replacements = {"İ": "I", "ı": "i", "Ş": "S", "ş": "s", "Ğ": "G", "ğ": "g", "Ü": "U", "ü": "u", "Ö": "O", "ö": "o", "Ç": "C", "ç": "c", "-": "_", " ": "_"}
-	n = city_name.replace("ISTANBUL_TRA", "ISTANBUL").replace("ISTANBUL_ANA", "ISTANBUL")
-	for src, dst in replacements.items():
-		n = n.replace(src, dst)
+	n = city_name.replace("ISTANBUL_TRA", "ISTANBUL").replace("ISTANBUL_ANA", "ISTANBUL").translate(_FILENAME_TR)
 	return re.sub(r"[^A-Z0-9_]", "", n.upper())
 
 
@@ -61,7 +73,7 @@ def _extract_prices_from_table(page) -> List[BpetPriceRow]:
 	return results
 
 
-def _write_file(city_name: str, prices: List[BpetPriceRow], output_file: Path) -> None:
+def _write_file(city_name: str, prices: List[BpetPriceRow], output_file: Path, writer: Optional[BackgroundWriter] = None) -> None:
 	if not prices:
 		return
 	labels = ["Motorin", "Motorin Diğer", "K.B. 95", "Gaz Yağı", "F.Oil", "Kalyak"]
@@ -71,7 +83,7 @@ def _write_file(city_name: str, prices: List[BpetPriceRow], output_file: Path) -
 		if parts:
 			lines.append(f"{p.district}: {', '.join(parts)}")
 	if lines:
-		output_file.write_text("\n".join(lines), encoding="utf-8")
+		write_file(output_file, "\n".join(lines).encode("utf-8"), writer)
 
 
 def _select_latest_date(page):
@@ -104,14 +116,7 @@ def _select_city(page, city_value: str):
 		page.wait_for_timeout(2000)
 
 
-def _init_page(browser, url: str):
-	context = browser.new_context(
-		user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-		locale="tr-TR",
-		timezone_id="Europe/Istanbul",
-		viewport={"width": 1280, "height": 900},
-		ignore_https_errors=True,
-	)
+def _init_page(context, url: str):
 	page = context.new_page()
 	page.set_default_navigation_timeout(45000)
 	page.goto(url, wait_until="domcontentloaded")
@@ -124,9 +129,8 @@ def _init_page(browser, url: str):
 
 
 def save_city_prices_txt(city_name: str, output_dir: Path, url: str = BPET_URL, debug: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		page = _init_page(browser, url)
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context:
+		page = _init_page(context, url)
 		_select_latest_date(page)
 		city_select = page.locator('select[name="il"]')
 		if city_select.count() == 0:
@@ -142,21 +146,18 @@ def save_city_prices_txt(city_name: str, output_dir: Path, url: str = BPET_URL,
 		output_dir.mkdir(parents=True, exist_ok=True)
 		output_file = output_dir / f"bpet_{_normalize_city_name(target['text'])}_prices.txt"
 		_write_file(target["text"], prices, output_file)
-		browser.close()
 		return output_file
 
 
 def save_all_cities_prices_txt(output_dir: Path, url: str = BPET_URL, debug: bool = False, min_delay: float = 0.8, max_delay: float = 1.6) -> List[Path]:
 	output_dir.mkdir(parents=True, exist_ok=True)
-	saved_files = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		page = _init_page(browser, url)
+	saved_files = SavedFiles()
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context, BackgroundWriter() as writer:
+		page = _init_page(context, url)
 		city_select = page.locator('select[name="il"]')
 		if city_select.count() == 0:
 			if debug:
 				page.screenshot(path=str(output_dir / "debug_no_select.png"))
-			browser.close()
 			return saved_files
 		
 		# Select latest date ONCE at the beginning
@@ -180,6 +181,7 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = BPET_URL, debug: boo
 				_select_city(page, city_value)
 				prices = _extract_prices_from_table(page)
 				if not prices:
+					saved_files.failed.append(city_text)
 					print(f"  ⚠ Fiyat alınamadı: {city_text}")
 					continue
 				print(f"  {len(prices)} ilçe için fiyat bulundu")
@@ -188,11 +190,12 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = BPET_URL, debug: boo
 					print(f"  → İstanbul birleştirilecek")
 				else:
 					output_file = output_dir / f"bpet_{_normalize_city_name(city_text)}_prices.txt"
-					_write_file(city_text, prices, output_file)
+					_write_file(city_text, prices, output_file, writer)
 					saved_files.append(output_file)
 					print(f"  ✓ Kaydedildi: {output_file.name}")
 				time.sleep(random.uniform(min_delay, max_delay))
 			except Exception as e:
+				saved_files.failed.append(city_text)
 				print(f"  ✗ Hata: {city_text} -> {e}")
 				if debug:
 					import traceback
@@ -206,10 +209,9 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = BPET_URL, debug: boo
 					seen.add(p.district.upper())
 					unique_prices.append(p)
 			output_file = output_dir / "bpet_ISTANBUL_prices.txt"
-			_write_file("ISTANBUL", unique_prices, output_file)
+			_write_file("ISTANBUL", unique_prices, output_file, writer)
 			saved_files.append(output_file)
 			print(f"\n✓ İstanbul birleştirildi: {output_file.name} ({len(unique_prices)} ilçe)")
 		
-		browser.close()
 	print(f"\nToplam {len(saved_files)} dosya yazıldı -> {output_dir}")
 	return saved_files
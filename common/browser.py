@@ -0,0 +1,153 @@
+"""
+Shared Playwright helpers used by the brand scrapers.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional
+import threading
+import time
+
+# Chromium flags for headless scraping: no GPU, no /dev/shm pressure, no background work or
+# browser-profile services (extensions, sync, translate). The sandbox and site isolation stay on.
+LAUNCH_ARGS: List[str] = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-accelerated-2d-canvas",
+    "--disable-background-networking",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-extensions",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=Translate",
+    "--mute-audio",
+    "--no-first-run",
+]
+
+# Resource types never needed to read a <select> or a price <td>.
+BLOCKED_RESOURCE_TYPES: FrozenSet[str] = frozenset({"image", "media", "font", "stylesheet"})
+# For pages whose visibility checks depend on CSS: keep stylesheets, drop the rest.
+MEDIA_RESOURCE_TYPES: FrozenSet[str] = frozenset({"image", "media", "font"})
+
+
+def block_heavy_resources(context, resource_types: FrozenSet[str] = BLOCKED_RESOURCE_TYPES) -> None:
+    """Abort requests of `resource_types` (default: image/media/font/stylesheet) for every page in the context."""
+    def _route(route) -> None:
+        if route.request.resource_type in resource_types:
+            route.abort()
+        else:
+            route.continue_()
+
+    context.route("**/*", _route)
+
+
+# Shared element scripts; pass them to `ElementHandle/Locator.evaluate` on a <select>.
+SELECT_OPTIONS_JS = "s => Array.from(s.options).map(o => ({ value: o.value, text: (o.textContent||'').trim() }))"
+SET_SELECT_VALUE_JS = "(el, val) => { el.value = val; el.dispatchEvent(new Event('input', { bubbles: true })); el.dispatchEvent(new Event('change', { bubbles: true })); }"
+
+
+# Analytics/ad beacons that only keep the network busy; dropped at the CDP layer.
+TRACKER_URL_PATTERNS: List[str] = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*facebook.net*",
+    "*hotjar.com*",
+    "*doubleclick.net*",
+    "*clarity.ms*",
+]
+
+
+def block_trackers(context, page) -> None:
+    """Block TRACKER_URL_PATTERNS for `page` via CDP, before the requests reach the route handler."""
+    try:
+        cdp = context.new_cdp_session(page)
+        cdp.send("Network.enable", {})
+        cdp.send("Network.setBlockedURLs", {"urls": TRACKER_URL_PATTERNS})
+    except Exception as e:
+        print(f"Warning: could not block tracker URLs: {e}")
+
+
+def goto_ready(page, url: str, ready_selector: Optional[str] = None, timeout_ms: float = 8000) -> None:
+    """Navigate to `url` and wait (at most `timeout_ms` after DOMContentLoaded) until it is usable.
+
+    With `ready_selector` the wait ends as soon as that element is attached instead of
+    sitting out the network-idle window; without it the page is given until networkidle.
+    A timeout is not an error: callers go on with whatever has rendered.
+    """
+    page.goto(url, wait_until="domcontentloaded")
+    try:
+        if ready_selector:
+            page.wait_for_selector(ready_selector, state="attached", timeout=timeout_ms)
+        else:
+            page.wait_for_load_state("networkidle", timeout=timeout_ms)
+    except Exception:
+        pass
+
+
+def wait_stable(
+    page,
+    predicate_js: str,
+    timeout_ms: float = 3000,
+    start_ms: float = 50,
+    max_ms: float = 1000,
+    factor: float = 1.6,
+) -> bool:
+    """Poll `predicate_js` with exponentially growing pauses instead of a fixed grace period.
+
+    Returns True as soon as the predicate holds, False if it still fails after `timeout_ms`.
+    """
+    deadline = time.monotonic() + timeout_ms / 1000
+    delay = start_ms
+    while True:
+        if page.evaluate(predicate_js):
+            return True
+        remaining = (deadline - time.monotonic()) * 1000
+        if remaining <= 0:
+            return False
+        page.wait_for_timeout(min(delay, max_ms, remaining))
+        delay *= factor
+
+
+def storage_state_path(output_dir: Path, brand: str) -> Path:
+    """Return where a brand's persisted cookies/localStorage live (output_dir/.cache/<brand>_state.json)."""
+    return output_dir / ".cache" / f"{brand}_state.json"
+
+
+def load_storage_state(state_file: Path) -> Optional[str]:
+    """Return the state file path for `new_context(storage_state=...)` if a previous run saved one."""
+    return str(state_file) if state_file.is_file() else None
+
+
+def save_storage_state(context, state_file: Path) -> None:
+    """Persist the context's cookies/localStorage so the next run starts with the cookie banner accepted."""
+    try:
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        context.storage_state(path=str(state_file))
+    except Exception as e:
+        print(f"Warning: could not save storage state to {state_file}: {e}")
+
+
+class StorageStateRecorder:
+    """Load a brand's saved storage state and save it again from the first context of a run.
+
+    Thread-safe: with several worker contexts only the first `record()` writes the file,
+    and nothing is written when a previous state was loaded.
+    """
+
+    def __init__(self, state_file: Path):
+        self.state_file = state_file
+        self.loaded = load_storage_state(state_file)
+        self._recorded = self.loaded is not None
+        self._lock = threading.Lock()
+
+    def context_kwargs(self, base: Dict[str, Any]) -> Dict[str, Any]:
+        """`base` plus `storage_state=` when a saved state exists."""
+        return {**base, "storage_state": self.loaded} if self.loaded else dict(base)
+
+    def record(self, context) -> None:
+        with self._lock:
+            if self._recorded:
+                return
+            self._recorded = True
+        save_storage_state(context, self.state_file)
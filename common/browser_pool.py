@@ -0,0 +1,115 @@
+"""
+Reuse one Chromium per thread across scraper runs instead of launching a new one each time.
+
+Starting `sync_playwright()` + `chromium.launch()` costs a few seconds before the
+first page loads. `acquire_context()` launches the browser lazily on first use and
+keeps it for later calls on the same thread (e.g. several providers in one process,
+or a long-running scheduler); only the BrowserContext is created and closed per use.
+
+Playwright's sync objects are thread-bound, so the pool is per thread. Worker threads
+must call `close_browser()` before they exit; the main thread's browser is closed at exit.
+The browser is relaunched after `BROWSER_POOL_RECYCLE_AFTER` contexts to cap native
+memory growth.
+
+When `common.browser_server.shared_browser()` is running (its endpoint is in the
+environment), headless threads attach to that Chromium over CDP instead of launching.
+"""
+
+from contextlib import contextmanager
+from typing import FrozenSet, Iterator, Optional, Union
+import atexit
+import os
+import threading
+
+from playwright.sync_api import sync_playwright
+
+from common.browser import LAUNCH_ARGS, block_heavy_resources
+from common.browser_server import BROWSER_CDP_ENDPOINT_ENV
+
+BROWSER_POOL_RECYCLE_AFTER = int(os.environ.get("BROWSER_POOL_RECYCLE_AFTER", "100"))
+
+_local = threading.local()
+
+
+class _PooledBrowser:
+    def __init__(self, debug: bool):
+        self.debug = debug
+        self.contexts_served = 0
+        self.playwright = sync_playwright().start()
+        endpoint = None if debug else os.environ.get(BROWSER_CDP_ENDPOINT_ENV)
+        self.browser = None
+        try:
+            if endpoint:
+                # Closing a CDP-connected browser only disconnects; the shared Chromium stays up
+                try:
+                    self.browser = self.playwright.chromium.connect_over_cdp(endpoint)
+                except Exception as e:
+                    print(f"Warning: could not attach to shared browser, launching one: {e}")
+            if self.browser is None:
+                self.browser = self.playwright.chromium.launch(
+                    headless=not debug, slow_mo=400 if debug else 0, args=LAUNCH_ARGS
+                )
+        except Exception:
+            self.playwright.stop()
+            raise
+
+    def usable(self, debug: bool) -> bool:
+        return (
+            self.debug == debug
+            and self.contexts_served < BROWSER_POOL_RECYCLE_AFTER
+            and self.browser.is_connected()
+        )
+
+    def close(self) -> None:
+        try:
+            self.browser.close()
+        except Exception:
+            pass
+        try:
+            self.playwright.stop()
+        except Exception:
+            pass
+
+
+def _get_browser(debug: bool) -> _PooledBrowser:
+    pooled: Optional[_PooledBrowser] = getattr(_local, "pooled", None)
+    if pooled is not None and not pooled.usable(debug):
+        pooled.close()
+        pooled = None
+    if pooled is None:
+        pooled = _PooledBrowser(debug)
+        _local.pooled = pooled
+    return pooled
+
+
+@contextmanager
+def acquire_context(debug: bool = False, block_resources: Union[bool, FrozenSet[str]] = True, **context_kwargs) -> Iterator:
+    """Yield a fresh BrowserContext on this thread's pooled Chromium; the context is closed afterwards.
+
+    `block_resources` is True for the default blocked types, or a set of resource types to block.
+    """
+    pooled = _get_browser(debug)
+    context = pooled.browser.new_context(**context_kwargs)
+    pooled.contexts_served += 1
+    try:
+        if isinstance(block_resources, frozenset):
+            block_heavy_resources(context, block_resources)
+        elif block_resources:
+            block_heavy_resources(context)
+        yield context
+    finally:
+        try:
+            context.close()
+        except Exception:
+            pass
+
+
+def close_browser() -> None:
+    """Shut down this thread's pooled browser, if any."""
+    pooled: Optional[_PooledBrowser] = getattr(_local, "pooled", None)
+    if pooled is not None:
+        _local.pooled = None
+        pooled.close()
+
+
+atexit.register(close_browser)
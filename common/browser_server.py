@@ -0,0 +1,67 @@
+"""
+One Chromium shared by several scraper processes.
+
+`common.runner` runs each brand in its own process, and every process used to launch
+its own Chromium. `shared_browser()` launches a single Chromium with a DevTools port,
+and exports its endpoint in BROWSER_CDP_ENDPOINT_ENV; `common.browser_pool` then
+attaches to it with `connect_over_cdp` instead of launching, so child processes (and
+their worker threads) only open contexts on the shared browser.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+import os
+import shutil
+import tempfile
+import time
+
+from playwright.sync_api import sync_playwright
+
+from common.browser import LAUNCH_ARGS
+
+BROWSER_CDP_ENDPOINT_ENV = "FUEL_BROWSER_CDP_ENDPOINT"
+
+
+def _read_endpoint(user_data_dir: Path, timeout: float = 10.0) -> str:
+    """Chromium writes the port picked for --remote-debugging-port=0 to DevToolsActivePort."""
+    port_file = user_data_dir / "DevToolsActivePort"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            port = port_file.read_text(encoding="utf-8").splitlines()[0].strip()
+        except (OSError, IndexError):
+            port = ""
+        if port:
+            return f"http://127.0.0.1:{port}"
+        time.sleep(0.05)
+    raise RuntimeError("Shared browser did not report its DevTools port")
+
+
+@contextmanager
+def shared_browser() -> Iterator[str]:
+    """Launch the shared headless Chromium and yield its CDP endpoint.
+
+    While open, the endpoint is exported in the environment so processes started
+    inside the block attach to it; the browser is shut down on exit.
+    """
+    user_data_dir = Path(tempfile.mkdtemp(prefix="fuel_browser_"))
+    playwright = sync_playwright().start()
+    previous = os.environ.get(BROWSER_CDP_ENDPOINT_ENV)
+    try:
+        context = playwright.chromium.launch_persistent_context(
+            str(user_data_dir), headless=True, args=[*LAUNCH_ARGS, "--remote-debugging-port=0"]
+        )
+        try:
+            endpoint = _read_endpoint(user_data_dir)
+            os.environ[BROWSER_CDP_ENDPOINT_ENV] = endpoint
+            yield endpoint
+        finally:
+            if previous is None:
+                os.environ.pop(BROWSER_CDP_ENDPOINT_ENV, None)
+            else:
+                os.environ[BROWSER_CDP_ENDPOINT_ENV] = previous
+            context.close()
+    finally:
+        playwright.stop()
+        shutil.rmtree(user_data_dir, ignore_errors=True)
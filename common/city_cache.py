@@ -0,0 +1,48 @@
+"""
+Local cache for a brand's city <select> options.
+
+The city lists change at most a couple of times a year, so a warm run can skip
+the page load that only exists to read them. Entries live next to the storage
+state in output_dir/.cache/<brand>_cities.json and are tied to the page URL.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import time
+
+CITY_CACHE_MAX_AGE = 30 * 24 * 3600  # seconds
+
+
+def city_cache_path(output_dir: Path, brand: str) -> Path:
+    return output_dir / ".cache" / f"{brand}_cities.json"
+
+
+def load_cached_cities(cache_file: Path, url: str, max_age: float = CITY_CACHE_MAX_AGE) -> Optional[List[Dict[str, str]]]:
+    """Return the cached options for `url`, or None if missing, expired or unreadable."""
+    try:
+        data = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if data.get("url") != url or time.time() - data.get("fetched", 0) > max_age:
+        return None
+    cities = data.get("cities")
+    return cities or None
+
+
+def save_cached_cities(cache_file: Path, url: str, cities: List[Dict[str, str]]) -> None:
+    if not cities:
+        return
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"url": url, "fetched": time.time(), "cities": cities}
+        cache_file.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    except OSError as e:
+        print(f"Warning: could not write city cache {cache_file}: {e}")
+
+
+def invalidate_cached_cities(cache_file: Path) -> None:
+    try:
+        cache_file.unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,79 @@
+"""
+Deferred writing of the per-city output files.
+
+Scrape loops collect `(path, bytes)` pairs instead of writing each tiny file on the
+critical path; `write_files` then writes them all together. open/write/close release
+the GIL, so a small thread pool overlaps the syscalls of independent files.
+
+Loops that should not hold every file until the end hand them to a `BackgroundWriter`
+instead: one thread writes each file while the page loop moves on to the next city.
+Helpers that are called both with and without a writer go through `write_file`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+import os
+import queue
+import threading
+
+WRITE_WORKERS = 8
+
+
+def write_files(pending: Sequence[Tuple[Path, bytes]], max_workers: int = WRITE_WORKERS) -> None:
+    """Write every `(path, data)` pair; raises the first error after all writes have run."""
+    if len(pending) <= 1:
+        for path, data in pending:
+            path.write_bytes(data)
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as ex:
+        list(ex.map(lambda item: item[0].write_bytes(item[1]), pending))
+
+
+def write_file(path: Path, data: bytes, writer: Optional["BackgroundWriter"] = None) -> None:
+    """Write one file now, or queue it on `writer` when the caller runs one."""
+    if writer is not None:
+        writer.write(path, data)
+    else:
+        path.write_bytes(data)
+
+
+class BackgroundWriter:
+    """Write `(path, data)` pairs on one background thread; use as a context manager.
+
+    Each file is written to a temporary sibling and moved into place, so readers never
+    see a half-written price file. Leaving the block waits for every queued write and
+    raises the first error.
+    """
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[Optional[Tuple[Path, bytes]]]" = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._drain, name="file-writer", daemon=True)
+
+    def __enter__(self) -> "BackgroundWriter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None and exc[0] is None:
+            raise self._error
+
+    def write(self, path: Path, data: bytes) -> None:
+        self._queue.put((path, data))
+
+    def _drain(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, data = item
+            tmp = path.with_name(path.name + ".tmp")
+            try:
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            except OSError as e:
+                if self._error is None:
+                    self._error = e
@@ -0,0 +1,183 @@
+"""
+Minimal stdlib HTML readers for pages fetched without a browser.
+
+Only what the scrapers need: the header and body rows of every <table> (plus the
+bold `<span><b>` text of each body cell), the text of every <li>, and the fields of
+every <form>. Cell text is whitespace-collapsed
+(non-breaking spaces included), which is what the browser's innerText gives for
+these simple cells.
+"""
+
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+
+def _clean(parts: List[str]) -> str:
+    return " ".join("".join(parts).replace("\xa0", " ").split())
+
+
+class _TableParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.tables: List[Dict] = []
+        self.items: List[str] = []
+        self._stack: List[Dict] = []  # open tables (nested tables are kept separate)
+        self._section = ""  # "thead" / "tbody" / "tfoot"; rows outside any section count as body rows
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+        self._bold_row: Optional[List[str]] = None
+        self._bold: Optional[List[str]] = None  # text of the cell's first <b> inside a <span>, while open
+        self._cell_bold = ""
+        self._span_depth = 0
+        self._li: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            table = {"attrs": dict(attrs), "head": [], "rows": [], "bold": []}
+            self.tables.append(table)
+            self._stack.append(table)
+            self._section = ""
+        elif tag in ("thead", "tbody", "tfoot") and self._stack:
+            self._section = tag
+        elif tag == "tr" and self._stack and self._section != "tfoot":
+            self._row = []
+            self._bold_row = []
+        elif (tag == "td" or (tag == "th" and self._section == "thead")) and self._row is not None:
+            self._cell = []
+            self._cell_bold = ""
+            self._span_depth = 0
+        elif tag == "span" and self._cell is not None:
+            self._span_depth += 1
+        elif tag == "b" and self._cell is not None and self._span_depth and self._bold is None and not self._cell_bold:
+            self._bold = []
+        elif tag == "li":
+            self._li = []
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self._stack:
+            self._stack.pop()
+            self._section = ""
+        elif tag in ("thead", "tbody", "tfoot"):
+            self._section = ""
+        elif tag == "tr" and self._row is not None:
+            if self._section == "thead":
+                self._stack[-1]["head"].extend(self._row)
+            else:
+                self._stack[-1]["rows"].append(self._row)
+                self._stack[-1]["bold"].append(self._bold_row)
+            self._row = None
+            self._bold_row = None
+        elif tag in ("td", "th") and self._cell is not None and self._row is not None:
+            self._row.append(_clean(self._cell))
+            if self._bold is not None:
+                self._cell_bold = _clean(self._bold)
+                self._bold = None
+            self._bold_row.append(self._cell_bold)
+            self._cell = None
+        elif tag == "span" and self._cell is not None and self._span_depth:
+            self._span_depth -= 1
+        elif tag == "b" and self._bold is not None:
+            self._cell_bold = _clean(self._bold)
+            self._bold = None
+        elif tag == "li" and self._li is not None:
+            self.items.append(_clean(self._li))
+            self._li = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+        if self._bold is not None:
+            self._bold.append(data)
+        if self._li is not None:
+            self._li.append(data)
+
+
+def parse_tables(html: str) -> List[Dict]:
+    """Return `{"attrs", "head", "rows", "bold"}` per <table>: thead cell texts and the <td> texts of each body row.
+
+    `bold` is parallel to `rows`: per cell, the text of its first <b> inside a <span>
+    (what `td.querySelector('span b')` finds in the browser), or "" when there is none.
+    """
+    parser = _TableParser()
+    parser.feed(html)
+    parser.close()
+    return parser.tables
+
+
+def parse_list_items(html: str) -> List[str]:
+    """Return the text of every <li> in document order."""
+    parser = _TableParser()
+    parser.feed(html)
+    parser.close()
+    return parser.items
+
+
+class _FormParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.forms: List[Dict] = []
+        self._form: Optional[Dict] = None
+        self._select: Optional[Tuple[str, List[Dict[str, str]]]] = None
+        self._selected: Optional[str] = None
+        self._option: Optional[Dict] = None
+
+    def _close_option(self) -> None:
+        if self._option is not None and self._select is not None:
+            text = _clean(self._option.pop("parts"))
+            if self._option["value"] is None:
+                self._option["value"] = text
+            self._select[1].append({"value": self._option["value"], "text": text})
+        self._option = None
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "form":
+            self._form = {"attrs": a, "fields": [], "selects": {}}
+            self.forms.append(self._form)
+        elif self._form is None:
+            return
+        elif tag == "input" and a.get("name"):
+            kind = (a.get("type") or "text").lower()
+            if kind in ("submit", "button", "image", "reset", "file"):
+                return
+            if kind in ("checkbox", "radio") and "checked" not in a:
+                return
+            self._form["fields"].append((a["name"], a.get("value") or ""))
+        elif tag == "select":
+            self._select = (a.get("name") or "", [])
+            self._selected = None
+        elif tag == "option" and self._select is not None:
+            self._close_option()
+            self._option = {"value": a.get("value"), "parts": []}
+            if "selected" in a:
+                self._selected = a.get("value")
+
+    def handle_endtag(self, tag):
+        if tag == "option":
+            self._close_option()
+        elif tag == "select" and self._select is not None:
+            self._close_option()
+            name, options = self._select
+            if name and self._form is not None:
+                self._form["selects"][name] = options
+                value = self._selected if self._selected is not None else (options[0]["value"] if options else "")
+                self._form["fields"].append((name, value))
+            self._select = None
+        elif tag == "form":
+            self._form = None
+
+    def handle_data(self, data):
+        if self._option is not None:
+            self._option["parts"].append(data)
+
+
+def parse_forms(html: str) -> List[Dict]:
+    """Return `{"attrs", "fields", "selects"}` per <form>.
+
+    `fields` are the `(name, value)` pairs the form would submit as-is (in document order);
+    `selects` maps each <select> name to its `[{"value", "text"}, ...]` options.
+    """
+    parser = _FormParser()
+    parser.feed(html)
+    parser.close()
+    return parser.forms
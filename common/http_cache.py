@@ -0,0 +1,72 @@
+"""
+On-disk cache for GET responses of endpoints that change a few times a day at most.
+
+A cached response younger than the TTL is returned without touching the network.
+Older entries are revalidated with If-None-Match / If-Modified-Since; a 304 reuses
+the stored body and restarts the TTL. Entries live under output_dir/.cache/.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
+import json
+import time
+
+from common.http_session import HTTPResult, KeepAliveClient
+
+HTTP_CACHE_TTL = 4 * 3600  # seconds
+
+
+def _header(headers: Dict[str, str], name: str) -> Optional[str]:
+    name = name.lower()
+    return next((v for k, v in headers.items() if k.lower() == name), None)
+
+
+def _load_entry(cache_file: Path) -> Optional[Dict]:
+    try:
+        return json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _save_entry(cache_file: Path, entry: Dict) -> None:
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+    except OSError as e:
+        print(f"Warning: could not write HTTP cache {cache_file}: {e}")
+
+
+def cached_get(
+    client: KeepAliveClient,
+    url: str,
+    params: Optional[Dict[str, object]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    cache_file: Optional[Path] = None,
+    ttl: float = HTTP_CACHE_TTL,
+) -> HTTPResult:
+    """`client.get` backed by `cache_file`; without a cache file this is a plain GET."""
+    if cache_file is None:
+        return client.get(url, params=params, headers=headers)
+    entry = _load_entry(cache_file)
+    if entry is not None and time.time() - entry.get("fetched", 0) <= ttl:
+        return HTTPResult(status=200, body=entry["body"].encode("utf-8"))
+
+    conditional = dict(headers or {})
+    if entry is not None:
+        if entry.get("etag"):
+            conditional["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            conditional["If-Modified-Since"] = entry["last_modified"]
+    resp = client.get(url, params=params, headers=conditional)
+    if resp.status == 304 and entry is not None:
+        entry["fetched"] = time.time()
+        _save_entry(cache_file, entry)
+        return HTTPResult(status=200, headers=resp.headers, body=entry["body"].encode("utf-8"))
+    if resp.ok:
+        _save_entry(cache_file, {
+            "fetched": time.time(),
+            "etag": _header(resp.headers, "ETag"),
+            "last_modified": _header(resp.headers, "Last-Modified"),
+            "body": resp.text(),
+        })
+    return resp
@@ -61,17 +61,16 @@ ISTANBUL_DISTRICT_REGIONS: Dict[str, str] = {
 }
 
 
+_TR_ASCII = str.maketrans({
+    'ı': 'i', 'İ': 'I', 'ş': 's', 'Ş': 'S',
+    'ğ': 'g', 'Ğ': 'G', 'ü': 'u', 'Ü': 'U',
+    'ö': 'o', 'Ö': 'O', 'ç': 'c', 'Ç': 'C'
+})
+
+
 def _normalize_turkish_chars(text: str) -> str:
     """Normalize Turkish characters to ASCII equivalents for matching."""
-    replacements = {
-        'ı': 'i', 'İ': 'I', 'ş': 's', 'Ş': 'S',
-        'ğ': 'g', 'Ğ': 'G', 'ü': 'u', 'Ü': 'U',
-        'ö': 'o', 'Ö': 'O', 'ç': 'c', 'Ç': 'C'
-    }
-    result = text
-    for turkish, ascii_char in replacements.items():
-        result = result.replace(turkish, ascii_char)
-    return result
+    return text.translate(_TR_ASCII)
 
 def get_istanbul_district_region(district_name: str) -> Optional[str]:
     """
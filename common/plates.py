@@ -1,7 +1,10 @@
-from typing import List
+from typing import List, Tuple
+
+# TR plate codes as zero-padded strings: 01..81 (built once at import)
+PLATE_CODES: Tuple[str, ...] = tuple(f"{i:02d}" for i in range(1, 82))
 
 def get_plate_codes() -> List[str]:
 	"""Return TR plate codes as zero-padded strings: 01..81."""
-	return [f"{i:02d}" for i in range(1, 82)]
+	return list(PLATE_CODES)
 
 
@@ -0,0 +1,64 @@
+"""
+Reuse of a brand's recently written price files instead of scraping it again.
+
+Prices change at most a few times a day, so a brand whose last full run finished
+within the max age is not scraped again; its txt files are reported as they are.
+Each complete run records the files it wrote in output_dir/.cache/last_run.json.
+
+A run is complete only when the scraper says so: `save_all_cities_prices_txt`
+returns a `SavedFiles` whose `failed` list names the cities it skipped. A run with
+skipped cities (or a plain list, which says nothing about them) is not recorded,
+so the next run scrapes the brand again instead of serving the gaps as fresh.
+"""
+
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+import json
+import time
+
+PRICE_CACHE_MAX_AGE = 3600  # seconds
+
+
+class SavedFiles(list):
+    """The paths a full run wrote, plus the cities it could not scrape."""
+
+    def __init__(self, files: Iterable[Path] = (), failed: Iterable[str] = ()):
+        super().__init__(files)
+        self.failed: List[str] = list(failed)
+
+
+def last_run_path(output_dir: Path) -> Path:
+    return output_dir / ".cache" / "last_run.json"
+
+
+def load_fresh_outputs(output_dir: Path, max_age: float = PRICE_CACHE_MAX_AGE) -> Optional[List[Path]]:
+    """Return the files of the last run if it is younger than `max_age` and they all still exist."""
+    try:
+        data = json.loads(last_run_path(output_dir).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if time.time() - data.get("finished", 0) > max_age:
+        return None
+    files = [output_dir / name for name in data.get("files", [])]
+    if not files or not all(fp.is_file() for fp in files):
+        return None
+    return files
+
+
+def save_run_outputs(output_dir: Path, saved: Sequence[Path]) -> None:
+    """Record a complete run; an empty, partial or unreported run is not recorded so the next call scrapes again."""
+    if not saved:
+        return
+    failed = getattr(saved, "failed", None)
+    if failed is None:
+        return
+    if failed:
+        print(f"Not recording {output_dir} for reuse: {len(failed)} city(ies) could not be scraped")
+        return
+    cache_file = last_run_path(output_dir)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"finished": time.time(), "files": [Path(fp).name for fp in saved]}
+        cache_file.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    except OSError as e:
+        print(f"Warning: could not write price cache {cache_file}: {e}")
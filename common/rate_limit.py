@@ -0,0 +1,91 @@
+"""
+Adaptive request pacing shared by the parallel workers of one scraper run.
+
+Instead of a fixed random sleep after every city, workers call
+`TokenBucket.acquire()` before each request. The rate starts from the last
+rate the site accepted (persisted per brand in ~/.cache/fuel_scraper/rate.json),
+is halved whenever a worker reports a timeout / throttling response, and is
+doubled for the next run if the whole run finished without one.
+
+`jitter_backoff` gives retry waits: full-jitter exponential, so parallel workers
+that failed together do not retry in lockstep.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
+import json
+import random
+import threading
+import time
+
+RATE_FILE = Path.home() / ".cache" / "fuel_scraper" / "rate.json"
+
+
+def jitter_backoff(attempt: int, base: float = 500, cap: float = 8000) -> int:
+    """Full-jitter retry wait in ms: uniform in [0, min(cap, base * 2**attempt)]."""
+    return int(random.uniform(0, min(cap, base * (2 ** attempt))))
+
+
+def _load_rates() -> Dict[str, float]:
+    try:
+        return json.loads(RATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rps` tokens per second, at most `capacity` saved up."""
+
+    def __init__(
+        self,
+        rps: float,
+        capacity: float = 1.0,
+        min_rps: float = 0.2,
+        max_rps: float = 20.0,
+        brand: Optional[str] = None,
+    ):
+        self.brand = brand
+        self.min_rps = min_rps
+        self.max_rps = max_rps
+        self.rps = min(max(rps, min_rps), max_rps)
+        self.capacity = capacity
+        self.errors = 0
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_brand(cls, brand: str, default_rps: float, **kwargs) -> "TokenBucket":
+        """Start from the brand's persisted rate, or `default_rps` on the first run."""
+        return cls(_load_rates().get(brand, default_rps), brand=brand, **kwargs)
+
+    def acquire(self) -> None:
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rps)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rps
+            time.sleep(wait)
+
+    def backoff(self) -> None:
+        """Halve the rate after a timeout or a 429/503-style response."""
+        with self._lock:
+            self.errors += 1
+            self.rps = max(self.min_rps, self.rps / 2)
+
+    def persist(self) -> None:
+        """Store the rate for the next run: doubled after a clean run, the backed-off rate otherwise."""
+        if self.brand is None:
+            return
+        rates = _load_rates()
+        rates[self.brand] = self.rps if self.errors else min(self.max_rps, self.rps * 2)
+        try:
+            RATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            RATE_FILE.write_text(json.dumps(rates, indent=2), encoding="utf-8")
+        except OSError as e:
+            print(f"Warning: could not save rate file {RATE_FILE}: {e}")
@@ -0,0 +1,132 @@
+"""
+Helpers for running several brand scrapers side by side.
+
+Each brand's `save_all_cities_prices_txt` is an independent, I/O-bound job.
+`sync_playwright` cannot be shared across threads, so every job runs in its
+own process with its own Playwright driver. Headless runs share one Chromium
+(`common.browser_server`) that the processes attach to over CDP. A brand that
+runs past `BRAND_TIMEOUT` has its process terminated and counts as failed.
+"""
+
+from collections import deque
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import multiprocessing
+import os
+import queue
+import time
+
+from common.browser_server import shared_browser
+from common.rate_limit import jitter_backoff
+
+# Wall-clock limit for one brand, retries included; a brand still running after it is abandoned
+BRAND_TIMEOUT = float(os.environ.get("BRAND_TIMEOUT", "900"))  # seconds
+
+# Map: brand name -> (save_all_cities_prices_txt, output_dir)
+ScraperJobs = Dict[str, Tuple[Callable[..., List[Path]], Path]]
+
+
+def _run_job(fn: Callable[..., List[Path]], output_dir: Path, debug: bool, retries: int) -> List[Path]:
+    """Run one brand in the worker process, retrying a failed run after a jittered backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return fn(output_dir, debug=debug)
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            wait_ms = jitter_backoff(attempt, base=2000, cap=30000)
+            # Jobs may be functools.partial wrappers; report the scraper's own module
+            print(f"Retrying {getattr(getattr(fn, 'func', fn), '__module__', fn)} in {wait_ms / 1000:.1f}s after error: {e}")
+            time.sleep(wait_ms / 1000)
+
+
+def _job_process(name: str, fn: Callable[..., List[Path]], output_dir: Path, debug: bool, retries: int, results: "multiprocessing.Queue") -> None:
+    """Process entry point: send `(name, saved, error)` back to the parent."""
+    try:
+        results.put((name, _run_job(fn, output_dir, debug, retries), None))
+    except Exception as e:
+        # The exception itself may not pickle; its text is enough for the report
+        results.put((name, [], f"{type(e).__name__}: {e}"))
+
+
+def run_scrapers_parallel(
+    jobs: ScraperJobs,
+    debug: bool = False,
+    max_workers: Optional[int] = None,
+    share_browser: bool = True,
+    retries: int = 1,
+    on_result: Optional[Callable[[str, List[Path]], None]] = None,
+    timeout: Optional[float] = BRAND_TIMEOUT,
+) -> Dict[str, List[Path]]:
+    """Run each brand scraper in its own process and collect the saved files per brand.
+
+    With `share_browser` (headless only), all processes open their contexts on one Chromium.
+    A brand that raises is rerun up to `retries` times inside its process; if it still fails
+    it is reported and returns an empty list, without stopping the others. A brand still
+    running `timeout` seconds after it started has its process terminated and is reported
+    the same way, so one hung site cannot hold up the rest.
+    `on_result(name, saved)` is called as each brand finishes, so fast brands are reported
+    without waiting for the slowest one.
+    """
+    results: Dict[str, List[Path]] = {}
+    if not jobs:
+        return results
+
+    def finish(name: str, saved: List[Path]) -> None:
+        results[name] = saved
+        if on_result:
+            on_result(name, saved)
+
+    with ExitStack() as stack:
+        if share_browser and not debug:
+            try:
+                stack.enter_context(shared_browser())
+            except Exception as e:
+                print(f"Warning: shared browser unavailable, each scraper launches its own: {e}")
+        # One process per brand (not a pool) so that a stuck brand can be terminated on its own
+        inbox = multiprocessing.Queue()
+        waiting = deque(jobs.items())
+        running: Dict[str, Tuple[multiprocessing.Process, float]] = {}
+        limit = max_workers or len(jobs)
+        try:
+            while waiting or running:
+                while waiting and len(running) < limit:
+                    name, (fn, output_dir) = waiting.popleft()
+                    proc = multiprocessing.Process(
+                        target=_job_process, args=(name, fn, output_dir, debug, retries, inbox), name=f"scraper-{name}"
+                    )
+                    proc.start()
+                    running[name] = (proc, time.monotonic() + timeout if timeout else float("inf"))
+
+                try:
+                    name, saved, error = inbox.get(timeout=1.0)
+                except queue.Empty:
+                    pass
+                else:
+                    if name in running:
+                        running.pop(name)[0].join()
+                        if error:
+                            print(f"Error running {name}: {error}")
+                        finish(name, saved)
+                    continue
+
+                now = time.monotonic()
+                for name, (proc, deadline) in list(running.items()):
+                    if now >= deadline:
+                        proc.terminate()
+                        proc.join()
+                        running.pop(name)
+                        print(f"Error running {name}: no result after {timeout:.0f}s, abandoned")
+                        finish(name, [])
+                    elif not proc.is_alive() and proc.exitcode != 0:
+                        # Died without reporting (e.g. killed or crashed in native code)
+                        running.pop(name)
+                        print(f"Error running {name}: worker process exited with code {proc.exitcode}")
+                        finish(name, [])
+        finally:
+            for proc, _ in running.values():
+                proc.terminate()
+                proc.join()
+    # Same brand order as `jobs`, whatever order they finished in
+    return {name: results[name] for name in jobs}
@@ -0,0 +1,18 @@
+"""Turkish-aware case folding for matching city/district names.
+
+`fold` maps Turkish letters to their ASCII base and upper-cases ASCII letters in a
+single `str.translate` pass, so "İstanbul", "ISTANBUL" and "istanbul" all compare
+equal. Use it for comparisons only, never for text that is written to output files.
+"""
+
+import string
+
+TR_FOLD = str.maketrans(
+    string.ascii_lowercase + "ıiİşŞğĞçÇöÖüÜâÂêÊîÎôÔûÛ",
+    string.ascii_uppercase + "IIISSGGCCOOUUAAEEIIOOUU",
+)
+
+
+def fold(text: str) -> str:
+    """Case/diacritic-insensitive comparison key for Turkish names."""
+    return text.translate(TR_FOLD)
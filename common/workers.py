@@ -0,0 +1,92 @@
+"""
+Run per-city scraping work across several browser contexts in parallel.
+
+Playwright's sync API objects are bound to the thread that created them, so a
+single Browser cannot be shared between threads. Each worker thread therefore
+gets its own Chromium from `common.browser_pool`, opens one context/page, and
+keeps pulling items from a shared queue until it is empty.
+"""
+
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, Optional, Tuple, TypeVar, Union
+import threading
+import traceback
+
+from common.browser_pool import acquire_context, close_browser
+
+T = TypeVar("T")
+
+_WORKER_DONE = object()
+
+
+def iter_parallel_pages(
+    items: Iterable[T],
+    work: Callable[[Any, T], Any],
+    setup: Optional[Callable[[Any], Any]] = None,
+    workers: int = 4,
+    debug: bool = False,
+    context_kwargs: Optional[Dict[str, Any]] = None,
+    block_resources: Union[bool, FrozenSet[str]] = True,
+) -> Iterator[Tuple[int, T, Any]]:
+    """Process `items` on `workers` parallel browser contexts, yielding results as they finish.
+
+    - `setup(context)` runs once per worker (navigate, accept cookies, ...) and returns the
+      per-worker session passed to `work`; by default the session is a fresh page.
+    - `work(session, item)` runs for each item; an exception is yielded as the result instead
+      of being raised so one bad city does not stop the run.
+
+    With `block_resources`, images/fonts/stylesheets/media (or the given set of resource types)
+    are aborted in every worker context.
+
+    Yields `(index, item, result)`; `index` is the item's position in `items` so callers can
+    restore the original order when it matters.
+    """
+    todo = list(enumerate(items))
+    if not todo:
+        return
+    workers = max(1, min(workers, len(todo)))
+
+    tasks: "Queue[Tuple[int, T]]" = Queue()
+    for entry in todo:
+        tasks.put(entry)
+    results: "Queue[Any]" = Queue()
+
+    def _run() -> None:
+        try:
+            with acquire_context(debug=debug, block_resources=block_resources, **(context_kwargs or {})) as context:
+                session = setup(context) if setup else context.new_page()
+                while True:
+                    try:
+                        idx, item = tasks.get_nowait()
+                    except Empty:
+                        break
+                    try:
+                        res = work(session, item)
+                    except Exception as e:
+                        if debug:
+                            traceback.print_exc()
+                        res = e
+                    results.put((idx, item, res))
+        except Exception as e:
+            print(f"Worker error: {e}")
+            if debug:
+                traceback.print_exc()
+        finally:
+            # Worker threads end here, so their pooled browser cannot be reused later.
+            close_browser()
+            results.put(_WORKER_DONE)
+
+    threads = [threading.Thread(target=_run, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+
+    running = len(threads)
+    while running:
+        msg = results.get()
+        if msg is _WORKER_DONE:
+            running -= 1
+            continue
+        yield msg
+
+    for t in threads:
+        t.join()
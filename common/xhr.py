@@ -0,0 +1,90 @@
+"""
+Helpers for replaying a site's own XHR outside the page.
+
+Scrapers discover the request a `<select>` change fires (with `page.expect_request`
+or a response listener), keep it as a template, and resend it for other cities over
+the shared keep-alive client instead of driving the UI again.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote_plus
+import itertools
+import math
+import re
+
+
+def substitute_value(text: str, old: str, new: str) -> str:
+    """Swap a city value inside a query string / form body / JSON body."""
+    for o, n in ((quote_plus(old), quote_plus(new)), (old, new)):
+        text = re.sub(rf"(=){re.escape(o)}(?=&|$)", lambda m: m.group(1) + n, text)
+        text = text.replace(f'"{o}"', f'"{n}"')
+    return text
+
+
+def request_carries(url: str, post_data: Optional[str], value: str) -> bool:
+    """True if the request URL or body contains `value` (raw or URL-encoded)."""
+    haystack = url + (post_data or "")
+    return value in haystack or quote_plus(value) in haystack
+
+
+def cookie_header(context, url: str) -> str:
+    """Cookie header for `url` built from a browser context's cookies."""
+    return "; ".join(f"{c['name']}={c['value']}" for c in context.cookies(url))
+
+
+def iter_record_lists(data: Any, path: Tuple = ()) -> Iterator[Tuple[Tuple, List[Dict[str, Any]]]]:
+    """Yield `(path, list)` for every non-empty list of dicts inside a decoded JSON document."""
+    if isinstance(data, list):
+        if data and all(isinstance(x, dict) for x in data):
+            yield path, data
+        items: Iterable = enumerate(data)
+    elif isinstance(data, dict):
+        items = data.items()
+    else:
+        return
+    for key, item in items:
+        yield from iter_record_lists(item, path + (key,))
+
+
+def _cell(value: Any) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def records_to_rows(records: List[Dict[str, Any]], keys: Sequence[str]) -> List[List[str]]:
+    """Project records onto `keys` as table rows; records without a first-column value are skipped."""
+    rows = ([_cell(r.get(k)) for k in keys] for r in records)
+    return [row for row in rows if row[0]]
+
+
+def learn_table_feed(data: Any, rows: List[List[str]], max_candidates: int = 256) -> Optional[Dict[str, list]]:
+    """Find the record list and per-column keys in `data` that reproduce the rendered `rows`.
+
+    Returns `{"path": [...], "keys": [...]}`, or None. A mapping is only accepted if it
+    reproduces every row exactly, so output built from the feed matches the DOM path.
+    """
+    if not rows:
+        return None
+    for path, records in iter_record_lists(data):
+        sample = records[0]
+        candidates = [[k for k, v in sample.items() if _cell(v) == text] for text in rows[0]]
+        if not all(candidates) or math.prod(map(len, candidates)) > max_candidates:
+            continue
+        for keys in itertools.product(*candidates):
+            if records_to_rows(records, keys) == rows:
+                return {"path": list(path), "keys": list(keys)}
+    return None
+
+
+def table_from_feed(data: Any, feed: Dict[str, list]) -> Optional[List[List[str]]]:
+    """Rows from another response of the same feed, or None if its shape no longer matches."""
+    records = data
+    try:
+        for key in feed["path"]:
+            records = records[key]
+    except (KeyError, IndexError, TypeError):
+        return None
+    if not isinstance(records, list) or not records or not isinstance(records[0], dict):
+        return None
+    if any(k not in records[0] for k in feed["keys"]):
+        return None
+    return records_to_rows(records, feed["keys"]) or None
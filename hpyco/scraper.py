@@ -1,11 +1,26 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from playwright.sync_api import TimeoutError as PWTimeoutError
 import random
+import time
+
+from common.browser import MEDIA_RESOURCE_TYPES
+from common.browser_pool import acquire_context
+from common.file_writer import write_files
+from common.price_cache import SavedFiles
+from common.workers import iter_parallel_pages
 
 HYPCO_URL = "https://www.hypco.com.tr/tr/pompa-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
 
 def _ensure_cookie_accepted(page) -> None:
 	try:
@@ -157,125 +172,119 @@ def _extract_prices_for_selected_district(page) -> Dict[str, str]:
 	return {"benzin": "", "motorin": ""}
 
 
-def _write_hypco_districts_to_text(city_name: str, districts: List[HypcoDistrictRow], output_file: Path) -> None:
-	lines: List[str] = []
-	lines.append(f"{city_name}")
-	for d in districts:
-		lines.append(f"{d.name} | Benzin: {d.benzin} | Motorin: {d.motorin}")
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+def _render_hypco_districts(city_name: str, districts: List[HypcoDistrictRow]) -> bytes:
+	# Whole file built in memory, encoded once and written with a single write
+	return "\n".join([city_name, *(f"{d.name} | Benzin: {d.benzin} | Motorin: {d.motorin}" for d in districts)]).encode("utf-8")
 
 
-def save_city_prices_txt(city_name: str, output_dir: Path, url: str = HYPCO_URL, debug: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
+def _dedupe_rows(rows: List[HypcoDistrictRow]) -> List[HypcoDistrictRow]:
+	# Deduplicate by district name (keep first occurrence)
+	seen = set()
+	unique_rows: List[HypcoDistrictRow] = []
+	for r in rows:
+		key = r.name.strip().upper()
+		if key in seen:
+			continue
+		seen.add(key)
+		unique_rows.append(r)
+	return unique_rows
+
+
+def _open_hypco_page(context, url: str):
+	page = context.new_page()
+	page.set_default_navigation_timeout(45000)
+	page.goto(url, wait_until="domcontentloaded")
+	try:
+		page.wait_for_load_state("networkidle", timeout=8000)
+	except Exception:
+		pass
+	_ensure_cookie_accepted(page)
+	# Wait selects
+	page.wait_for_selector("#City", state="visible", timeout=15000)
+	page.wait_for_selector("#District", state="visible", timeout=15000)
+	return page
+
+
+def _city_options(page) -> List[Dict[str, str]]:
+	# Remove default option like "Şehir seçiniz"
+	return [
+		o for o in _get_select_options(_el(page, "#City"))
+		if (o.get("value") or "").strip() and "Şehir seçiniz" not in (o.get("text") or "")
+	]
+
+
+def _scrape_city_districts(page, city_value: str, step_delay_ms: int = 300) -> List[HypcoDistrictRow]:
+	"""Select a city on an open Hypco page and read every district's prices."""
+	city_sel = _el(page, "#City")
+	if city_sel is None or _el(page, "#District") is None:
+		raise RuntimeError("Şehir veya ilçe select'i bulunamadı.")
+	_select_option_with_events(city_sel, city_value)
+	page.wait_for_timeout(500)
+	# Refresh district options after city change
+	try:
+		page.wait_for_function(
+			"""() => {
+				const s = document.querySelector('#District');
+				return !!s && s.options && s.options.length > 1;
+			}""",
+			timeout=8000
 		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
+	except Exception:
+		page.wait_for_timeout(800)
+	dist_sel = _el(page, "#District")
+	dist_opts = _get_select_options(dist_sel)
+	dist_opts = [d for d in dist_opts if (d.get("value") or "").strip() and "İlçe seçiniz" not in (d.get("text") or "")]
+	rows: List[HypcoDistrictRow] = []
+	for d in dist_opts:
+		name = (d.get("text") or "").strip()
 		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
+			_select_option_with_events(dist_sel, d.get("value") or "")
+			_click_show_button(page)
+			_wait_results_loaded(page, timeout_ms=18000)
+			prices = _extract_prices_for_selected_district(page)
+			rows.append(HypcoDistrictRow(name=name, benzin=prices.get("benzin",""), motorin=prices.get("motorin","")))
 		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
-		# Wait selects
-		page.wait_for_selector("#City", state="visible", timeout=15000)
-		page.wait_for_selector("#District", state="visible", timeout=15000)
-		city_sel = _el(page, "#City")
-		dist_sel = _el(page, "#District")
-		if city_sel is None or dist_sel is None:
-			raise RuntimeError("Şehir veya ilçe select'i bulunamadı.")
-		# Select target city (with İstanbul özel durumu)
-		options = _get_select_options(city_sel)
-		def _match_value_for(text: str) -> str:
-			for o in options:
-				if (o.get("text") or "").strip().upper() == text.strip().upper():
-					return o.get("value") or ""
-			for o in options:
-				if text.strip().upper() in (o.get("text") or "").strip().upper():
-					return o.get("value") or ""
-			return ""
-
-		def _get_district_rows_for_selected_city() -> List[HypcoDistrictRow]:
-			try:
-				page.wait_for_function(
-					"""() => {
-						const s = document.querySelector('#District');
-						return !!s && s.options && s.options.length > 1;
-					}""",
-					timeout=8000
-				)
-			except Exception:
-				page.wait_for_timeout(800)
-			local_dist_sel = _el(page, "#District")
-			local_opts = _get_select_options(local_dist_sel)
-			local_opts = [d for d in local_opts if (d.get("value") or "").strip() and "İlçe seçiniz" not in (d.get("text") or "")]
-			rows: List[HypcoDistrictRow] = []
-			for d in local_opts:
-				name = (d.get("text") or "").strip()
-				try:
-					_select_option_with_events(local_dist_sel, d.get("value") or "")
-					_click_show_button(page)
-					_wait_results_loaded(page, timeout_ms=18000)
-					prices = _extract_prices_for_selected_district(page)
-					rows.append(HypcoDistrictRow(name=name, benzin=prices.get("benzin",""), motorin=prices.get("motorin","")))
-				except Exception:
-					rows.append(HypcoDistrictRow(name=name, benzin="", motorin=""))
-				page.wait_for_timeout(int(300 * random.uniform(1.0, 1.3)))
-			return rows
-
-		all_rows: List[HypcoDistrictRow] = []
-		if _is_istanbul_variant(city_name) or city_name.strip().upper() in ["ISTANBUL", "İSTANBUL"]:
+			rows.append(HypcoDistrictRow(name=name, benzin="", motorin=""))
+		page.wait_for_timeout(int(step_delay_ms * random.uniform(1.0, 1.3)))
+	return rows
+
+
+def save_city_prices_txt(city_name: str, output_dir: Path, url: str = HYPCO_URL, debug: bool = False) -> Path:
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
+		page = _open_hypco_page(context, url)
+		options = _get_select_options(_el(page, "#City"))
+		if _is_istanbul_variant(city_name):
 			# Gather both İstanbul (Anadolu) and (Avrupa)
 			istanbul_options = [o for o in options if _is_istanbul_variant((o.get("text") or ""))]
 			if not istanbul_options:
 				raise RuntimeError("İstanbul seçenekleri bulunamadı.")
+			all_rows: List[HypcoDistrictRow] = []
 			for opt in istanbul_options:
-				_select_option_with_events(city_sel, opt.get("value") or "")
-				page.wait_for_timeout(500)
-				all_rows.extend(_get_district_rows_for_selected_city())
-			# Deduplicate by district name
-			seen = set()
-			unique_rows: List[HypcoDistrictRow] = []
-			for r in all_rows:
-				key = r.name.strip().upper()
-				if key in seen:
-					continue
-				seen.add(key)
-				unique_rows.append(r)
-			output_dir.mkdir(parents=True, exist_ok=True)
-			fp = output_dir / f"hpyco_İstanbul_prices.txt"
-			_write_hypco_districts_to_text("İstanbul", unique_rows, fp)
-			browser.close()
-			return fp
+				all_rows.extend(_scrape_city_districts(page, opt.get("value") or ""))
+			file_city = "İstanbul"
 		else:
 			# Single non-İstanbul city
-			target_val = _match_value_for(city_name)
+			want = city_name.strip().upper()
+			target = next((o for o in options if (o.get("text") or "").strip().upper() == want), None) \
+				or next((o for o in options if want in (o.get("text") or "").strip().upper()), None)
+			target_val = (target or {}).get("value") or ""
 			if not target_val:
 				raise RuntimeError(f"Şehir bulunamadı: {city_name}")
-			_select_option_with_events(city_sel, target_val)
-			page.wait_for_timeout(500)
-			district_rows = _get_district_rows_for_selected_city()
-			# Deduplicate by district name (keep first occurrence)
-			seen = set()
-			unique_rows: List[HypcoDistrictRow] = []
-			for r in district_rows:
-				key = r.name.strip().upper()
-				if key in seen:
-					continue
-				seen.add(key)
-				unique_rows.append(r)
-			# Write output
-			output_dir.mkdir(parents=True, exist_ok=True)
-			fp = output_dir / f"hpyco_{city_name}_prices.txt"
-			_write_hypco_districts_to_text(city_name, unique_rows, fp)
-			browser.close()
-			return fp
+			all_rows = _scrape_city_districts(page, target_val)
+			file_city = city_name
+	# Write output
+	output_dir.mkdir(parents=True, exist_ok=True)
+	fp = output_dir / f"hpyco_{file_city}_prices.txt"
+	fp.write_bytes(_render_hypco_districts(file_city, _dedupe_rows(all_rows)))
+	return fp
+
+
+def _scrape_city(page, city_value: str, min_delay: float, max_delay: float) -> List[HypcoDistrictRow]:
+	"""One city on a worker's page; the polite delay runs after the city is read."""
+	try:
+		return _scrape_city_districts(page, city_value, step_delay_ms=320)
+	finally:
+		time.sleep(random.uniform(min_delay, max_delay))
 
 
 def save_all_cities_prices_txt(
@@ -284,90 +293,45 @@ def save_all_cities_prices_txt(
 	debug: bool = False,
 	min_delay: float = 0.6,
 	max_delay: float = 1.2,
+	workers: int = 4,
 ) -> List[Path]:
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
-		page.wait_for_selector("#City", state="visible", timeout=15000)
-		page.wait_for_selector("#District", state="visible", timeout=15000)
-		city_sel = _el(page, "#City")
-		dist_sel = _el(page, "#District")
-		options = _get_select_options(city_sel)
-		# Remove default option like "Şehir seçiniz"
-		city_options = [o for o in options if (o.get("value") or "").strip() and "Şehir seçiniz" not in (o.get("text") or "")]
-		output_dir.mkdir(parents=True, exist_ok=True)
-		istanbul_rows: List[HypcoDistrictRow] = []
-		for o in city_options:
-			city_name = (o.get("text") or "").strip()
-			try:
-				_select_option_with_events(city_sel, o.get("value") or "")
-				page.wait_for_timeout(500)
-				# Refresh district options after city change
-				dist_opts = _get_select_options(dist_sel)
-				dist_opts = [d for d in dist_opts if (d.get("value") or "").strip() and "İlçe seçiniz" not in (d.get("text") or "")]
-				district_rows: List[HypcoDistrictRow] = []
-				for d in dist_opts:
-					name = (d.get("text") or "").strip()
-					try:
-						_select_option_with_events(dist_sel, d.get("value") or "")
-						_click_show_button(page)
-						_wait_results_loaded(page, timeout_ms=18000)
-						prices = _extract_prices_for_selected_district(page)
-						district_rows.append(HypcoDistrictRow(name=name, benzin=prices.get("benzin",""), motorin=prices.get("motorin","")))
-					except Exception:
-						district_rows.append(HypcoDistrictRow(name=name, benzin="", motorin=""))
-						continue
-					page.wait_for_timeout(int(320 * random.uniform(1.0, 1.3)))
-				# Deduplicate
-				seen = set()
-				unique_rows: List[HypcoDistrictRow] = []
-				for r in district_rows:
-					key = r.name.strip().upper()
-					if key in seen:
-						continue
-					seen.add(key)
-					unique_rows.append(r)
-				# İstanbul özel: biriktir, hemen yazma
-				if _is_istanbul_variant(city_name):
-					istanbul_rows.extend(unique_rows)
-				else:
-					fp = output_dir / f"hpyco_{city_name}_prices.txt"
-					_write_hypco_districts_to_text(city_name, unique_rows, fp)
-					saved.append(fp)
-					print(f"OK: {city_name} -> {fp.name}")
-			except Exception as e:
-				print(f"Hata/atlandı: {city_name} -> {e}")
-			page.wait_for_timeout(int(1000 * random.uniform(min_delay, max_delay)))
-		# İstanbul birleşik yaz
-		if istanbul_rows:
-			seen = set()
-			unique_rows: List[HypcoDistrictRow] = []
-			for r in istanbul_rows:
-				key = r.name.strip().upper()
-				if key in seen:
-					continue
-				seen.add(key)
-				unique_rows.append(r)
-			fp_ist = output_dir / f"hpyco_İstanbul_prices.txt"
-			_write_hypco_districts_to_text("İstanbul", unique_rows, fp_ist)
-			saved.append(fp_ist)
-			print(f"OK: İstanbul -> {fp_ist.name}")
-		browser.close()
-	return saved
-
-
+	"""
+	Tüm şehirlerin ilçe fiyatlarını hpyco_<ŞEHİR>_prices.txt olarak yazar.
+	Şehirler `workers` adet paralel tarayıcı context'ine dağıtılır (debug modunda 1);
+	tüm context'ler worker başına tek Chromium üzerinde açılır.
+	"""
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
+		city_options = _city_options(_open_hypco_page(context, url))
+	output_dir.mkdir(parents=True, exist_ok=True)
+	pending: List[Tuple[Path, bytes]] = []
+	istanbul_parts: Dict[int, List[HypcoDistrictRow]] = {}
+	failed: List[str] = []
+	for idx, o, result in iter_parallel_pages(
+		city_options,
+		work=lambda page, o: _scrape_city(page, o.get("value") or "", min_delay, max_delay),
+		setup=lambda context: _open_hypco_page(context, url),
+		workers=1 if debug else workers,
+		debug=debug,
+		context_kwargs=_CONTEXT_KWARGS,
+		block_resources=MEDIA_RESOURCE_TYPES,
+	):
+		city_name = (o.get("text") or "").strip()
+		if isinstance(result, Exception):
+			failed.append(city_name)
+			print(f"Hata/atlandı: {city_name} -> {result}")
+		elif _is_istanbul_variant(city_name):
+			# İstanbul özel: biriktir, hemen yazma
+			istanbul_parts[idx] = result
+		else:
+			fp = output_dir / f"hpyco_{city_name}_prices.txt"
+			pending.append((fp, _render_hypco_districts(city_name, _dedupe_rows(result))))
+			print(f"OK: {city_name} -> {fp.name}")
+	# İstanbul birleşik yaz (Anadolu/Avrupa sayfa sırasıyla)
+	if istanbul_parts:
+		istanbul_rows = [r for i in sorted(istanbul_parts) for r in istanbul_parts[i]]
+		fp_ist = output_dir / f"hpyco_İstanbul_prices.txt"
+		pending.append((fp_ist, _render_hypco_districts("İstanbul", _dedupe_rows(istanbul_rows))))
+		print(f"OK: İstanbul -> {fp_ist.name}")
+	# All files are written together once the browsers are done
+	write_files(pending)
+	return SavedFiles((fp for fp, _ in pending), failed)
@@ -4,21 +4,32 @@ import random
 import time
 import re
 
-from playwright.sync_api import sync_playwright, Page, TimeoutError as PWTimeoutError
+from playwright.sync_api import Page, TimeoutError as PWTimeoutError
+
+from common.browser_pool import acquire_context
+from common.price_cache import SavedFiles
 
 IPRAGAZ_URL = "https://www.ipragaz.com.tr/yolda/pompa-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+
+_FILENAME_TR = str.maketrans({
+	"İ": "I", "ı": "i", "Ş": "S", "ş": "s", "Ğ": "G", "ğ": "g",
+	"Ü": "U", "ü": "u", "Ö": "O", "ö": "o", "Ç": "C", "ç": "c",
+	"-": "_", " ": "_",
+})
+
 
 def _normalize_city_name_for_filename(city_name: str) -> str:
 	"""Normalize city name for filenames (uppercase ASCII-ish)."""
-	replacements = {
-		"İ": "I", "ı": "i", "Ş": "S", "ş": "s", "Ğ": "G", "ğ": "g",
-		"Ü": "U", "ü": "u", "Ö": "O", "ö": "o", "Ç": "C", "ç": "c",
-		"-": "_", " ": "_",
-	}
-	n = city_name
-	for src, dst in replacements.items():
-		n = n.replace(src, dst)
+	n = city_name.translate(_FILENAME_TR)
 	return re.sub(r"[^A-Z0-9_]", "", n.upper())
 
 
@@ -27,16 +38,11 @@ def _map_city_name_for_display(city_name: str) -> str:
 	return "Mersin" if city_name.upper() in ("İÇEL", "ICEL") else city_name
 
 
-def _write_ipragaz_price_to_text(city_label: str, price: str, output_file: Path, append: bool = False) -> None:
-	"""Write one line 'CITY: PRICE' to txt, optionally appending."""
+def _write_ipragaz_price_to_text(city_label: str, price: str, output_file: Path) -> None:
+	"""Write one line 'CITY: PRICE' to txt."""
 	if not price:
 		return
-	line = f"{city_label}: {price}"
-	if append and output_file.exists():
-		existing = output_file.read_text(encoding="utf-8").strip()
-		output_file.write_text(f"{existing}\n{line}" if existing else line, encoding="utf-8")
-	else:
-		output_file.write_text(line, encoding="utf-8")
+	output_file.write_bytes(f"{city_label}: {price}".encode("utf-8"))
 
 
 def _click_manual_button(page: Page) -> None:
@@ -177,17 +183,9 @@ def save_all_cities_prices_txt(
 	Çanakkale (Çanakkale, Çanakkale-B.G. Ada) birleştirilir: ipragaz_CANAKKALE_prices.txt
 	"""
 	output_dir.mkdir(parents=True, exist_ok=True)
-	saved_files: List[Path] = []
-
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
+	saved_files = SavedFiles()
+
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context:
 		page = context.new_page()
 		page.set_default_navigation_timeout(45000)
 
@@ -209,13 +207,12 @@ def save_all_cities_prices_txt(
 		if not cities:
 			if debug:
 				page.screenshot(path=str(output_dir / "debug_dropdown.png"))
-			browser.close()
 			return saved_files
 
 		istanbul_output = output_dir / "ipragaz_ISTANBUL_prices.txt"
 		canakkale_output = output_dir / "ipragaz_CANAKKALE_prices.txt"
-		istanbul_first = True
-		canakkale_first = True
+		# Merged files collect their 'CITY: PRICE' lines here and are written once at the end
+		merged_lines: Dict[Path, List[str]] = {}
 
 		for idx, city in enumerate(cities, 1):
 			value = city["value"]
@@ -229,6 +226,7 @@ def save_all_cities_prices_txt(
 
 			price = _select_city_and_get_price(page, value, text, debug=debug)
 			if not price:
+				saved_files.failed.append(text)
 				print(f"  ⚠ Fiyat alınamadı: {text}")
 				if idx < len(cities):
 					try:
@@ -243,23 +241,18 @@ def save_all_cities_prices_txt(
 			is_istanbul = "ISTANBUL" in upper_text
 			is_canakkale = "CANAKKALE" in upper_text
 
-			if is_istanbul:
-				_write_ipragaz_price_to_text(text, price, istanbul_output, append=not istanbul_first)
-				if istanbul_first:
-					saved_files.append(istanbul_output)
-					istanbul_first = False
-				print(f"  ✓ Kaydedildi: {istanbul_output.name}")
-			elif is_canakkale:
-				_write_ipragaz_price_to_text(text, price, canakkale_output, append=not canakkale_first)
-				if canakkale_first:
-					saved_files.append(canakkale_output)
-					canakkale_first = False
-				print(f"  ✓ Kaydedildi: {canakkale_output.name}")
+			if is_istanbul or is_canakkale:
+				merged_output = istanbul_output if is_istanbul else canakkale_output
+				if merged_output not in merged_lines:
+					merged_lines[merged_output] = []
+					saved_files.append(merged_output)
+				merged_lines[merged_output].append(f"{text}: {price}")
+				print(f"  ✓ Birleştirilecek: {merged_output.name}")
 			else:
 				display_name = _map_city_name_for_display(text)
 				norm = _normalize_city_name_for_filename(display_name)
 				fp = output_dir / f"ipragaz_{norm}_prices.txt"
-				_write_ipragaz_price_to_text(display_name, price, fp, append=False)
+				_write_ipragaz_price_to_text(display_name, price, fp)
 				saved_files.append(fp)
 				print(f"  ✓ Kaydedildi: {fp.name}")
 
@@ -287,7 +280,9 @@ def save_all_cities_prices_txt(
 				
 				time.sleep(random.uniform(min_delay, max_delay))
 
-		browser.close()
+		for merged_output, lines in merged_lines.items():
+			merged_output.write_bytes("\n".join(lines).encode("utf-8"))
+			print(f"  ✓ Kaydedildi: {merged_output.name} ({len(lines)} satır)")
 
 	print(f"\nToplam {len(saved_files)} dosya yazıldı -> {output_dir}")
 	return saved_files
@@ -1,12 +1,29 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError, Page
+from playwright.sync_api import TimeoutError as PWTimeoutError, Page
 import random
+import traceback
+
+from common.browser import storage_state_path, load_storage_state, save_storage_state
+from common.browser_pool import acquire_context
+from common.file_writer import write_files
+from common.html_text import parse_tables
+from common.http_session import get_client
+from common.price_cache import SavedFiles
+from common.xhr import cookie_header, request_carries, substitute_value
 
 # TODO: Update this URL with the actual Kadoil fuel prices page URL
 KADOIL_URL = "https://kadoil.com/akaryakit-fiyatlari/"
 
+_CONTEXT_KWARGS = dict(
+    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    locale="tr-TR",
+    timezone_id="Europe/Istanbul",
+    viewport={"width": 1280, "height": 900},
+    ignore_https_errors=True,
+)
+
 
 @dataclass
 class KadoilPriceRow:
@@ -36,21 +53,14 @@ def _ensure_cookie_accepted(page: Page) -> None:
 
 
 def _get_city_options(select_context) -> List[Dict[str, str]]:
-    """Return list of city options from #selectProvince select."""
+    """Return list of city options from #selectProvince select (single evaluate round-trip)."""
     try:
         select_context.wait_for_selector("#selectProvince", state="visible", timeout=10000)
-        options_locator = select_context.locator("#selectProvince option")
-        result: List[Dict[str, str]] = []
-        for i in range(options_locator.count()):
-            try:
-                opt = options_locator.nth(i)
-                value = opt.get_attribute("value") or ""
-                text = (opt.inner_text() or "").strip()
-                if text and value and text != "İl seçiniz":
-                    result.append({"value": value, "text": text})
-            except Exception:
-                continue
-        return result
+        opts = select_context.eval_on_selector_all(
+            "#selectProvince option",
+            "nodes => nodes.map(o => ({value: o.value || '', text: (o.textContent || '').trim()}))",
+        )
+        return [o for o in opts if o["text"] and o["value"] and o["text"] != "İl seçiniz"]
     except Exception as e:
         print(f"Error getting city options: {e}")
         return []
@@ -82,7 +92,6 @@ def _select_city_and_submit(select_context, page: Page, city_value: str, city_te
     except Exception as e:
         print(f"  Error selecting city {city_text}: {e}")
         if debug:
-            import traceback
             traceback.print_exc()
 
 
@@ -94,57 +103,89 @@ def _get_iframe_frame(page: Page):
     return page.frame(url=lambda url: "admin.kadoil.com" in url if url else False)
 
 
+# Cell texts of every body row in one round-trip
+_TABLE_CELLS_JS = "trs => trs.map(tr => [...tr.querySelectorAll('td')].map(td => (td.innerText || '').trim()))"
+
+
+def _rows_from_cells(cells: List[List[str]], logical_city_name: str) -> List[KadoilPriceRow]:
+    """District rows from table cells (shared by the iframe DOM and the HTTP path)."""
+    prices: List[KadoilPriceRow] = []
+    for c in cells:
+        if len(c) < 9:
+            continue
+        c = [" ".join(x.split()) for x in c[:9]]
+        district = c[0]
+        if not district or district.lower() in ["ilçe", "district", "bölge"]:
+            continue
+        prices.append(KadoilPriceRow(logical_city_name, _normalize_location_name(district), *c[1:]))
+    return prices
+
+
 def _extract_city_prices_from_table(page: Page, logical_city_name: str) -> List[KadoilPriceRow]:
     """Extract all district rows for the current city from the prices table."""
-    prices: List[KadoilPriceRow] = []
     try:
         frame = _get_iframe_frame(page)
         if not frame:
-            return prices
-        
+            return []
         frame.wait_for_selector("table tbody tr", timeout=15000)
-        rows = frame.locator("table tbody tr")
-        
-        for i in range(rows.count()):
-            try:
-                tds = rows.nth(i).locator("td")
-                if tds.count() < 9:
-                    continue
-                
-                district = tds.nth(0).inner_text().strip()
-                if not district or district.lower() in ["ilçe", "district", "bölge"]:
-                    continue
-                
-                prices.append(KadoilPriceRow(
-                    city=logical_city_name,
-                    district=_normalize_location_name(district),
-                    kursunsuz_benzin=tds.nth(1).inner_text().strip(),
-                    motorin=tds.nth(2).inner_text().strip(),
-                    ecomax_motorin=tds.nth(3).inner_text().strip(),
-                    gazyagi=tds.nth(4).inner_text().strip(),
-                    kalorifer_yakiti=tds.nth(5).inner_text().strip(),
-                    fuel_oil=tds.nth(6).inner_text().strip(),
-                    yuksek_kukurtlu_fuel_oil=tds.nth(7).inner_text().strip(),
-                    kadogaz=tds.nth(8).inner_text().strip(),
-                ))
-            except Exception:
-                continue
+        return _rows_from_cells(frame.eval_on_selector_all("table tbody tr", _TABLE_CELLS_JS), logical_city_name)
     except Exception as e:
         print(f"  Error extracting prices for {logical_city_name}: {e}")
-    return prices
+        return []
+
+
+def _select_city_capturing_request(select_context, page: Page, city_value: str, city_text: str, debug: bool = False) -> Optional[Dict[str, str]]:
+    """Select a city while listening for the request that carries its value.
+
+    Returns a replayable template of the iframe's document/XHR request, or None if no
+    request carried the city. The city is selected either way.
+    """
+    def _carries_city(req) -> bool:
+        return req.resource_type in ("document", "xhr", "fetch") and request_carries(req.url, req.post_data, city_value)
+
+    try:
+        with page.expect_request(_carries_city, timeout=6000) as req_info:
+            _select_city_and_submit(select_context, page, city_value, city_text, debug=debug)
+        req = req_info.value
+    except PWTimeoutError:
+        return None
+    headers = {k: v for k, v in req.headers.items() if k.lower() in ("x-requested-with", "content-type", "accept", "referer")}
+    cookies = cookie_header(page.context, req.url)
+    if cookies:
+        headers["Cookie"] = cookies
+    return {
+        "method": req.method,
+        "url": req.url,
+        "post_data": req.post_data or "",
+        "headers": headers,
+        "value": city_value,
+    }
+
+
+def _fetch_city_prices_http(template: Dict[str, str], city_value: str, logical_city_name: str) -> List[KadoilPriceRow]:
+    """Replay the captured request for another city and parse its table; [] if unusable."""
+    url = substitute_value(template["url"], template["value"], city_value)
+    data = substitute_value(template["post_data"], template["value"], city_value)
+    try:
+        resp = get_client().request(template["method"], url, body=data.encode("utf-8") if data else None, headers=template["headers"])
+        if not resp.ok:
+            return []
+        tables = parse_tables(resp.text())
+    except Exception:
+        return []
+    return next((rows for rows in (_rows_from_cells(t["rows"], logical_city_name) for t in tables) if rows), [])
+
+
+_FILENAME_TR = str.maketrans({
+    "İ": "I", "ı": "i", "ş": "s", "Ş": "S",
+    "ğ": "g", "Ğ": "G", "ü": "u", "Ü": "U",
+    "ö": "o", "Ö": "O", "ç": "c", "Ç": "C",
+})
 
 
 def _normalize_city_name_for_filename(city_name: str) -> str:
     """Normalize city name (Turkish chars → ASCII, uppercased) for filenames."""
-    replacements = {
-        "İ": "I", "ı": "i", "ş": "s", "Ş": "S",
-        "ğ": "g", "Ğ": "G", "ü": "u", "Ü": "U",
-        "ö": "o", "Ö": "O", "ç": "c", "Ç": "C",
-    }
-    result = city_name
-    for tr_char, ascii_char in replacements.items():
-        result = result.replace(tr_char, ascii_char)
-    return result.upper().strip()
+    return city_name.translate(_FILENAME_TR).upper().strip()
 
 
 def _normalize_location_name(location: str) -> str:
@@ -152,51 +193,44 @@ def _normalize_location_name(location: str) -> str:
     return _normalize_city_name_for_filename(location)
 
 
-def _write_kadoil_prices_to_text(city_name: str, prices: List[KadoilPriceRow], output_file: Path) -> None:
-    """Write Kadoil prices to txt. One line per district (no city header line)."""
-    if not prices:
-        output_file.write_text("", encoding="utf-8")
-        return
-    
-    lines: List[str] = []
-    for p in prices:
-        loc = _normalize_location_name(p.district)
-        parts = [
-            loc,
-            f"K.Benzin 95 Oktan: {p.kursunsuz_benzin}",
-            f"Motorin: {p.motorin}",
-            f"EcoMax Motorin: {p.ecomax_motorin}",
-            f"Gazyağı: {p.gazyagi}",
-            f"Kalorifer Yakıtı: {p.kalorifer_yakiti}",
-            f"Fuel Oil: {p.fuel_oil}",
-            f"Yüksek Kükürtlü Fuel Oil: {p.yuksek_kukurtlu_fuel_oil}",
-            f"KADOGAZ: {p.kadogaz}",
-        ]
-        lines.append(" | ".join(parts))
-    
-    output_file.write_text("\n".join(lines), encoding="utf-8")
+# One output line per district; labels are baked in once instead of per-row f-strings
+_LINE_TEMPLATE = (
+    "{} | K.Benzin 95 Oktan: {} | Motorin: {} | EcoMax Motorin: {} | Gazyağı: {}"
+    " | Kalorifer Yakıtı: {} | Fuel Oil: {} | Yüksek Kükürtlü Fuel Oil: {} | KADOGAZ: {}"
+).format
+
+
+def _render_kadoil_prices(prices: List[KadoilPriceRow]) -> bytes:
+    """Kadoil txt content: one line per district (no city header line)."""
+    return "\n".join(
+        _LINE_TEMPLATE(
+            _normalize_location_name(p.district),
+            p.kursunsuz_benzin,
+            p.motorin,
+            p.ecomax_motorin,
+            p.gazyagi,
+            p.kalorifer_yakiti,
+            p.fuel_oil,
+            p.yuksek_kukurtlu_fuel_oil,
+            p.kadogaz,
+        )
+        for p in prices
+    ).encode("utf-8")
 
 
 def save_all_cities_prices_txt(output_dir: Path, url: str = KADOIL_URL, debug: bool = False) -> List[Path]:
     """Fetch Kadoil prices for all cities and write one txt file per city.
 
     Behaviour:
-    - Iterates over city options one by one.
-    - As soon as a city's prices are fetched, its txt file is (over)written immediately.
+    - Iterates over city options one by one and groups rows by logical city.
+    - All txt files are written together once the browser is done.
     - İçel is mapped to Mersin for file naming.
     """
     output_dir.mkdir(parents=True, exist_ok=True)
-    saved_files: List[Path] = []
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            locale="tr-TR",
-            timezone_id="Europe/Istanbul",
-            viewport={"width": 1280, "height": 900},
-            ignore_https_errors=True,
-        )
+    state_file = storage_state_path(output_dir, "kadoil")
+    storage_state = load_storage_state(state_file)
+
+    with acquire_context(debug=debug, block_resources=False, storage_state=storage_state, **_CONTEXT_KWARGS) as context:
         page = context.new_page()
         page.set_default_navigation_timeout(45000)
 
@@ -212,11 +246,12 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = KADOIL_URL, debug: b
         except Exception as e:
             print(f"Error navigating to {url}: {e}")
             print("Please check if the URL is correct. You can update KADOIL_URL in kadoil/scraper.py")
-            browser.close()
             return []
         
-        # Accept cookies and wait for iframe
-        _ensure_cookie_accepted(page)
+        # Accept cookies once; later runs reuse the saved state and skip the banner probe
+        if storage_state is None:
+            _ensure_cookie_accepted(page)
+            save_storage_state(context, state_file)
         page.wait_for_selector("iframe#frame", state="attached", timeout=15000)
         page.wait_for_timeout(2000)
         
@@ -228,7 +263,6 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = KADOIL_URL, debug: b
             select_context.wait_for_selector("#selectProvince", state="visible", timeout=10000)
         except PWTimeoutError:
             print("Error: #selectProvince select not found")
-            browser.close()
             return []
         
         city_options = _get_city_options(select_context)
@@ -236,13 +270,17 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = KADOIL_URL, debug: b
             print("Error: No city options found on Kadoil page.")
             if debug:
                 page.screenshot(path="debug_kadoil_no_options.png")
-            browser.close()
             return []
         
         print(f"Found {len(city_options)} city option(s)")
 
         # Aggregate by logical city name (map İçel to Mersin)
         all_city_prices: Dict[str, List[KadoilPriceRow]] = {}
+        failed: List[str] = []
+        # Request the iframe makes for a city; once it is known to reproduce the table,
+        # the remaining cities are fetched over HTTP (debug mode always drives the page)
+        template: Optional[Dict[str, str]] = None
+        probed = debug
 
         for opt in city_options:
             city_text = opt["text"].strip()
@@ -261,28 +299,36 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = KADOIL_URL, debug: b
 
             print(f"Fetching prices for: {city_text} -> {logical_city}")
             try:
-                _select_city_and_submit(select_context, page, city_value, city_text, debug=debug)
-                city_prices = _extract_city_prices_from_table(page, logical_city)
+                city_prices = _fetch_city_prices_http(template, city_value, logical_city) if template else []
+                if not city_prices:
+                    if not probed:
+                        probed = True
+                        captured = _select_city_capturing_request(select_context, page, city_value, city_text, debug=debug)
+                        city_prices = _extract_city_prices_from_table(page, logical_city)
+                        if captured and city_prices and _fetch_city_prices_http(captured, city_value, logical_city) == city_prices:
+                            template = captured
+                            print("  Kadoil: price table is served as static HTML, continuing over HTTP")
+                    else:
+                        _select_city_and_submit(select_context, page, city_value, city_text, debug=debug)
+                        city_prices = _extract_city_prices_from_table(page, logical_city)
                 
                 if city_prices:
                     all_city_prices.setdefault(logical_city, []).extend(city_prices)
-                    total = len(all_city_prices[logical_city])
-                    
-                    norm_name = _normalize_city_name_for_filename(logical_city)
-                    fp = output_dir / f"kadoil_{norm_name}_prices.txt"
-                    _write_kadoil_prices_to_text(logical_city, all_city_prices[logical_city], fp)
-                    if fp not in saved_files:
-                        saved_files.append(fp)
-                    print(f"  ✓ Saved {total} row(s) to {fp.name}")
+                    print(f"  ✓ {len(all_city_prices[logical_city])} row(s) for {logical_city}")
+                else:
+                    failed.append(city_text)
             except Exception as e:
+                failed.append(city_text)
                 print(f"  Error for {city_text}: {e}")
                 if debug:
-                    import traceback
                     traceback.print_exc()
             
             page.wait_for_timeout(random.uniform(300, 1000))
 
-        browser.close()
-
-    return saved_files
+    pending = [
+        (output_dir / f"kadoil_{_normalize_city_name_for_filename(city)}_prices.txt", _render_kadoil_prices(rows))
+        for city, rows in all_city_prices.items()
+    ]
+    write_files(pending)
+    return SavedFiles((fp for fp, _ in pending), failed)
 
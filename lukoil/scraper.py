@@ -1,11 +1,22 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError, Page
+from playwright.sync_api import TimeoutError as PWTimeoutError, Page
 import random
+import traceback
+
+from common.browser import storage_state_path, load_storage_state, save_storage_state
+from common.browser_pool import acquire_context
+from common.file_writer import write_files
+from common.price_cache import SavedFiles
 
 LUKOIL_URL = "https://www.lukoil.com.tr/PompaFiyatlari"
 
+_CONTEXT_KWARGS = dict(
+    viewport={"width": 1920, "height": 1080},
+    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+)
+
 
 @dataclass
 class LukoilPriceRow:
@@ -21,21 +32,19 @@ class LukoilPriceRow:
     gaz_yagi: str  # Gaz Yağı (TL/It)
 
 
+_FILENAME_TR = str.maketrans({
+    "İ": "I", "ı": "I",
+    "Ş": "S", "ş": "s",
+    "Ğ": "G", "ğ": "g",
+    "Ü": "U", "ü": "u",
+    "Ö": "O", "ö": "o",
+    "Ç": "C", "ç": "c",
+})
+
+
 def _normalize_city_name_for_filename(city_name: str) -> str:
     """Normalize city name for use in filename (uppercase, no special chars)."""
-    # Replace Turkish characters
-    replacements = {
-        "İ": "I", "ı": "I",
-        "Ş": "S", "ş": "s",
-        "Ğ": "G", "ğ": "g",
-        "Ü": "U", "ü": "u",
-        "Ö": "O", "ö": "o",
-        "Ç": "C", "ç": "c",
-    }
-    normalized = city_name
-    for tr_char, ascii_char in replacements.items():
-        normalized = normalized.replace(tr_char, ascii_char)
-    return normalized.upper().strip()
+    return city_name.translate(_FILENAME_TR).upper().strip()
 
 
 def _normalize_location_name(name: str) -> str:
@@ -44,22 +53,18 @@ def _normalize_location_name(name: str) -> str:
 
 
 def _get_city_options(page: Page) -> List[Dict[str, str]]:
-    """Return list of city options from the city dropdown."""
+    """Return list of city options from the city dropdown (single evaluate round-trip)."""
     try:
         page.wait_for_selector("#ContentPlaceHolder1_ddlCity", state="visible", timeout=15000)
-        options_locator = page.locator("#ContentPlaceHolder1_ddlCity option")
-        result: List[Dict[str, str]] = []
-        for i in range(options_locator.count()):
-            try:
-                opt = options_locator.nth(i)
-                value = opt.get_attribute("value") or ""
-                text = (opt.inner_text() or "").strip()
-                # Skip empty options or default "select city" options
-                if text and value and text.lower() not in ["", "il seçiniz", "şehir seçiniz", "seçiniz"]:
-                    result.append({"value": value, "text": text})
-            except Exception:
-                continue
-        return result
+        opts = page.eval_on_selector_all(
+            "#ContentPlaceHolder1_ddlCity option",
+            "nodes => nodes.map(o => ({value: o.value || '', text: (o.textContent || '').trim()}))",
+        )
+        # Skip empty options or default "select city" options
+        return [
+            o for o in opts
+            if o["text"] and o["value"] and o["text"].lower() not in ["il seçiniz", "şehir seçiniz", "seçiniz"]
+        ]
     except Exception as e:
         print(f"Error getting city options: {e}")
         return []
@@ -93,15 +98,15 @@ def _select_city_and_submit(page: Page, city_value: str, city_text: str, debug:
     except Exception as e:
         print(f"  Error selecting city {city_text}: {e}")
         if debug:
-            import traceback
             traceback.print_exc()
             page.screenshot(path=f"debug_lukoil_select_{city_text.replace(' ', '_')}.png")
 
 
-def _extract_city_prices_from_table(page: Page, logical_city_name: str) -> List[LukoilPriceRow]:
+def _extract_city_prices_from_table(page: Page, logical_city_name: str, debug: bool = False) -> List[LukoilPriceRow]:
     """Extract all district rows for the current city from the prices table."""
     prices: List[LukoilPriceRow] = []
-    seen_districts: set[str] = set()  # Track districts we've already seen to avoid duplicates
+    # Normalized district key -> row; first occurrence wins and insertion order is kept
+    rows_by_district: Dict[str, LukoilPriceRow] = {}
     try:
         # Wait for table to appear
         print(f"  Waiting for price table for {logical_city_name}...")
@@ -121,8 +126,6 @@ def _extract_city_prices_from_table(page: Page, logical_city_name: str) -> List[
             print(f"  No rows found in table for {logical_city_name}")
             return prices
         
-        print(f"  Found {row_count} rows in table")
-        
         # Extract data from each row
         for i in range(row_count):
             try:
@@ -144,16 +147,15 @@ def _extract_city_prices_from_table(page: Page, logical_city_name: str) -> List[
                 if not district_text:
                     continue
                 
-                # Normalize district name for comparison
-                normalized_district = _normalize_location_name(district_text).upper()
+                # Normalize once; reused both as the dedup key and the output name
+                district_name = " ".join(district_text.split())
+                district_key = district_name.upper()
                 
                 # Skip if we've already seen this district (deduplication)
-                if normalized_district in seen_districts:
+                if district_key in rows_by_district:
                     print(f"  Skipping duplicate district: {district_text}")
                     continue
                 
-                seen_districts.add(normalized_district)
-                
                 # Extract prices from cells
                 # The exact column order may vary, so we'll try to extract all numeric values
                 def get_cell_text(idx: int) -> str:
@@ -168,9 +170,9 @@ def _extract_city_prices_from_table(page: Page, logical_city_name: str) -> List[
                 # Based on the fuel types mentioned, we expect at least 7 columns
                 # We'll extract them in order: district, then prices
                 # Adjust indices based on actual table structure
-                prices.append(LukoilPriceRow(
+                rows_by_district[district_key] = LukoilPriceRow(
                     city=logical_city_name,
-                    district=_normalize_location_name(district_text),
+                    district=district_name,
                     kursunsuz_benzin=get_cell_text(1) if cell_count > 1 else "-",
                     motorin=get_cell_text(2) if cell_count > 2 else "-",
                     ecto_eurodiesel=get_cell_text(3) if cell_count > 3 else "-",
@@ -178,42 +180,43 @@ def _extract_city_prices_from_table(page: Page, logical_city_name: str) -> List[
                     fuel_oil=get_cell_text(5) if cell_count > 5 else "-",
                     kalorifer_yakiti=get_cell_text(6) if cell_count > 6 else "-",
                     gaz_yagi=get_cell_text(7) if cell_count > 7 else "-",
-                ))
+                )
             except Exception as e:
                 print(f"  Error extracting row {i}: {e}")
                 continue
         
+        prices = list(rows_by_district.values())
         print(f"  Extracted {len(prices)} unique price rows for {logical_city_name}")
         return prices
     except Exception as e:
         print(f"  Error extracting prices for {logical_city_name}: {e}")
-        import traceback
-        traceback.print_exc()
-        return prices
+        if debug:
+            traceback.print_exc()
+        return list(rows_by_district.values())
 
 
-def _write_lukoil_prices_to_text(city_name: str, prices: List[LukoilPriceRow], output_file: Path) -> None:
-    """Write Lukoil prices to txt. One line per district (no city header line)."""
-    if not prices:
-        output_file.write_text("", encoding="utf-8")
-        return
-    
-    lines: List[str] = []
-    for p in prices:
-        loc = _normalize_location_name(p.district)
-        parts = [
-            loc,
-            f"K.Benzin 95 Oktan: {p.kursunsuz_benzin}",
-            f"Motorin: {p.motorin}",
-            f"Ecto Eurodiesel: {p.ecto_eurodiesel}",
-            f"Yüksek Kükürtlü Fuel Oil: {p.yuksek_kukurtlu_fuel_oil}",
-            f"Fuel Oil: {p.fuel_oil}",
-            f"Kalorifer Yakıtı: {p.kalorifer_yakiti}",
-            f"Gaz Yağı: {p.gaz_yagi}",
-        ]
-        lines.append(" | ".join(parts))
-    
-    output_file.write_text("\n".join(lines), encoding="utf-8")
+# One output line per district; labels are baked in once instead of per-row f-strings
+_LINE_TEMPLATE = (
+    "{} | K.Benzin 95 Oktan: {} | Motorin: {} | Ecto Eurodiesel: {} | Yüksek Kükürtlü Fuel Oil: {}"
+    " | Fuel Oil: {} | Kalorifer Yakıtı: {} | Gaz Yağı: {}"
+).format
+
+
+def _render_lukoil_prices(prices: List[LukoilPriceRow]) -> bytes:
+    """Lukoil txt content: one line per district (no city header line)."""
+    return "\n".join(
+        _LINE_TEMPLATE(
+            _normalize_location_name(p.district),
+            p.kursunsuz_benzin,
+            p.motorin,
+            p.ecto_eurodiesel,
+            p.yuksek_kukurtlu_fuel_oil,
+            p.fuel_oil,
+            p.kalorifer_yakiti,
+            p.gaz_yagi,
+        )
+        for p in prices
+    ).encode("utf-8")
 
 
 def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Path]:
@@ -227,17 +230,14 @@ def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Pa
         List of Path objects for saved files
     """
     output_dir.mkdir(parents=True, exist_ok=True)
-    saved_files: List[Path] = []
+    # (path, content) per city; written together once the browser is done
+    pending: List[Tuple[Path, bytes]] = []
+    failed: List[str] = []
+    complete = False
+    state_file = storage_state_path(output_dir, "lukoil")
+    storage_state = load_storage_state(state_file)
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=not debug,
-            slow_mo=500 if debug else 0,
-        )
-        context = browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        )
+    with acquire_context(debug=debug, block_resources=False, storage_state=storage_state, **_CONTEXT_KWARGS) as context:
         page = context.new_page()
         
         try:
@@ -253,10 +253,11 @@ def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Pa
                 print("Error: No city options found. Check if the dropdown selector is correct.")
                 if debug:
                     page.screenshot(path="debug_lukoil_no_cities.png")
-                browser.close()
                 return []
             
             print(f"Found {len(city_options)} cities")
+            if storage_state is None:
+                save_storage_state(context, state_file)
             
             # Process each city
             for idx, city_opt in enumerate(city_options, 1):
@@ -275,16 +276,15 @@ def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Pa
                     _select_city_and_submit(page, city_value, city_text, debug=debug)
                     
                     # Extract prices
-                    prices = _extract_city_prices_from_table(page, logical_city_name)
+                    prices = _extract_city_prices_from_table(page, logical_city_name, debug=debug)
                     
                     if prices:
-                        # Write file immediately (incremental)
                         normalized_city = _normalize_city_name_for_filename(logical_city_name)
                         output_file = output_dir / f"lukoil_{normalized_city}_prices.txt"
-                        _write_lukoil_prices_to_text(logical_city_name, prices, output_file)
-                        saved_files.append(output_file)
-                        print(f"  ✓ Saved {len(prices)} districts to {output_file.name}")
+                        pending.append((output_file, _render_lukoil_prices(prices)))
+                        print(f"  ✓ {len(prices)} districts for {output_file.name}")
                     else:
+                        failed.append(logical_city_name)
                         print(f"  ⚠ No prices extracted for {logical_city_name}")
                     
                     # Random delay between cities to avoid being blocked
@@ -294,24 +294,25 @@ def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Pa
                         page.wait_for_timeout(int(delay * 1000))
                 
                 except Exception as e:
+                    failed.append(logical_city_name)
                     print(f"  ✗ Error processing {logical_city_name}: {e}")
                     if debug:
-                        import traceback
                         traceback.print_exc()
                         page.screenshot(path=f"debug_lukoil_error_{logical_city_name.replace(' ', '_')}.png")
                     continue
             
-            print(f"\n✓ Completed! Saved {len(saved_files)} files to {output_dir}")
+            complete = True
+            print(f"\n✓ Completed! {len(pending)} files for {output_dir}")
         
         except Exception as e:
             print(f"Error during scraping: {e}")
             if debug:
-                import traceback
                 traceback.print_exc()
                 page.screenshot(path="debug_lukoil_general_error.png")
-        
-        finally:
-            browser.close()
     
-    return saved_files
+    # Cities scraped before an error are still written
+    write_files(pending)
+    files = [fp for fp, _ in pending]
+    # A run cut short by an error is handed back as a plain list so it is not reused
+    return SavedFiles(files, failed) if complete else files
 
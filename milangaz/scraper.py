@@ -1,14 +1,67 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
-import random
-import time
+import itertools
+import json
 import re
 
-from playwright.sync_api import sync_playwright, Page, TimeoutError as PWTimeoutError
+from playwright.sync_api import Page, TimeoutError as PWTimeoutError
+
+from common.browser import StorageStateRecorder, block_trackers, storage_state_path
+from common.browser_pool import acquire_context
+from common.http_session import KeepAliveClient, get_client
+from common.city_cache import city_cache_path, load_cached_cities, save_cached_cities, invalidate_cached_cities
+from common.file_writer import BackgroundWriter, write_file
+from common.price_cache import SavedFiles
+from common.rate_limit import TokenBucket
+from common.workers import iter_parallel_pages
+from common.xhr import cookie_header, request_carries, substitute_value
 
 MILANGAZ_URL = "https://milangaz.com.tr/otogaz/lpg-ve-otogaz-il-tavan-fiyatlari/"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+# True once the displayed price differs from the value captured before the city change
+_PRICE_CHANGED_JS = """(old) => {
+	const el = document.querySelector('.productprice strong');
+	return !!el && el.innerText.trim() !== '' && el.innerText.trim() !== old;
+}"""
+
+# Price fragment inside an XHR/HTML response: <... class="productprice ..."> ... <strong>12,34</strong>
+_PRICE_FRAGMENT_RE = re.compile(r'productprice[^>]*>.*?<strong[^>]*>\s*([^<]+?)\s*</strong>', re.S | re.I)
+
+
+# Turkish letters -> ASCII, separators -> "_" (single pass via str.translate)
+_TR_FILENAME_TABLE = str.maketrans({
+	"İ": "I",
+	"ı": "i",
+	"Ş": "S",
+	"ş": "s",
+	"Ğ": "G",
+	"ğ": "g",
+	"Ü": "U",
+	"ü": "u",
+	"Ö": "O",
+	"ö": "o",
+	"Ç": "C",
+	"ç": "c",
+	"-": "_",
+	" ": "_",
+})
+_FILENAME_STRIP_RE = re.compile(r"[^A-Z0-9_]")
+
+_PRICE_RE = re.compile(r"(\d+[.,]?\d*)")
+
+# Spellings of the two Istanbul options (matched against the upper-cased option text)
+_IST_ANADOLU = ("İSTANBUL-ANADOLU", "ISTANBUL-ANADOLU", "İSTANBUL ANADOLU")
+_IST_AVRUPA = ("İSTANBUL-AVRUPA", "ISTANBUL-AVRUPA", "İSTANBUL AVRUPA")
+
 
 @dataclass
 class MilangazPriceRow:
@@ -20,61 +73,46 @@ class MilangazPriceRow:
 
 def _normalize_city_name_for_filename(city_name: str) -> str:
 	"""Normalize city name for filenames (uppercase ASCII-ish)."""
-	replacements = {
-		"İ": "I",
-		"ı": "i",
-		"Ş": "S",
-		"ş": "s",
-		"Ğ": "G",
-		"ğ": "g",
-		"Ü": "U",
-		"ü": "u",
-		"Ö": "O",
-		"ö": "o",
-		"Ç": "C",
-		"ç": "c",
-		"-": "_",
-		" ": "_",
-	}
-	n = city_name
-	for src, dst in replacements.items():
-		n = n.replace(src, dst)
 	# Remove any remaining non-alnum/underscore
-	n = re.sub(r"[^A-Z0-9_]", "", n.upper())
-	return n
+	return _FILENAME_STRIP_RE.sub("", city_name.translate(_TR_FILENAME_TABLE).upper())
 
 
-def _write_milangaz_price_to_text(city_label: str, price: str, output_file: Path, append: bool = False) -> None:
-	"""Write one line 'CITY: PRICE' to txt, optionally appending."""
+def _write_milangaz_price_to_text(city_label: str, price: str, output_file: Path, writer: Optional[BackgroundWriter] = None) -> None:
+	"""Write one line 'CITY: PRICE' to txt."""
 	if not price:
 		return
+	write_file(output_file, f"{city_label}: {price}".encode("utf-8"), writer)
 
-	line = f"{city_label}: {price}"
 
-	if append and output_file.exists():
-		existing = output_file.read_text(encoding="utf-8").strip()
-		if existing:
-			output_file.write_text(f"{existing}\n{line}", encoding="utf-8")
-		else:
-			output_file.write_text(line, encoding="utf-8")
-	else:
-		output_file.write_text(line, encoding="utf-8")
+def _istanbul_label(city_text: str) -> Optional[str]:
+	"""Output label for the two Istanbul options, None for any other city."""
+	upper_text = city_text.strip().upper()
+	if any(s in upper_text for s in _IST_ANADOLU):
+		return "İstanbul (Anadolu)"
+	if any(s in upper_text for s in _IST_AVRUPA):
+		return "İstanbul (Avrupa)"
+	return None
 
 
 def _get_city_options(page: Page) -> List[Dict[str, str]]:
-	"""Return list of city options from the Milangaz select."""
+	"""Return list of city options from the Milangaz select (single evaluate round-trip)."""
 	page.wait_for_selector("select#iller", state="visible", timeout=15000)
-	options = page.query_selector_all("select#iller option")
+	# Empty value is the "Seçiniz" placeholder
+	return page.evaluate(
+		"""() => [...document.querySelectorAll('select#iller option')]
+			.map(o => ({value: (o.value || '').trim(), text: (o.innerText || '').trim()}))
+			.filter(o => o.value && o.text)"""
+	)
 
-	result: List[Dict[str, str]] = []
-	for opt in options:
-		value = (opt.get_attribute("value") or "").strip()
-		text = (opt.inner_text() or "").strip()
-		if not value or not text or value == "":
-			# Skip the "Seçiniz" placeholder
-			continue
-		result.append({"value": value, "text": text})
-	return result
+
+def _normalize_price_text(raw: str) -> str:
+	"""Turn a displayed price ('12,34 TL') into '12.34'."""
+	raw = raw.strip()
+	raw_normalized = raw.replace(".", "").replace(",", ".") if "," in raw and raw.count(",") == 1 else raw
+	m = _PRICE_RE.search(raw_normalized)
+	if not m:
+		return raw
+	return m.group(1).replace(",", ".")
 
 
 def _extract_price_from_page(page: Page) -> str:
@@ -84,14 +122,9 @@ def _extract_price_from_page(page: Page) -> str:
 	except PWTimeoutError:
 		return ""
 
-	raw = page.locator(".productprice strong").first.inner_text().strip()
+	raw = page.locator(".productprice strong").first.inner_text()
 	# Handle Turkish decimal comma
-	raw_normalized = raw.replace(".", "").replace(",", ".") if "," in raw and raw.count(",") == 1 else raw
-	m = re.search(r"(\d+[.,]?\d*)", raw_normalized)
-	if not m:
-		return raw.strip()
-	price_str = m.group(1).replace(",", ".")
-	return price_str
+	return _normalize_price_text(raw)
 
 
 def _select_city_and_get_price(page: Page, city_value: str, city_text: str, debug: bool = False) -> str:
@@ -100,18 +133,23 @@ def _select_city_and_get_price(page: Page, city_value: str, city_text: str, debu
 		page.wait_for_selector("select#iller", state="visible", timeout=15000)
 		select = page.locator("select#iller")
 
+		# Remember the current price so we can tell when the new city's price lands
+		prev = page.evaluate("() => (document.querySelector('.productprice strong')?.innerText || '').trim()")
+
 		# Select the city
 		select.select_option(value=city_value)
 
-		# Allow JS/Ajax to run and update price
-		page.wait_for_timeout(1500)
-
-		# Sometimes the form shows a loading spinner; give a bit more time
+		# Wait for the price element, then for its text to change (returns as soon as JS/Ajax updates it)
 		try:
 			page.wait_for_selector(".product-detail.show .productprice strong", state="visible", timeout=8000)
 		except PWTimeoutError:
 			if debug:
 				print(f"  Warning: price element did not become visible for {city_text}")
+		try:
+			page.wait_for_function(_PRICE_CHANGED_JS, arg=prev, timeout=5000)
+		except PWTimeoutError:
+			# Same price as the previous city (or no update); read whatever is shown
+			pass
 
 		price = _extract_price_from_page(page)
 		if not price or price in ("0", "0.0", "0.00"):
@@ -127,15 +165,202 @@ def _select_city_and_get_price(page: Page, city_value: str, city_text: str, debu
 		return ""
 
 
+def _discover_price_request(page: Page, city_value: str) -> Optional[Dict[str, str]]:
+	"""Select a city while listening for the XHR the change handler fires.
+
+	Returns a request template (method/url/post_data/headers) that can be replayed for
+	other cities, or None if the site only toggles pre-rendered DOM (no XHR carries the value).
+	"""
+	def _carries_city(req) -> bool:
+		return req.resource_type in ("xhr", "fetch") and request_carries(req.url, req.post_data, city_value)
+
+	try:
+		with page.expect_request(_carries_city, timeout=4000) as req_info:
+			page.locator("select#iller").select_option(value=city_value)
+		req = req_info.value
+	except Exception:
+		return None
+	return {
+		"method": req.method,
+		"url": req.url,
+		"post_data": req.post_data or "",
+		"headers": {k: v for k, v in req.headers.items() if k.lower() in ("x-requested-with", "content-type", "accept", "referer")},
+		"value": city_value,
+	}
+
+
+def _extract_price_from_response(body: str) -> str:
+	"""Pull the price out of the replayed XHR response (HTML fragment or JSON)."""
+	m = _PRICE_FRAGMENT_RE.search(body)
+	if m:
+		return _normalize_price_text(m.group(1))
+	try:
+		data = json.loads(body)
+	except ValueError:
+		return ""
+	stack = [data]
+	while stack:
+		node = stack.pop()
+		if isinstance(node, dict):
+			for k, v in node.items():
+				if isinstance(v, (str, int, float)) and any(t in k.lower() for t in ("fiyat", "price")):
+					return _normalize_price_text(str(v))
+				stack.append(v)
+		elif isinstance(node, list):
+			stack.extend(node)
+		elif isinstance(node, str) and "productprice" in node:
+			m = _PRICE_FRAGMENT_RE.search(node)
+			if m:
+				return _normalize_price_text(m.group(1))
+	return ""
+
+
+def _fetch_price_http(client: KeepAliveClient, template: Dict[str, str], city_value: str, cookie_header: str = "") -> str:
+	"""Replay the discovered XHR for another city over the shared keep-alive client.
+
+	`cookie_header` carries the browser context's cookies so the server sees the same session.
+	"""
+	url = substitute_value(template["url"], template["value"], city_value)
+	data = substitute_value(template["post_data"], template["value"], city_value)
+	headers = dict(template["headers"])
+	if cookie_header:
+		headers["Cookie"] = cookie_header
+	try:
+		resp = client.request(template["method"], url, body=data.encode("utf-8") if data else None, headers=headers)
+	except Exception:
+		return ""
+	if not resp.ok:
+		return ""
+	return _extract_price_from_response(resp.text())
+
+
+def _open_milangaz_page(context, url: str = MILANGAZ_URL) -> Page:
+	"""Open the Milangaz price page in a context."""
+	page = context.new_page()
+	block_trackers(context, page)
+	page.set_default_navigation_timeout(45000)
+	page.goto(url, wait_until="domcontentloaded")
+	# The city select is the only thing we need; don't wait for analytics to go idle
+	page.wait_for_selector("select#iller", state="attached", timeout=15000)
+	return page
+
+
+def _fetch_prices_in_page(page: Page, template: Dict[str, str], cities: List[Dict[str, str]]) -> Dict[str, str]:
+	"""Replay the discovered XHR for every city inside the page with one evaluate call.
+
+	The requests run sequentially in the browser (same cookies/nonce as the page);
+	returns {city value: price} for the cities whose response contained a price.
+	"""
+	requests = [
+		{
+			"value": c["value"],
+			"url": substitute_value(template["url"], template["value"], c["value"]),
+			"body": substitute_value(template["post_data"], template["value"], c["value"]) or None,
+		}
+		for c in cities
+	]
+	headers = {k: v for k, v in template["headers"].items() if k.lower() != "referer"}
+	bodies: Dict[str, str] = page.evaluate(
+		"""async ({requests, method, headers}) => {
+			const out = {};
+			for (const r of requests) {
+				try {
+					const resp = await fetch(r.url, {method, headers, body: method === 'GET' ? undefined : r.body, credentials: 'include'});
+					if (resp.ok) out[r.value] = await resp.text();
+				} catch (e) {}
+			}
+			return out;
+		}""",
+		{"requests": requests, "method": template["method"], "headers": headers},
+	)
+	prices: Dict[str, str] = {}
+	for value, body in bodies.items():
+		price = _extract_price_from_response(body)
+		if price:
+			prices[value] = price
+	return prices
+
+
+def _bootstrap_cities(state: StorageStateRecorder, url: str = MILANGAZ_URL, debug: bool = False) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+	"""Load the page once, read the #iller options and, if the city change is XHR-backed,
+	fetch every city's price from inside that page.
+
+	Returns (cities, {city value: price}); cities missing from the dict still need the UI path.
+	"""
+	with acquire_context(debug=debug, **state.context_kwargs(_CONTEXT_KWARGS)) as context:
+		page = _open_milangaz_page(context, url)
+		state.record(context)
+		cities = _get_city_options(page)
+		if not cities:
+			return cities, {}
+		template = _discover_price_request(page, cities[0]["value"])
+		if not template:
+			return cities, {}
+		print(f"Milangaz: fiyat isteği bulundu ({template['method']} {template['url']}), tüm şehirler sayfa içinden çekiliyor.")
+		try:
+			return cities, _fetch_prices_in_page(page, template, cities)
+		except Exception as e:
+			print(f"Milangaz: sayfa içi toplu çekim başarısız: {e}")
+			return cities, {}
+
+
+class _MilangazSession:
+	"""Per-worker page plus the XHR template discovered on that worker's first city."""
+
+	def __init__(self, context, url: str, state: StorageStateRecorder):
+		self.context = context
+		self.page = _open_milangaz_page(context, url)
+		state.record(context)
+		self.price_request: Optional[Dict[str, str]] = None
+		self.cookie_header = ""
+		self.discovered = False
+
+	def fetch_price(self, city: Dict[str, str], bucket: TokenBucket, debug: bool = False) -> str:
+		value = city["value"]
+		text = city["text"].strip()
+		print(f"Şehir: {text} (value={value})")
+		if not self.page.evaluate("v => [...document.querySelectorAll('select#iller option')].some(o => o.value === v)", value):
+			# Yalnızca önbellekteki şehir listesi eskidiyse olur
+			raise LookupError(f"city option value={value} not found on Milangaz page")
+
+		# Every request, replayed XHR or browser selection, is paced by the shared bucket
+		bucket.acquire()
+		# Capture the XHR behind the city change once; later cities replay it over the shared
+		# keep-alive HTTP client (with the page's cookies) instead of driving the UI.
+		if not self.discovered:
+			self.discovered = True
+			self.price_request = _discover_price_request(self.page, value)
+			if self.price_request:
+				self.cookie_header = cookie_header(self.context, self.price_request["url"])
+				print(f"Milangaz: fiyat isteği bulundu ({self.price_request['method']} {self.price_request['url']}), HTTP ile devam ediliyor.")
+
+		if self.price_request:
+			price = _fetch_price_http(get_client(), self.price_request, value, self.cookie_header)
+			if price:
+				return price
+			# Başarısız / boş HTTP yanıtı: yavaşla, tarayıcı denemesi için yeni jeton al
+			bucket.backoff()
+			bucket.acquire()
+		# Tarayıcı üzerinden seçim
+		price = _select_city_and_get_price(self.page, value, text, debug=debug)
+		if not price:
+			# Zaman aşımı / boş yanıt: site yavaşlamamızı istiyor olabilir
+			bucket.backoff()
+		return price
+
+
 def save_all_cities_prices_txt(
 	output_dir: Path,
 	url: str = MILANGAZ_URL,
 	debug: bool = False,
 	min_delay: float = 0.8,
 	max_delay: float = 1.6,
+	workers: int = 4,
 ) -> List[Path]:
 	"""
 	Tüm şehirler için Milangaz Otogaz fiyatlarını çekip txt dosyalarına yazar.
+	Şehirler `workers` adet paralel tarayıcı context'ine dağıtılır (debug modunda 1).
+	Şehir listesi 30 gün boyunca, çerez/localStorage durumu ise kalıcı olarak output_dir/.cache altında saklanır.
 
 	Çıktılar: milangaz/milangaz_<ŞEHİR>_prices.txt
 	İstanbul (Anadolu) ve İstanbul (Avrupa) birleştirilir: milangaz_ISTANBUL_prices.txt
@@ -143,82 +368,98 @@ def save_all_cities_prices_txt(
 	output_dir.mkdir(parents=True, exist_ok=True)
 	saved_files: List[Path] = []
 
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
+	state = StorageStateRecorder(storage_state_path(output_dir, "milangaz"))
+	# İlk çalıştırmada eski rastgele beklemeyle aynı toplam hız; sonraki çalıştırmalar kayıtlı hızdan başlar
+	bucket = TokenBucket.for_brand("milangaz", default_rps=(1 if debug else workers) * 2 / (min_delay + max_delay))
+	cache_file = city_cache_path(output_dir, "milangaz")
+	cached = load_cached_cities(cache_file, url)
+	if cached is not None:
+		# Warm run: skip the bootstrap page, workers handle every city
+		cities, prefetched = cached, {}
+		print(f"Milangaz: önbellekten {len(cities)} şehir kullanılıyor.")
+	else:
+		# Get city options from select (and every price at once, when the site exposes the XHR)
+		cities, prefetched = _bootstrap_cities(state, url, debug=debug)
+		print(f"Milangaz: {len(cities)} şehir bulundu, {len(prefetched)} fiyat tek seferde alındı.")
+		save_cached_cities(cache_file, url, cities)
+
+	istanbul_output = output_dir / "milangaz_ISTANBUL_prices.txt"
+	istanbul_prices: Dict[int, Dict[str, str]] = {}  # option index -> Istanbul price, written together
+	missing: Dict[str, str] = {}  # option value -> city that got no price, so a partial run is not reused
+
+	def _collect(writer: BackgroundWriter, cities: List[Dict[str, str]], prefetched: Dict[str, str], offset: int) -> List[str]:
+		"""Write every city's price as it arrives; returns the option values that raised."""
+		order = {c["value"]: offset + i for i, c in enumerate(cities)}
+		# Istanbul options are classified once per option value, not per result
+		istanbul_labels = {c["value"]: _istanbul_label(c["text"]) for c in cities}
+		remaining = [c for c in cities if c["value"] not in prefetched]
+		results = itertools.chain(
+			((order[c["value"]], c, prefetched[c["value"]]) for c in cities if c["value"] in prefetched),
+			(
+				(order[city["value"]], city, price)
+				for _, city, price in iter_parallel_pages(
+					remaining,
+					work=lambda session, city: session.fetch_price(city, bucket, debug=debug),
+					setup=lambda context: _MilangazSession(context, url, state),
+					workers=1 if debug else workers,
+					debug=debug,
+					context_kwargs=state.context_kwargs(_CONTEXT_KWARGS),
+				)
+			),
 		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-
-		# Get city options from select
-		cities = _get_city_options(page)
-		print(f"Milangaz: {len(cities)} şehir bulundu.")
-
-		istanbul_output = output_dir / "milangaz_ISTANBUL_prices.txt"
-		istanbul_prices: List[Dict[str, str]] = []  # Store Istanbul prices to write together
 
-		for idx, city in enumerate(cities, 1):
-			value = city["value"]
+		failed: List[str] = []
+		for idx, city, price in results:
 			text = city["text"].strip()
-
-			print(f"\n[{idx}/{len(cities)}] Şehir: {text} (value={value})")
-
-			price = _select_city_and_get_price(page, value, text, debug=debug)
+			if isinstance(price, Exception):
+				print(f"  Error selecting {text} ({city['value']}): {price}")
+				failed.append(city["value"])
+				missing[city["value"]] = text
+				continue
 			if not price:
 				print(f"  ⚠ Fiyat alınamadı: {text}")
+				missing[city["value"]] = text
 				continue
 
-			print(f"  Fiyat: {price} TL/lt")
+			print(f"  {text} fiyat: {price} TL/lt")
 
-			upper_text = text.upper()
-			is_istanbul_anadolu = "İSTANBUL-ANADOLU" in upper_text or "ISTANBUL-ANADOLU" in upper_text or "İSTANBUL ANADOLU" in upper_text
-			is_istanbul_avrupa = "İSTANBUL-AVRUPA" in upper_text or "ISTANBUL-AVRUPA" in upper_text or "İSTANBUL AVRUPA" in upper_text
-
-			if is_istanbul_anadolu or is_istanbul_avrupa:
+			label = istanbul_labels.get(city["value"])
+			if label:
 				# Store Istanbul prices to write together at the end
-				label = "İstanbul (Anadolu)" if is_istanbul_anadolu else "İstanbul (Avrupa)"
-				istanbul_prices.append({"label": label, "price": price})
+				istanbul_prices[idx] = {"label": label, "price": price}
 				print(f"  ✓ İstanbul fiyatı toplandı: {label}")
 			else:
 				# Write other cities immediately
 				norm = _normalize_city_name_for_filename(text)
 				fp = output_dir / f"milangaz_{norm}_prices.txt"
-				_write_milangaz_price_to_text(text.title(), price, fp, append=False)
+				_write_milangaz_price_to_text(text.title(), price, fp, writer)
 				saved_files.append(fp)
 				print(f"  ✓ Kaydedildi: {fp.name}")
-
-			# Küçük rastgele bekleme
-			if idx < len(cities):
-				time.sleep(random.uniform(min_delay, max_delay))
-
-		# Write Istanbul file with both entries
+		return failed
+
+	# Dosyalar tek bir arka plan thread'inde yazılır; ana döngü bir sonraki sonuca geçer
+	with BackgroundWriter() as writer:
+		failed = _collect(writer, cities, prefetched, 0)
+
+		# Önbellekteki bir şehir sayfada yoksa liste değişmiştir: yeniden çek, eksikleri tamamla
+		if cached is not None and failed:
+			print("Milangaz: önbellekteki şehir listesi eski görünüyor, yeniden çekiliyor.")
+			invalidate_cached_cities(cache_file)
+			fresh, fresh_prefetched = _bootstrap_cities(state, url, debug=debug)
+			save_cached_cities(cache_file, url, fresh)
+			done = {c["value"] for c in cities} - set(failed)
+			# Yeniden çekilen şehirlerin sonucu ikinci geçişten gelir; sayfadan kalkanlar eksik sayılmaz
+			for value in failed:
+				missing.pop(value, None)
+			_collect(writer, [c for c in fresh if c["value"] not in done], fresh_prefetched, len(cities))
+
+		# Write Istanbul file with both entries (in option order)
 		if istanbul_prices:
-			# Write first entry
-			_write_milangaz_price_to_text(istanbul_prices[0]["label"], istanbul_prices[0]["price"], istanbul_output, append=False)
-			# Append remaining entries
-			for price_data in istanbul_prices[1:]:
-				_write_milangaz_price_to_text(price_data["label"], price_data["price"], istanbul_output, append=True)
+			lines = (f"{p['label']}: {p['price']}" for _, p in sorted(istanbul_prices.items()))
+			writer.write(istanbul_output, "\n".join(lines).encode("utf-8"))
 			saved_files.append(istanbul_output)
 			print(f"\n✓ İstanbul dosyası yazıldı ({len(istanbul_prices)} fiyat): {istanbul_output.name}")
 
-			# Küçük rastgele bekleme
-			if idx < len(cities):
-				time.sleep(random.uniform(min_delay, max_delay))
-
-		browser.close()
-
+	bucket.persist()
 	print(f"\nToplam {len(saved_files)} dosya yazıldı -> {output_dir}")
-	return saved_files
-
-
+	return SavedFiles(saved_files, missing.values())
@@ -1,11 +1,35 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Set
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError, Page
-import random
+from playwright.sync_api import TimeoutError as PWTimeoutError, Page
+import threading
+
+from common.browser import StorageStateRecorder, block_trackers, storage_state_path
+from common.browser_pool import acquire_context
+from common.city_cache import city_cache_path, load_cached_cities, save_cached_cities, invalidate_cached_cities
+from common.file_writer import BackgroundWriter
+from common.price_cache import SavedFiles
+from common.rate_limit import TokenBucket
+from common.workers import iter_parallel_pages
 
 MOIL_URL = "https://www.moil.com.tr/akaryakit-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    locale="tr-TR",
+    timezone_id="Europe/Istanbul",
+    viewport={"width": 1280, "height": 900},
+    ignore_https_errors=True,
+)
+
+
+# Turkish letters -> ASCII, applied in one pass via str.translate
+_TR_ASCII_TABLE = str.maketrans({
+    "İ": "I", "ı": "i", "ş": "s", "Ş": "S",
+    "ğ": "g", "Ğ": "G", "ü": "u", "Ü": "U",
+    "ö": "o", "Ö": "O", "ç": "c", "Ç": "C",
+})
+
 
 @dataclass
 class MoilPriceRow:
@@ -21,6 +45,23 @@ class MoilPriceRow:
     yk_fuel_oil: str
 
 
+_ROWS_SELECTOR = ".distributor_list table.table-hover tbody tr"
+
+# SHA-256 of the price tbody's outerHTML, computed in the page so only the hex digest crosses CDP
+_TABLE_DIGEST_JS = """async () => {
+    const t = document.querySelector('.distributor_list table.table-hover tbody');
+    if (!t || !crypto.subtle) return '';
+    const buf = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(t.outerHTML));
+    return [...new Uint8Array(buf)].map(b => b.toString(16).padStart(2, '0')).join('');
+}"""
+
+# True once the first district cell differs from the baseline captured before the click
+_TABLE_CHANGED_JS = """(b) => {
+    const el = document.querySelector('.distributor_list table.table-hover tbody tr td');
+    return !!el && el.innerText.trim() !== '' && el.innerText !== b;
+}"""
+
+
 def _ensure_cookie_accepted(page: Page) -> None:
     """Accept cookie banner if present."""
     try:
@@ -35,27 +76,32 @@ def _ensure_cookie_accepted(page: Page) -> None:
 
 def _get_city_options(page: Page) -> List[Dict[str, str]]:
     """Return list of city options from #cityId select."""
-    options = page.locator("#cityId option").all()
-    result: List[Dict[str, str]] = []
-    for opt in options:
-        value = opt.get_attribute("value") or ""
-        text = (opt.inner_text() or "").strip()
-        if not text or not value:
-            continue
-        result.append({"value": value, "text": text})
-    return result
+    # One round-trip for every option instead of get_attribute + inner_text per option
+    data = page.locator("#cityId option").evaluate_all(
+        "nodes => nodes.map(n => ({value: n.value || '', text: (n.innerText || '').trim()}))"
+    )
+    return [d for d in data if d["value"] and d["text"]]
+
 
+def _select_city_and_submit(page: Page, city_value: str, debug: bool = False) -> bool:
+    """Select a city in #cityId and click the 'Sonuçları Göster' button.
 
-def _select_city_and_submit(page: Page, city_value: str, debug: bool = False) -> None:
-    """Select a city in #cityId and click the 'Sonuçları Göster' button."""
+    Returns False when a Playwright step timed out (the site may be throttling us).
+    """
     print(f"Selecting city value={city_value}...")
+    timed_out = False
     try:
         page.select_option("#cityId", value=city_value)
-    except TimeoutError:
+    except PWTimeoutError:
+        timed_out = True
         print(f"  Timeout while selecting city value={city_value}")
     except Exception as e:
         print(f"  Error selecting city {city_value}: {e}")
 
+    baseline = page.evaluate(
+        "() => document.querySelector('.distributor_list table.table-hover tbody tr td')?.innerText || ''"
+    )
+
     # Click the button that triggers price list update
     try:
         page.click("button[onclick='pompaFiyatList();']")
@@ -64,71 +110,51 @@ def _select_city_and_submit(page: Page, city_value: str, debug: bool = False) ->
         try:
             page.get_by_text("Sonuçları Göster").click()
         except Exception as e:
+            timed_out = timed_out or isinstance(e, PWTimeoutError)
             print(f"  Error clicking 'Sonuçları Göster' button: {e}")
 
-    # Wait for table to update
-    try:
-        page.wait_for_load_state("networkidle", timeout=20000)
-    except Exception:
-        pass
+    # Wait for the table itself to update instead of the whole network going idle
     try:
-        page.wait_for_selector(".distributor_list table.table-hover tbody tr", timeout=15000)
+        page.wait_for_selector(_ROWS_SELECTOR, timeout=15000)
     except Exception as e:
+        timed_out = timed_out or isinstance(e, PWTimeoutError)
         print(f"  Warning: price table rows did not appear after city change: {e}")
-    page.wait_for_timeout(random.uniform(500, 1500))
+    try:
+        page.wait_for_function(_TABLE_CHANGED_JS, arg=baseline, timeout=10000)
+    except Exception:
+        # First district unchanged (or table reloaded with identical first row)
+        pass
+    return not timed_out
 
 
 def _extract_city_prices_from_table(page: Page, logical_city_name: str) -> List[MoilPriceRow]:
-    """Extract all district rows for the current city from the prices table."""
-    rows = page.locator(".distributor_list table.table-hover tbody tr")
-    row_count = rows.count()
+    """Extract all district rows for the current city from the prices table (one evaluate call)."""
+    data: List[List[str]] = page.evaluate(
+        """(sel) => Array.from(document.querySelectorAll(sel)).map(
+            r => Array.from(r.querySelectorAll('td')).map(td => td.innerText.trim())
+        )""",
+        _ROWS_SELECTOR,
+    )
     prices: List[MoilPriceRow] = []
-    if row_count == 0:
+    if not data:
         print("  Warning: price table has 0 rows for city", logical_city_name)
         return prices
 
-    for i in range(row_count):
-        try:
-            tr = rows.nth(i)
-            tds = tr.locator("td")
-            if tds.count() < 8:
-                print(f"  Warning: row {i} has only {tds.count()} cells (expected 8)")
-                continue
-            # Columns: İlçe, Kurşunsuz Benzin, Gaz Yağı, Motorin, Motorin PowerM,
-            #          Kalorifer Yakıtı, Fuel Oil, YK Fuel Oil
-            district = tds.nth(0).inner_text().strip()
-            if not district:
-                continue
-            prices.append(
-                MoilPriceRow(
-                    city=logical_city_name,
-                    district=district,
-                    kursunsuz_benzin=tds.nth(1).inner_text().strip(),
-                    gaz_yagi=tds.nth(2).inner_text().strip(),
-                    motorin=tds.nth(3).inner_text().strip(),
-                    motorin_powerm=tds.nth(4).inner_text().strip(),
-                    kalorifer_yakiti=tds.nth(5).inner_text().strip(),
-                    fuel_oil=tds.nth(6).inner_text().strip(),
-                    yk_fuel_oil=tds.nth(7).inner_text().strip(),
-                )
-            )
-        except Exception as e:
-            print(f"  Error extracting row {i} for city {logical_city_name}: {e}")
+    for i, cells in enumerate(data):
+        if len(cells) < 8:
+            print(f"  Warning: row {i} has only {len(cells)} cells (expected 8)")
             continue
+        # Columns: İlçe, Kurşunsuz Benzin, Gaz Yağı, Motorin, Motorin PowerM,
+        #          Kalorifer Yakıtı, Fuel Oil, YK Fuel Oil
+        if not cells[0]:
+            continue
+        prices.append(MoilPriceRow(logical_city_name, *cells[:8]))
     return prices
 
 
 def _normalize_city_name_for_filename(city_name: str) -> str:
     """Normalize city name (Turkish chars → ASCII, uppercased) for filenames."""
-    replacements = {
-        "İ": "I", "ı": "i", "ş": "s", "Ş": "S",
-        "ğ": "g", "Ğ": "G", "ü": "u", "Ü": "U",
-        "ö": "o", "Ö": "O", "ç": "c", "Ç": "C",
-    }
-    result = city_name
-    for tr_char, ascii_char in replacements.items():
-        result = result.replace(tr_char, ascii_char)
-    return result.upper().strip()
+    return city_name.translate(_TR_ASCII_TABLE).upper().strip()
 
 
 def _normalize_location_name(location: str) -> str:
@@ -136,139 +162,218 @@ def _normalize_location_name(location: str) -> str:
     return _normalize_city_name_for_filename(location)
 
 
-def _write_moil_prices_to_text(city_name: str, prices: List[MoilPriceRow], output_file: Path) -> None:
-    """Write Moil prices to txt. One line per district (no city header line)."""
-    lines: List[str] = []
-    for p in prices:
-        loc = _normalize_location_name(p.district)
-        parts = [
-            loc,
-            f"Kurşunsuz Benzin: {p.kursunsuz_benzin}",
-            f"Gaz Yağı: {p.gaz_yagi}",
-            f"Motorin: {p.motorin}",
-            f"Motorin PowerM: {p.motorin_powerm}",
-            f"Kalorifer Yakıtı: {p.kalorifer_yakiti}",
-            f"Fuel Oil: {p.fuel_oil}",
-            f"YK Fuel Oil: {p.yk_fuel_oil}",
-        ]
-        lines.append(" | ".join(parts))
-    output_file.write_text("\n".join(lines), encoding="utf-8")
-
-
-def save_all_cities_prices_txt(output_dir: Path, debug: bool = False) -> List[Path]:
-    """Fetch Moil prices for all cities and write one txt file per city.
+def _format_moil_row(p: MoilPriceRow) -> str:
+    """One output line per district (no city header line)."""
+    parts = [
+        _normalize_location_name(p.district),
+        f"Kurşunsuz Benzin: {p.kursunsuz_benzin}",
+        f"Gaz Yağı: {p.gaz_yagi}",
+        f"Motorin: {p.motorin}",
+        f"Motorin PowerM: {p.motorin_powerm}",
+        f"Kalorifer Yakıtı: {p.kalorifer_yakiti}",
+        f"Fuel Oil: {p.fuel_oil}",
+        f"YK Fuel Oil: {p.yk_fuel_oil}",
+    ]
+    return " | ".join(parts)
 
-    Behaviour:
-    - Iterates over city options one by one.
-    - As soon as a city's prices are fetched, its txt file is (over)written immediately.
-    - Istanbul has two options (İSTANBUL / İSTANBUL Anadolu); both are merged
-      into the same logical city 'İSTANBUL' and the txt file is updated after
-      each Istanbul option is processed.
-    """
-    output_dir.mkdir(parents=True, exist_ok=True)
-    saved_files: List[Path] = []
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            locale="tr-TR",
-            timezone_id="Europe/Istanbul",
-            viewport={"width": 1280, "height": 900},
-            ignore_https_errors=True,
-        )
-        page = context.new_page()
-        page.set_default_navigation_timeout(45000)
-
-        print(f"Navigating to {MOIL_URL}")
-        page.goto(MOIL_URL, wait_until="domcontentloaded")
-        try:
-            page.wait_for_load_state("networkidle", timeout=10000)
-        except Exception:
-            pass
+_ISTANBUL_NAMES = ("İSTANBUL", "ISTANBUL")
+_ICEL_NAMES = frozenset({"İÇEL", "ICEL"})
+
+
+def _logical_city_name(city_text: str) -> str:
+    """Map a city option text to the logical city used for grouping and filenames."""
+    upper_text = city_text.upper()
+    # İstanbul / İstanbul Anadolu are merged
+    if any(s in upper_text for s in _ISTANBUL_NAMES):
+        return "İSTANBUL"
+    # İçel is actually Mersin (site bug) – map to Mersin
+    if upper_text in _ICEL_NAMES:
+        return "Mersin"
+    return city_text
+
+
+def _open_moil_page(context, state: Optional[StorageStateRecorder] = None) -> Page:
+    """Open the Moil prices page in a context and wait until the city select is usable.
+
+    With a loaded storage state the cookie banner was already accepted on a previous run.
+    """
+    page = context.new_page()
+    block_trackers(context, page)
+    page.set_default_navigation_timeout(45000)
+    print(f"Navigating to {MOIL_URL}")
+    page.goto(MOIL_URL, wait_until="domcontentloaded")
+    page.wait_for_selector("#cityId", state="visible", timeout=15000)
+    if state is None or not state.loaded:
         _ensure_cookie_accepted(page)
+    if state is not None:
+        state.record(context)
+    return page
+
 
-        # Ensure city select is present
+def _fetch_city_options(state: StorageStateRecorder, debug: bool = False) -> List[Dict[str, str]]:
+    """Load the page once and read the #cityId options."""
+    with acquire_context(debug=debug, **state.context_kwargs(_CONTEXT_KWARGS)) as context:
         try:
-            page.wait_for_selector("#cityId", state="visible", timeout=15000)
+            page = _open_moil_page(context, state)
         except PWTimeoutError:
             print("Error: #cityId select not found on Moil page.")
-            browser.close()
             return []
+        return _get_city_options(page)
 
-        city_options = _get_city_options(page)
-        print(f"Found {len(city_options)} city option(s) on Moil page.")
 
-        # Aggregate by logical city name (merge İstanbul & İstanbul Anadolu).
-        # We also write txt files incrementally so you don't have to wait for
-        # all cities to finish.
-        all_city_prices: Dict[str, List[MoilPriceRow]] = {}
+class _TableDedup:
+    """Table digests already seen per logical city, shared by the worker threads."""
 
-        for opt in city_options:
-            city_text = opt["text"].strip()
-            city_value = opt["value"]
-            if not city_text:
-                continue
-
-            # Logical city name used for filename & grouping
-            upper_text = city_text.upper()
-
-            # İstanbul / İstanbul Anadolu are merged
-            if (
-                upper_text.startswith("İSTANBUL")
-                or upper_text.startswith("ISTANBUL")
-                or "İSTANBUL" in upper_text
-                or "ISTANBUL" in upper_text
-            ):
-                logical_city = "İSTANBUL"
-            # İçel is actually Mersin (site bug) – map to Mersin
-            elif upper_text in ("İÇEL", "ICEL"):
-                logical_city = "Mersin"
-            else:
-                logical_city = city_text
-
-            print(f"Fetching prices for city option: '{city_text}' (value={city_value}), logical city='{logical_city}'")
-            try:
-                _select_city_and_submit(page, city_value, debug=debug)
-                city_prices = _extract_city_prices_from_table(page, logical_city)
-                if city_prices:
-                    # Merge into in-memory collection for this logical city
-                    all_city_prices.setdefault(logical_city, []).extend(city_prices)
-                    total_for_city = len(all_city_prices[logical_city])
-                    print(
-                        f"  Collected {len(city_prices)} row(s) for logical city "
-                        f"'{logical_city}' (total now {total_for_city})"
-                    )
-
-                    # Write / update this city's txt file immediately
-                    try:
-                        norm_name = _normalize_city_name_for_filename(logical_city)
-                        fp = output_dir / f"moil_{norm_name}_prices.txt"
-                        _write_moil_prices_to_text(logical_city, all_city_prices[logical_city], fp)
-                        if fp not in saved_files:
-                            saved_files.append(fp)
-                        print(f"  Saved {total_for_city} row(s) to {fp.name}")
-                    except Exception as write_err:
-                        print(f"  Error writing file for city '{logical_city}': {write_err}")
-                        if debug:
-                            import traceback
-
-                            traceback.print_exc()
-                else:
-                    print(f"  Warning: no rows found for city option '{city_text}'")
-            except Exception as e:
-                print(f"  Error while fetching prices for city option '{city_text}': {e}")
-                if debug:
-                    import traceback
-
-                    traceback.print_exc()
-                continue
-
-            page.wait_for_timeout(random.uniform(300, 1000))
-
-        browser.close()
-
-    return saved_files
+    def __init__(self) -> None:
+        self._seen: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, logical_city: str, digest: str) -> bool:
+        """Record `digest` for the city; True if the same table was already seen for it."""
+        if not digest:
+            return False
+        with self._lock:
+            seen = self._seen.setdefault(logical_city, set())
+            if digest in seen:
+                return True
+            seen.add(digest)
+            return False
 
 
+def _scrape_city(
+    page: Page, opt: Dict[str, str], bucket: TokenBucket, dedup: _TableDedup, debug: bool = False
+) -> Optional[List[MoilPriceRow]]:
+    """Select one city option on an already-open page and extract its rows.
 
+    Returns None when the table is byte-identical to one already extracted for the
+    same logical city (e.g. İstanbul / İstanbul Anadolu serving the same list).
+    """
+    city_text = opt["text"].strip()
+    logical_city = _logical_city_name(city_text)
+    print(f"Fetching prices for city option: '{city_text}' (value={opt['value']}), logical city='{logical_city}'")
+    if not page.evaluate("v => [...document.querySelectorAll('#cityId option')].some(o => o.value === v)", opt["value"]):
+        # Only happens with a stale cached option list
+        raise LookupError(f"city option value={opt['value']} not found on Moil page")
+    bucket.acquire()
+    if not _select_city_and_submit(page, opt["value"], debug=debug):
+        bucket.backoff()
+    if dedup.is_duplicate(logical_city, page.evaluate(_TABLE_DIGEST_JS)):
+        return None
+    city_prices = _extract_city_prices_from_table(page, logical_city)
+    if not city_prices:
+        # Empty table usually means the site is throttling us
+        bucket.backoff()
+    return city_prices
+
+
+def save_all_cities_prices_txt(output_dir: Path, debug: bool = False, workers: int = 4) -> List[Path]:
+    """Fetch Moil prices for all cities and write one txt file per city.
+
+    Behaviour:
+    - Cookies/localStorage are kept in output_dir/.cache/moil_state.json, so the
+      cookie banner is only accepted on the first run.
+    - City options come from output_dir/.cache when a list younger than 30 days
+      exists; a stale cached option triggers a refetch.
+    - City options are spread over `workers` parallel browser contexts (1 in debug mode).
+    - As soon as every option of a logical city is fetched, its txt file is handed
+      to a background writer while the page workers move on.
+    - Istanbul has two options (İSTANBUL / İSTANBUL Anadolu); both are merged
+      into the same logical city 'İSTANBUL' in option order.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    saved_files: List[Path] = []
+
+    state = StorageStateRecorder(storage_state_path(output_dir, "moil"))
+    # First run matches the old 300–1000 ms per-worker pause; later runs start from the persisted rate
+    bucket = TokenBucket.for_brand("moil", default_rps=(1 if debug else workers) / 0.65)
+    dedup = _TableDedup()
+    cache_file = city_cache_path(output_dir, "moil")
+    city_options = load_cached_cities(cache_file, MOIL_URL)
+    from_cache = city_options is not None
+    if from_cache:
+        print(f"Using {len(city_options)} cached city option(s) for Moil.")
+    else:
+        city_options = [o for o in _fetch_city_options(state, debug=debug) if o["text"].strip()]
+        print(f"Found {len(city_options)} city option(s) on Moil page.")
+        save_cached_cities(cache_file, MOIL_URL, city_options)
+    if not city_options:
+        return []
+
+    # Rows per logical city, kept across the refetch pass so a rewrite keeps the earlier rows
+    city_rows: Dict[str, List[MoilPriceRow]] = {}
+    # Options (value -> text) that gave no rows, reported to the caller so a partial run is not reused
+    missing: Dict[str, str] = {}
+
+    def _write_city(writer: BackgroundWriter, logical_city: str) -> None:
+        rows = city_rows.get(logical_city)
+        if not rows:
+            return
+        fp = output_dir / f"moil_{_normalize_city_name_for_filename(logical_city)}_prices.txt"
+        writer.write(fp, "\n".join(_format_moil_row(p) for p in rows).encode("utf-8"))
+        if fp not in saved_files:
+            saved_files.append(fp)
+        print(f"  Saved {len(rows)} row(s) to {fp.name}")
+
+    def _scrape_options(writer: BackgroundWriter, options: List[Dict[str, str]]) -> List[str]:
+        """Scrape `options` and write each logical city once all its options are in; returns the values that raised."""
+        # Option indices per logical city: rows are merged in option order even when
+        # parallel workers finish out of order (İstanbul / İstanbul Anadolu).
+        # Options are classified once (value -> logical city); results are then plain dict lookups.
+        logical_by_value = {o["value"]: _logical_city_name(o["text"].strip()) for o in options}
+        order: Dict[str, List[int]] = {}
+        for i, opt in enumerate(options):
+            order.setdefault(logical_by_value[opt["value"]], []).append(i)
+        pending: Dict[int, List[MoilPriceRow]] = {}
+
+        failed: List[str] = []
+        for idx, opt, result in iter_parallel_pages(
+            options,
+            work=lambda page, opt: _scrape_city(page, opt, bucket, dedup, debug=debug),
+            setup=lambda context: _open_moil_page(context, state),
+            workers=1 if debug else workers,
+            debug=debug,
+            context_kwargs=state.context_kwargs(_CONTEXT_KWARGS),
+        ):
+            city_text = opt["text"].strip()
+            logical_city = logical_by_value[opt["value"]]
+            rows: List[MoilPriceRow] = []
+            if isinstance(result, Exception):
+                print(f"  Error while fetching prices for city option '{city_text}': {result}")
+                failed.append(opt["value"])
+                missing[opt["value"]] = city_text
+            elif result is None:
+                print(f"  Skipping city option '{city_text}': same table as an earlier '{logical_city}' option")
+            elif not result:
+                print(f"  Warning: no rows found for city option '{city_text}'")
+                missing[opt["value"]] = city_text
+            else:
+                rows = result
+                print(f"  Collected {len(rows)} row(s) for logical city '{logical_city}'")
+
+            pending[idx] = rows
+            queue = order[logical_city]
+            while queue and queue[0] in pending:
+                city_rows.setdefault(logical_city, []).extend(pending.pop(queue.pop(0)))
+            if not queue:
+                _write_city(writer, logical_city)
+        return failed
+
+    # Files are written on one background thread while the page workers move on
+    with BackgroundWriter() as writer:
+        failed = _scrape_options(writer, city_options)
+
+        # A cached option that no longer selects means the list changed: refetch and redo the missing ones
+        if from_cache and failed:
+            print("Cached Moil city list looks stale, refetching options.")
+            invalidate_cached_cities(cache_file)
+            fresh = [o for o in _fetch_city_options(state, debug=debug) if o["text"].strip()]
+            save_cached_cities(cache_file, MOIL_URL, fresh)
+            done = {o["value"] for o in city_options} - set(failed)
+            # The redo pass decides for the options that raised; ones gone from the site are not missing
+            for value in failed:
+                missing.pop(value, None)
+            _scrape_options(writer, [o for o in fresh if o["value"] not in done])
+    bucket.persist()
+
+    return SavedFiles(saved_files, missing.values())
@@ -1,44 +1,66 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright
 import random
 import re
+import time
+
+from common.browser_pool import acquire_context
+from common.file_writer import write_files
+from common.price_cache import SavedFiles
+from common.turkish import fold
+from common.workers import iter_parallel_pages
+from common.xhr import learn_table_feed, request_carries, table_from_feed
 
 OPET_URL = "https://www.opet.com.tr/akaryakit-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+# Slug building blocks: one str.translate pass (quotes dropped) + two precompiled regexes
+_SLUG_TABLE = str.maketrans({
+	"ı": "i", "İ": "i", "ş": "s", "ğ": "g", "ç": "c", "ö": "o", "ü": "u",
+	"â": "a", "ê": "e", "î": "i", "ô": "o", "û": "u",
+	" ": "-", "’": None, "'": None, "“": None, "”": None, ".": "-", ",": "-",
+})
+_SLUG_BAD_RE = re.compile(r"[^a-z0-9\-]+")
+_SLUG_DUP_RE = re.compile(r"-{2,}")
+
 def _ensure_cookie_accepted(page) -> None:
+	"""Click the OneTrust accept button if it shows up; called once per page/context."""
 	try:
-		if page.locator("#onetrust-accept-btn-handler").is_visible():
-			page.click("#onetrust-accept-btn-handler")
+		# Single round-trip: click waits briefly for the banner instead of probing is_visible() first
+		page.locator("#onetrust-accept-btn-handler").click(timeout=500)
 	except Exception:
 		pass
 
+# All <select>s in one round-trip: option count and option texts per select, in document order
+_SELECT_SUMMARY_JS = """() => [...document.querySelectorAll('select')].map(s => ({
+	count: s.options.length,
+	texts: [...s.options].map(o => (o.textContent || '').trim()),
+}))"""
+
 def _find_city_select(page):
 	# Prefer known class selector first
 	sel = page.locator("select.FuelPrice-module_obvSelect--3bb")
 	if sel.count() > 0:
 		return sel.first
 	# Heuristic: find a <select> whose options contain common city names and count is large
-	selects = page.locator("select")
-	sel_count = selects.count()
-	candidate = None
-	for i in range(sel_count):
-		handle = selects.nth(i)
-		try:
-			options: List[Dict[str, str]] = page.eval_on_selector_all(
-				f"select:nth-of-type({i+1}) option",
-				"opts => opts.map(o => ({ value: o.value, text: (o.textContent||'').trim() }))"
-			)
-			if not options or len(options) < 20:
-				continue
-			texts = [o.get("text","").upper() for o in options]
-			if any(name in texts for name in ["ADANA","ANKARA","ISTANBUL","İSTANBUL"]):
-				candidate = handle
-				break
-		except Exception:
+	try:
+		summary = page.evaluate(_SELECT_SUMMARY_JS)
+	except Exception:
+		return None
+	for idx, s in enumerate(summary):
+		if s["count"] < 20:
 			continue
-	return candidate
+		if not {fold(t) for t in s["texts"]}.isdisjoint(("ADANA", "ANKARA", "ISTANBUL")):
+			return page.locator("select").nth(idx)
+	return None
 
 def _get_city_options_from_select(select_handle) -> List[Dict[str, str]]:
 	# Evaluate on the specific <select> element
@@ -84,48 +106,36 @@ def _wait_prices_table(page, timeout: int = 10000):
 		except Exception:
 			raise
 
-	def _pick_best_table():
-		tables = page.locator("#root table") if page.locator("#root table").count() > 0 else page.locator("table")
-		count = tables.count()
-		keywords = ["BENZIN", "BENZİN", "MOTORIN", "MOTORİN", "OTOGAZ", "LPG", "İLÇE", "ILÇE", "İL", "IL"]
-		for i in range(count):
-			t = tables.nth(i)
-			try:
-				ths = t.locator("thead th")
-				hc = ths.count()
-				if hc == 0:
-					continue
-				header_text = " ".join([ths.nth(j).inner_text().upper() for j in range(hc)])
-				if any(k in header_text for k in keywords):
-					return t
-			except Exception:
-				continue
-		# fallback: return the first visible table
-		for i in range(count):
-			t = tables.nth(i)
-			try:
-				if t.is_visible():
-					return t
-			except Exception:
-				continue
-		return tables.first
+	return _pick_best_table(page)
 
-	return _pick_best_table()
+# Candidate tables in one round-trip: header text and visibility of each, in document order
+_TABLE_SUMMARY_JS = """scope => [...document.querySelectorAll(scope)].map(t => ({
+	header: [...t.querySelectorAll('thead th')].map(th => th.innerText).join(' '),
+	visible: !!(t.offsetWidth || t.offsetHeight || t.getClientRects().length),
+}))"""
+_TABLE_KEYWORDS = ("BENZIN", "BENZİN", "MOTORIN", "MOTORİN", "OTOGAZ", "LPG", "İLÇE", "ILÇE", "İL", "IL")
+
+def _pick_best_table(page):
+	scope = "#root table" if page.locator("#root table").count() > 0 else "table"
+	tables = page.locator(scope)
+	try:
+		summary = page.evaluate(_TABLE_SUMMARY_JS, scope)
+	except Exception:
+		return tables.first
+	for idx, t in enumerate(summary):
+		header_text = t["header"].upper()
+		if header_text and any(k in header_text for k in _TABLE_KEYWORDS):
+			return tables.nth(idx)
+	# fallback: return the first visible table
+	for idx, t in enumerate(summary):
+		if t["visible"]:
+			return tables.nth(idx)
+	return tables.first
 
 def _slugify_city(name: str) -> str:
-	text = name.strip().lower()
-	# Turkish character normalization
-	replacements = {
-		"ı": "i", "İ": "i", "ş": "s", "ğ": "g", "ç": "c", "ö": "o", "ü": "u",
-		"â": "a", "ê": "e", "î": "i", "ô": "o", "û": "u",
-		" ": "-", "â€™": "", "’": "", "'": "", "“": "", "”": "", ".": "-", ",": "-",
-	}
-	for k, v in replacements.items():
-		text = text.replace(k, v)
-	# remove any non-url-friendly chars
-	text = re.sub(r"[^a-z0-9\-]+", "", text)
-	text = re.sub(r"-{2,}", "-", text).strip("-")
-	return text
+	# Turkish character normalization, then remove any non-url-friendly chars
+	text = name.strip().lower().translate(_SLUG_TABLE)
+	return _SLUG_DUP_RE.sub("-", _SLUG_BAD_RE.sub("", text)).strip("-")
 
 @dataclass
 class OpetPriceRow:
@@ -137,267 +147,320 @@ class OpetDistrictRow:
 	name: str  # İlçe adı
 	values: List[OpetPriceRow]
 
-def _extract_table_headers(table_locator) -> List[str]:
-	header_cells = table_locator.locator("thead tr th")
-	hc = header_cells.count()
-	headers: List[str] = []
-	for i in range(hc):
-		text = header_cells.nth(i).inner_text().replace("\n", " ").replace("\r", " ").strip()
-		# Normalize multiple spaces
-		text = " ".join(text.split())
-		headers.append(text)
-	return headers
-
-def _extract_district_rows(table_locator, headers: List[str]) -> List[OpetDistrictRow]:
+# Whole price table in one round-trip: normalized header texts and, per row, each cell's
+# text (the last span.ml-auto inside the cell when present, as on mobile-styled cells).
+_DUMP_TABLE_JS = """t => ({
+	headers: [...t.querySelectorAll('thead tr th')].map(h => h.innerText.split(/\\s+/).filter(Boolean).join(' ')),
+	rows: [...t.querySelectorAll('tbody tr')].map(r => [...r.querySelectorAll('td')].map(td => {
+		const spans = td.querySelectorAll('span.ml-auto');
+		return (spans.length ? spans[spans.length - 1].innerText : td.innerText).trim();
+	})),
+})"""
+
+def _dump_table(table_locator) -> Dict[str, List]:
+	"""Serialize the table in the browser: {"headers": [...], "rows": [[cell, ...], ...]}."""
+	return table_locator.evaluate(_DUMP_TABLE_JS)
+
+def _extract_district_rows(dump: Dict[str, List]) -> List[OpetDistrictRow]:
 	"""Extract district rows when the first header is İlçe. Returns list per district with labeled values."""
-	rows = table_locator.locator("tbody tr")
-	rc = rows.count()
+	headers = dump["headers"]
 	results: List[OpetDistrictRow] = []
-	for i in range(rc):
-		row = rows.nth(i)
-		tds = row.locator("td")
-		if tds.count() < 2:
+	for cells in dump["rows"]:
+		if len(cells) < 2:
 			continue
-		# İlçe adı
-		try:
-			first_td = tds.nth(0)
-			span_auto = first_td.locator("span.ml-auto")
-			if span_auto.count() > 0:
-				district_name = span_auto.last.inner_text().strip()
-			else:
-				district_name = first_td.inner_text().strip()
-		except Exception:
-			district_name = ""
-		values: List[OpetPriceRow] = []
-		num_cols = min(len(headers), tds.count())
-		for col_idx in range(1, num_cols):
-			label = headers[col_idx]
-			try:
-				cell = tds.nth(col_idx)
-				span_val = cell.locator("span.ml-auto")
-				if span_val.count() > 0:
-					value = span_val.last.inner_text().strip()
-				else:
-					value = cell.inner_text().strip()
-			except Exception:
-				value = ""
-			values.append(OpetPriceRow(label=label, value=value))
-		results.append(OpetDistrictRow(name=district_name, values=values))
+		values = [OpetPriceRow(label=headers[i], value=cells[i]) for i in range(1, min(len(headers), len(cells)))]
+		results.append(OpetDistrictRow(name=cells[0], values=values))
 	return results
 
-def _extract_city_values(table_locator, city_name: str, headers: List[str]) -> List[OpetPriceRow]:
-	rows = table_locator.locator("tbody tr")
-	rc = rows.count()
-	for i in range(rc):
-		row = rows.nth(i)
-		tds = row.locator("td")
-		if tds.count() < 2:
-			continue
-		try:
-			spans = tds.nth(0).locator("span.ml-auto")
-			if spans.count() > 0:
-				city_text = spans.last.inner_text().strip()
-			else:
-				city_text = tds.nth(0).inner_text().strip()
-		except Exception:
-			city_text = ""
-		if city_text.upper() != city_name.upper():
+def _extract_city_values(dump: Dict[str, List], city_name: str) -> List[OpetPriceRow]:
+	headers = dump["headers"]
+	needle = fold(city_name)
+	for cells in dump["rows"]:
+		if len(cells) < 2 or fold(cells[0]) != needle:
 			continue
-		# Found the row: build label->value pairs using headers
-		result: List[OpetPriceRow] = []
-		num_cols = min(len(headers), tds.count())
-		for col_idx in range(1, num_cols):  # include KDV and onwards, skip first "İl" header
-			label = headers[col_idx]
-			try:
-				val_spans = tds.nth(col_idx).locator("span.ml-auto")
-				if val_spans.count() > 0:
-					value = val_spans.last.inner_text().strip()
-				else:
-					value = tds.nth(col_idx).inner_text().strip()
-			except Exception:
-				value = ""
-			result.append(OpetPriceRow(label=label, value=value))
-		return result
+		# Found the row: label->value pairs, include KDV and onwards, skip first "İl" header
+		return [OpetPriceRow(label=headers[i], value=cells[i]) for i in range(1, min(len(headers), len(cells)))]
 	# If not found, return empty; caller may fallback
 	return []
 
-def _write_opet_prices_to_text(city_name: str, prices: List[OpetPriceRow], output_file: Path) -> None:
-	lines: List[str] = []
-	lines.append(f"{city_name}")
-	for p in prices:
-		lines.append(f"{p.label}: {p.value}")
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+def _render_opet_prices(city_name: str, prices: List[OpetPriceRow]) -> bytes:
+	return "\n".join([city_name, *(f"{p.label}: {p.value}" for p in prices)]).encode("utf-8")
 
-def _write_opet_districts_to_text(city_name: str, headers: List[str], districts: List[OpetDistrictRow], output_file: Path) -> None:
-	lines: List[str] = []
-	lines.append(f"{city_name}")
+def _render_opet_districts(city_name: str, headers: List[str], districts: List[OpetDistrictRow]) -> bytes:
 	labels = headers[1:] if len(headers) > 1 else []
-	for d in districts:
-		parts = [d.name]
-		for idx, label in enumerate(labels):
-			val = d.values[idx].value if idx < len(d.values) else ""
-			parts.append(f"{label}: {val}")
-		lines.append(" | ".join(parts))
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+	# Rows with fewer values than labels get empty values for the missing columns
+	padding = [""] * len(labels)
 
-def save_city_prices_txt(city_name: str, output_dir: Path, url: str = OPET_URL, debug: bool = False, verbose: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
+	def _line(d: OpetDistrictRow) -> str:
+		values = [v.value for v in d.values] + padding
+		return " | ".join([d.name, *(f"{label}: {val}" for label, val in zip(labels, values))])
+
+	return "\n".join([city_name, *map(_line, districts)]).encode("utf-8")
+
+# First row of the price table (None if absent), read before a city change
+_FIRST_ROW_JS = """() => {
+	const r = document.querySelector('table[class*="FuelPrice-module_tableFuelPrice"] tbody tr');
+	return r ? r.innerText : null;
+}"""
+# Ready when the price table has rows and its first row differs from the one shown before the change
+_TABLE_READY_JS = """prev => {
+	const t = document.querySelector('table[class*="FuelPrice-module_tableFuelPrice"]');
+	const r = t && t.querySelector('tbody tr');
+	return !!r && r.innerText !== prev;
+}"""
+
+def _open_opet_page(context, url: str = OPET_URL):
+	"""Open the Opet prices page in a context and return (page, city select locator)."""
+	page = context.new_page()
+	page.set_default_navigation_timeout(45000)
+	page.goto(url, wait_until="domcontentloaded")
+	try:
+		page.wait_for_selector("select", state="attached", timeout=15000)
+	except Exception:
+		pass
+	_ensure_cookie_accepted(page)
+	select_handle = _find_city_select(page)
+	if select_handle is None:
 		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
+			page.locator("select").first.scroll_into_view_if_needed()
 		except Exception:
 			pass
-		_ensure_cookie_accepted(page)
-		# Find city select and choose
-		page.wait_for_timeout(500)
 		select_handle = _find_city_select(page)
-		if select_handle is None:
-			# try clicking any select-like container to reveal selects dynamically
-			try:
-				page.locator("select").first.scroll_into_view_if_needed()
-			except Exception:
-				pass
-			select_handle = _find_city_select(page)
-		if select_handle is None:
-			raise RuntimeError("Şehir seçimi için select bulunamadı.")
-		# Get options and find matching by text
-		options = _get_city_options_from_select(select_handle)
-		if verbose:
-			print(f"Opet: {len(options)} seçenek bulundu.")
-		target = None
-		for o in options:
-			if (o["text"] or "").strip().upper() == city_name.upper():
-				target = o
-				break
-		if target is None:
-			# fallback: partial contains
-			for o in options:
-				if city_name.upper() in (o["text"] or "").strip().upper():
-					target = o
-					break
-		if target is None:
-			raise RuntimeError(f"Şehir bulunamadı: {city_name}")
-		_select_option_with_fallback(page, select_handle, target["value"])
-		# Wait for navigation or header update
-		slug = _slugify_city(city_name)
+	if select_handle is None:
+		raise RuntimeError("Şehir seçimi için select bulunamadı.")
+	return page, select_handle
+
+def _build_option_index(options: List[Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+	"""Folded option text -> option (first occurrence wins), built once per page."""
+	index: Dict[str, Dict[str, str]] = {}
+	for o in options:
+		index.setdefault(fold((o["text"] or "").strip()), o)
+	return index
+
+def _find_option(index: Dict[str, Dict[str, str]], city_name: str) -> Optional[Dict[str, str]]:
+	needle = fold(city_name)
+	target = index.get(needle)
+	if target is None:
+		# fallback: partial contains
+		target = next((o for text, o in index.items() if needle in text), None)
+	return target
+
+def _wait_and_dump(page, city_name: str, previous: Optional[str]) -> Dict[str, List]:
+	"""After a city change, wait for the URL/header and the refreshed table, then dump it."""
+	slug = _slugify_city(city_name)
+	try:
+		page.wait_for_url(f"**/akaryakit-fiyatlari/{slug}*", timeout=12000)
+	except Exception:
 		try:
-			page.wait_for_url(f"**/akaryakit-fiyatlari/{slug}*", timeout=12000)
-			page.wait_for_load_state("networkidle")
+			page.wait_for_function(
+				"""(expected)=>{
+					var el=document.querySelector('.FuelPrice-module_fuelPriceHeader--daa p.big');
+					return !!el && el.textContent && el.textContent.trim().toUpperCase()===String(expected).toUpperCase();
+				}""",
+				city_name,
+				timeout=12000
+			)
 		except Exception:
-			try:
-				page.wait_for_function(
-					"""(expected)=>{
-						var el=document.querySelector('.FuelPrice-module_fuelPriceHeader--daa p.big');
-						return !!el && el.textContent && el.textContent.trim().toUpperCase()===String(expected).toUpperCase();
-					}""",
-					city_name,
-					timeout=12000
-				)
-			except Exception:
-				pass
-		page.wait_for_timeout(800)
-		# Wait table populate
-		table = _wait_prices_table(page, timeout=12000)
-		page.wait_for_timeout(500)
-		headers = _extract_table_headers(table)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		fp = output_dir / f"opet_{city_name}_prices.txt"
-		if headers and ("İlçe" in headers[0] or "Ilçe" in headers[0] or "ILÇE" in headers[0].upper()):
-			districts = _extract_district_rows(table, headers)
-			_write_opet_districts_to_text(city_name, headers, districts, fp)
-		else:
-			prices = _extract_city_values(table, city_name, headers)
-			_write_opet_prices_to_text(city_name, prices, fp)
-		browser.close()
-		return fp
+			pass
+	# Wait until the table has rows for the new city (returns as soon as it does)
+	try:
+		page.wait_for_function(_TABLE_READY_JS, arg=previous, timeout=8000)
+	except Exception:
+		pass
+	table = _wait_prices_table(page, timeout=12000)
+	return _dump_table(table)
 
-def save_all_cities_prices_txt(output_dir: Path, url: str = OPET_URL, debug: bool = False, min_delay: float = 0.6, max_delay: float = 1.2, verbose: bool = False) -> List[Path]:
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
+def _render_dump(dump: Dict[str, List], city_name: str, output_dir: Path, verbose: bool = False) -> Tuple[Path, bytes]:
+	headers = dump["headers"]
+	if verbose:
+		print(f"Opet: {city_name} headers -> {headers}")
+	fp = output_dir / f"opet_{city_name}_prices.txt"
+	if _is_district_table(headers):
+		return fp, _render_opet_districts(city_name, headers, _extract_district_rows(dump))
+	return fp, _render_opet_prices(city_name, _extract_city_values(dump, city_name))
+
+def _is_district_table(headers: List[str]) -> bool:
+	return bool(headers) and "ILCE" in fold(headers[0])
+
+def _is_city_response(resp, value: str, slug: str) -> bool:
+	req = resp.request
+	return req.resource_type in ("xhr", "fetch") and (slug in req.url or request_carries(req.url, req.post_data, value))
+
+def _discover_opet_feed(page, select_handle, value: str, city_name: str) -> Tuple[Dict[str, List], Optional[Dict]]:
+	"""Select a city through the UI while recording the XHR/fetch responses it triggers.
+
+	Returns the DOM dump and, if one of the JSON responses reproduces the district table
+	exactly, a feed description ({"headers", "table"}) used for the following cities.
+	"""
+	slug = _slugify_city(city_name)
+	responses = []
+
+	def _on_response(resp) -> None:
+		if _is_city_response(resp, value, slug):
+			responses.append(resp)
+
+	previous = page.evaluate(_FIRST_ROW_JS)
+	page.on("response", _on_response)
+	try:
+		_select_option_with_fallback(page, select_handle, value)
+		dump = _wait_and_dump(page, city_name, previous)
+	finally:
+		page.remove_listener("response", _on_response)
+	headers = dump["headers"]
+	if not _is_district_table(headers):
+		return dump, None
+	rows = [cells for cells in dump["rows"] if len(cells) >= 2]
+	for resp in responses:
 		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
+			table = learn_table_feed(resp.json(), rows)
 		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		page.wait_for_timeout(500)
-		# Iterate cities from select and fetch district table per city
-		select_handle = _find_city_select(page)
-		if select_handle is None:
-			try:
-				page.locator("select").first.scroll_into_view_if_needed()
-			except Exception:
-				pass
-			select_handle = _find_city_select(page)
-		if select_handle is None:
-			raise RuntimeError("Şehir seçimi için select bulunamadı.")
-		options = _get_city_options_from_select(select_handle)
-		if verbose:
+			continue
+		if table is not None:
+			return dump, {"headers": headers, "table": table, "url": resp.url}
+	return dump, None
+
+def _dump_from_feed(page, select_handle, value: str, city_name: str, feed: Dict) -> Optional[Dict[str, List]]:
+	"""Select a city and build the table from its JSON response, without waiting for the DOM."""
+	slug = _slugify_city(city_name)
+	try:
+		with page.expect_response(lambda resp: _is_city_response(resp, value, slug), timeout=5000) as resp_info:
+			_select_option_with_fallback(page, select_handle, value)
+		rows = table_from_feed(resp_info.value.json(), feed["table"])
+	except Exception:
+		return None
+	return {"headers": feed["headers"], "rows": rows} if rows else None
+
+class OpetSession:
+	"""Tek tarayıcı/context/sayfa üzerinde art arda şehir çekmek için oturum.
+
+	Tarayıcı common.browser_pool'dan gelir; sayfa ilk şehirde bir kez açılır (çerez onayı
+	ve seçenek indeksi de bir kez yapılır), sonraki şehirler aynı sayfada seçilir.
+	İlk şehirde tabloyu taşıyan JSON yanıtı bulunursa sonraki şehirlerde DOM beklenmez,
+	tablo seçim sonrası gelen yanıttan okunur. `context` verilirse o context kullanılır
+	(paralel worker'lar için).
+
+		with OpetSession() as s:
+			s.save_city_prices_txt("Ankara", output_dir)
+	"""
+
+	# Feed is dropped after this many consecutive cities without a usable response
+	FEED_MAX_MISSES = 2
+
+	def __init__(self, url: str = OPET_URL, debug: bool = False, verbose: bool = False, context=None):
+		self.url = url
+		self.debug = debug
+		self.verbose = verbose
+		self._context_cm = None
+		self._context = context
+		self._page = None
+		self._select_handle = None
+		self._index: Dict[str, Dict[str, str]] = {}
+		self._feed: Optional[Dict] = None
+		self._feed_misses = 0
+		self._discovered = False
+
+	def __enter__(self) -> "OpetSession":
+		self._context_cm = acquire_context(debug=self.debug, block_resources=False, **_CONTEXT_KWARGS)
+		self._context = self._context_cm.__enter__()
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self._page = None
+		self._context_cm.__exit__(*exc)
+
+	def _ensure_page(self) -> None:
+		if self._page is not None:
+			return
+		self._page, self._select_handle = _open_opet_page(self._context, self.url)
+		# Get options and index them by folded text
+		options = _get_city_options_from_select(self._select_handle)
+		if self.verbose:
 			print(f"Opet: {len(options)} seçenek bulundu.")
-		for o in options:
-			try:
-				# select city
-				_select_option_with_fallback(page, select_handle, o["value"])
-				# Wait for route or header change
-				city_name = (o["text"] or "").strip()
-				slug = _slugify_city(city_name)
-				try:
-					page.wait_for_url(f"**/akaryakit-fiyatlari/{slug}*", timeout=12000)
-					page.wait_for_load_state("networkidle")
-				except Exception:
-					try:
-						page.wait_for_function(
-							"""(expected)=>{
-								var el=document.querySelector('.FuelPrice-module_fuelPriceHeader--daa p.big');
-								return !!el && el.textContent && el.textContent.trim().toUpperCase()===String(expected).toUpperCase();
-							}""",
-							city_name,
-							timeout=12000
-						)
-					except Exception:
-						pass
-				page.wait_for_timeout(800)
-				table = _wait_prices_table(page, timeout=12000)
-				page.wait_for_timeout(500)
-				headers = _extract_table_headers(table)
-				if verbose:
-					print(f"Opet: {city_name} headers -> {headers}")
-				fp = output_dir / f"opet_{city_name}_prices.txt"
-				if headers and ("İlçe" in headers[0] or "Ilçe" in headers[0] or "ILÇE" in headers[0].upper()):
-					districts = _extract_district_rows(table, headers)
-					_write_opet_districts_to_text(city_name, headers, districts, fp)
-				else:
-					prices = _extract_city_values(table, city_name, headers)
-					_write_opet_prices_to_text(city_name, prices, fp)
-				if verbose:
-					print(f"OK: {city_name} -> {fp.name}")
-				saved.append(fp)
-			except Exception as e:
-				if verbose:
-					print(f"Hata/atlandı: {o.get('text')} -> {e}")
-			page.wait_for_timeout(int(1000 * random.uniform(min_delay, max_delay)))
-		browser.close()
-	return saved
+		self._index = _build_option_index(options)
+
+	def _select_and_dump(self, value: str, city_name: str) -> Dict[str, List]:
+		page, select_handle = self._page, self._select_handle
+		if not self._discovered:
+			self._discovered = True
+			dump, self._feed = _discover_opet_feed(page, select_handle, value, city_name)
+			if self._feed is not None and self.verbose:
+				print(f"Opet: fiyat yanıtı bulundu ({self._feed['url']}), tablo JSON'dan okunacak.")
+			return dump
+		previous = page.evaluate(_FIRST_ROW_JS)
+		if self._feed is not None:
+			dump = _dump_from_feed(page, select_handle, value, city_name, self._feed)
+			if dump is not None:
+				self._feed_misses = 0
+				return dump
+			self._feed_misses += 1
+			if self._feed_misses >= self.FEED_MAX_MISSES:
+				self._feed = None
+			# The select change already happened; continue on the DOM path
+			return _wait_and_dump(page, city_name, previous)
+		_select_option_with_fallback(page, select_handle, value)
+		return _wait_and_dump(page, city_name, previous)
+
+	def render_city_prices(self, city_name: str, output_dir: Path, value: Optional[str] = None) -> Tuple[Path, bytes]:
+		"""Şehri seç ve (opet_<şehir>_prices.txt yolu, içerik) döndür; dosyayı yazmaz."""
+		self._ensure_page()
+		if value is None:
+			target = _find_option(self._index, city_name)
+			if target is None:
+				raise RuntimeError(f"Şehir bulunamadı: {city_name}")
+			value = target["value"]
+		return _render_dump(self._select_and_dump(value, city_name), city_name, output_dir, self.verbose)
+
+	def save_city_prices_txt(self, city_name: str, output_dir: Path) -> Path:
+		fp, content = self.render_city_prices(city_name, output_dir)
+		output_dir.mkdir(parents=True, exist_ok=True)
+		fp.write_bytes(content)
+		return fp
+
+def save_cities_prices_txt(city_names: List[str], output_dir: Path, url: str = OPET_URL, debug: bool = False, verbose: bool = False) -> List[Path]:
+	"""Verilen şehirleri tek oturumda (tek tarayıcı/sayfa) sırayla çeker."""
+	with OpetSession(url, debug=debug, verbose=verbose) as session:
+		return [session.save_city_prices_txt(name, output_dir) for name in city_names]
+
+def save_city_prices_txt(city_name: str, output_dir: Path, url: str = OPET_URL, debug: bool = False, verbose: bool = False) -> Path:
+	return save_cities_prices_txt([city_name], output_dir, url=url, debug=debug, verbose=verbose)[0]
 
+def _scrape_city(session: OpetSession, o: Dict[str, str], output_dir: Path, min_delay: float, max_delay: float) -> Tuple[Path, bytes]:
+	"""Select one city on a worker's session and render its txt file (written later in one batch)."""
+	try:
+		return session.render_city_prices((o["text"] or "").strip(), output_dir, value=o["value"])
+	finally:
+		time.sleep(random.uniform(min_delay, max_delay))
+
+def save_all_cities_prices_txt(output_dir: Path, url: str = OPET_URL, debug: bool = False, min_delay: float = 0.6, max_delay: float = 1.2, verbose: bool = False, workers: int = 4) -> List[Path]:
+	"""Şehirler `workers` adet paralel tarayıcı context'ine dağıtılır (debug modunda 1)."""
+	output_dir.mkdir(parents=True, exist_ok=True)
+	# City options are read once on a bootstrap page, then spread over the workers
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context:
+		_, select_handle = _open_opet_page(context, url)
+		options = _get_city_options_from_select(select_handle)
+	if verbose:
+		print(f"Opet: {len(options)} seçenek bulundu.")
 
+	rendered: Dict[int, Tuple[Path, bytes]] = {}
+	failed: List[str] = []
+	for idx, o, result in iter_parallel_pages(
+		options,
+		work=lambda session, o: _scrape_city(session, o, output_dir, min_delay, max_delay),
+		setup=lambda context: OpetSession(url, debug=debug, verbose=verbose, context=context),
+		workers=1 if debug else workers,
+		debug=debug,
+		context_kwargs=_CONTEXT_KWARGS,
+		block_resources=False,
+	):
+		if isinstance(result, Exception):
+			failed.append(o.get("text") or o["value"])
+			if verbose:
+				print(f"Hata/atlandı: {o.get('text')} -> {result}")
+			continue
+		if verbose:
+			print(f"OK: {(o['text'] or '').strip()} -> {result[0].name}")
+		rendered[idx] = result
+	# All files are written together once the browsers are done
+	pending = [rendered[i] for i in sorted(rendered)]
+	write_files(pending)
+	return SavedFiles((fp for fp, _ in pending), failed)
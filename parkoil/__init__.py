@@ -1,4 +1,4 @@
-from .scraper import save_city_prices_txt, save_all_cities_prices_txt
+from .scraper import ParkoilSession, save_city_prices_txt, save_all_cities_prices_txt
 
 
 
@@ -1,17 +1,33 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from playwright.sync_api import TimeoutError as PWTimeoutError
 import random
+import time
+
+from common.browser_pool import acquire_context
+from common.file_writer import write_files
+from common.http_session import get_client
+from common.price_cache import SavedFiles
+from common.workers import iter_parallel_pages
+from common.xhr import cookie_header, learn_table_feed, request_carries, substitute_value, table_from_feed
 
 PARKOIL_URL = "https://www.parkoil.com.tr/akaryakit-fiyatlar%C4%B1.html"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
 
 def _ensure_cookie_accepted(page) -> None:
+	"""Click the OneTrust accept button if it shows up; called once per page/context."""
 	try:
-		# Common OneTrust accept button (if present)
-		if page.locator("#onetrust-accept-btn-handler").is_visible():
-			page.click("#onetrust-accept-btn-handler")
+		# Single round-trip: click waits briefly for the banner instead of probing is_visible() first
+		page.locator("#onetrust-accept-btn-handler").click(timeout=500)
 	except Exception:
 		pass
 
@@ -59,49 +75,172 @@ class ParkoilDistrictRow:
 	motorin: str
 
 
-def _wait_prices_loaded(page, timeout_ms: int = 12000) -> None:
-	# Wait for the table body with rows to appear and stabilize
-	page.wait_for_selector("tbody#parent tr", timeout=timeout_ms)
-	page.wait_for_load_state("networkidle")
-	# small grace period to allow JS formatting
-	page.wait_for_timeout(300)
+# Text of the first price row (None if the table is empty), read before a city change
+_FIRST_ROW_JS = "() => { const r = document.querySelector('tbody#parent tr'); return r ? r.innerText : null; }"
+# Ready when the first row has a filled price cell and differs from the row shown before the change
+_ROWS_READY_JS = """prev => {
+	const r = document.querySelector('tbody#parent tr');
+	const td = r && r.querySelector('td:nth-child(2)');
+	return !!td && td.innerText.trim().length > 0 && r.innerText !== prev;
+}"""
+
+
+def _first_row_text(page) -> Optional[str]:
+	return page.evaluate(_FIRST_ROW_JS)
+
+
+def _wait_prices_loaded(page, timeout_ms: int = 12000, previous: Optional[str] = None) -> None:
+	# Wait for the table to be (re)filled instead of networkidle + a fixed grace period
+	try:
+		page.wait_for_function(_ROWS_READY_JS, arg=previous, timeout=timeout_ms)
+	except PWTimeoutError:
+		if previous is None:
+			raise
+		# Same first row as before the change (e.g. the city was already selected)
+		page.wait_for_function(_ROWS_READY_JS, arg=None, timeout=2000)
 
 
 def _extract_district_rows(page) -> List[ParkoilDistrictRow]:
-	rows = page.locator("tbody#parent tr")
-	rc = rows.count()
-	results: List[ParkoilDistrictRow] = []
-	for i in range(rc):
-		tr = rows.nth(i)
-		tds = tr.locator("td")
-		if tds.count() < 3:
-			continue
-		try:
-			name = tds.nth(0).inner_text().strip()
-		except Exception:
-			name = ""
-		try:
-			benzin = tds.nth(1).inner_text().strip()
-		except Exception:
-			benzin = ""
-		try:
-			motorin = tds.nth(2).inner_text().strip()
-		except Exception:
-			motorin = ""
-		# Skip empty placeholders
-		if not name:
-			continue
-		results.append(ParkoilDistrictRow(name=name, benzin=benzin, motorin=motorin))
-	return results
-
-
-def _write_parkoil_districts_to_text(city_name: str, districts: List[ParkoilDistrictRow], output_file: Path) -> None:
-	lines: List[str] = []
+	# One evaluate for the whole table: [[name, benzin, motorin], ...]
+	cells = page.eval_on_selector_all(
+		"tbody#parent tr",
+		"trs => trs.map(tr => [...tr.querySelectorAll('td')].slice(0, 3).map(td => (td.innerText || '').trim()))",
+	)
+	# Skip rows with fewer than 3 cells and empty placeholders
+	return [
+		ParkoilDistrictRow(name=name, benzin=benzin, motorin=motorin)
+		for name, benzin, motorin in (c for c in cells if len(c) >= 3)
+		if name
+	]
+
+
+def _discover_price_feed(page, city_name: str) -> Optional[Dict]:
+	"""Select a city while listening for the XHR/fetch that returns its district prices.
+
+	Returns a replayable request template plus the JSON table mapping, or None if the
+	table is rendered without a JSON feed carrying the city (then the UI path is used).
+	The city is selected either way, so the caller can read the table from the DOM.
+	"""
+	def _carries_city(resp) -> bool:
+		req = resp.request
+		return req.resource_type in ("xhr", "fetch") and request_carries(req.url, req.post_data, city_name)
+
+	previous = _first_row_text(page)
+	try:
+		with page.expect_response(_carries_city, timeout=6000) as resp_info:
+			_select_city(page, city_name)
+		resp = resp_info.value
+		_wait_prices_loaded(page, timeout_ms=15000, previous=previous)
+		data = resp.json()
+	except PWTimeoutError:
+		_wait_prices_loaded(page, timeout_ms=15000, previous=previous)
+		return None
+	except Exception:
+		return None
+	table = learn_table_feed(data, [[d.name, d.benzin, d.motorin] for d in _extract_district_rows(page)])
+	if table is None:
+		return None
+	req = resp.request
+	return {
+		"method": req.method,
+		"url": req.url,
+		"post_data": req.post_data or "",
+		"headers": {k: v for k, v in req.headers.items() if k.lower() in ("x-requested-with", "content-type", "accept", "referer")},
+		"value": city_name,
+		"table": table,
+	}
+
+
+def _fetch_districts_http(template: Dict, city_name: str, cookies: str = "") -> Optional[List[ParkoilDistrictRow]]:
+	"""Replay the discovered feed for another city; None if the response is unusable."""
+	url = substitute_value(template["url"], template["value"], city_name)
+	data = substitute_value(template["post_data"], template["value"], city_name)
+	headers = dict(template["headers"])
+	if cookies:
+		headers["Cookie"] = cookies
+	try:
+		resp = get_client().request(template["method"], url, body=data.encode("utf-8") if data else None, headers=headers)
+		if not resp.ok:
+			return None
+		rows = table_from_feed(resp.json(), template["table"])
+	except Exception:
+		return None
+	return [ParkoilDistrictRow(*r) for r in rows] if rows else None
+
+
+def _render_parkoil_districts(city_name: str, districts: List[ParkoilDistrictRow]) -> bytes:
 	# First line city name (mirrors other brand outputs)
-	lines.append(f"{city_name}")
-	for d in districts:
-		lines.append(f"{d.name} | Benzin: {d.benzin} | Motorin: {d.motorin}")
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+	return "\n".join([city_name, *(f"{d.name} | Benzin: {d.benzin} | Motorin: {d.motorin}" for d in districts)]).encode("utf-8")
+
+
+def _open_parkoil_page(context, url: str = PARKOIL_URL):
+	"""Open the Parkoil prices page in a context and wait for #citySelect."""
+	page = context.new_page()
+	page.set_default_navigation_timeout(45000)
+	page.goto(url, wait_until="domcontentloaded")
+	page.wait_for_selector("#citySelect", state="visible", timeout=15000)
+	_ensure_cookie_accepted(page)
+	return page
+
+
+class ParkoilSession:
+	"""Tek tarayıcı/context/sayfa üzerinde art arda şehir çekmek için oturum.
+
+	Sayfa ilk şehirde bir kez açılır (çerez onayı bir kez). İlk şehirde sayfanın
+	fiyatları çektiği JSON isteği yakalanırsa sonraki şehirler doğrudan HTTP ile
+	alınır; yoksa (veya istek başarısız olursa) #citySelect üzerinden seçilir.
+	`context` verilirse o context kullanılır (paralel worker'lar için).
+	"""
+
+	def __init__(self, url: str = PARKOIL_URL, debug: bool = False, context=None):
+		self.url = url
+		self.debug = debug
+		self._context_cm = None
+		self._context = context
+		self._page = None
+		self._feed: Optional[Dict] = None
+		self._cookies = ""
+		self._discovered = False
+
+	def __enter__(self) -> "ParkoilSession":
+		self._context_cm = acquire_context(debug=self.debug, block_resources=False, **_CONTEXT_KWARGS)
+		self._context = self._context_cm.__enter__()
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self._page = None
+		self._context_cm.__exit__(*exc)
+
+	def _fetch_districts(self, city_name: str) -> List[ParkoilDistrictRow]:
+		if self._feed is not None:
+			districts = _fetch_districts_http(self._feed, city_name, self._cookies)
+			if districts:
+				return districts
+		if self._page is None:
+			self._page = _open_parkoil_page(self._context, self.url)
+		if not self._discovered:
+			self._discovered = True
+			self._feed = _discover_price_feed(self._page, city_name)
+			if self._feed is not None:
+				self._cookies = cookie_header(self._context, self._feed["url"])
+				print(f"Parkoil: fiyat isteği bulundu ({self._feed['method']} {self._feed['url']}), HTTP ile devam ediliyor.")
+		else:
+			previous = _first_row_text(self._page)
+			_select_city(self._page, city_name)
+			_wait_prices_loaded(self._page, timeout_ms=15000, previous=previous)
+		return _extract_district_rows(self._page)
+
+	def render_city_prices(self, city_name: str, output_dir: Path) -> Tuple[Path, bytes]:
+		"""Şehrin ilçe satırlarını çek; (parkoil_<ŞEHİR>_prices.txt yolu, içerik) döndürür, yazmaz."""
+		districts = self._fetch_districts(city_name)
+		return output_dir / f"parkoil_{city_name}_prices.txt", _render_parkoil_districts(city_name, districts)
+
+	def save_city_prices_txt(self, city_name: str, output_dir: Path) -> Path:
+		"""Şehir seç, ilçe satırlarını çıkar ve parkoil_<ŞEHİR>_prices.txt olarak yaz."""
+		fp, content = self.render_city_prices(city_name, output_dir)
+		output_dir.mkdir(parents=True, exist_ok=True)
+		fp.write_bytes(content)
+		return fp
 
 
 def save_city_prices_txt(city_name: str, output_dir: Path, url: str = PARKOIL_URL, debug: bool = False) -> Path:
@@ -109,35 +248,26 @@ def save_city_prices_txt(city_name: str, output_dir: Path, url: str = PARKOIL_UR
 	Parkoil sayfasını aç, şehir seç, ilçe satırlarını çıkar ve txt olarak yaz.
 	Çıktı dosyası: parkoil_<ŞEHİR>_prices.txt
 	"""
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
-		# Ensure controls are visible
-		page.wait_for_selector("#citySelect", state="visible", timeout=15000)
-		# Select city and wait for prices
-		_select_city(page, city_name)
-		_wait_prices_loaded(page, timeout_ms=15000)
-		# Extract and write
-		districts = _extract_district_rows(page)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		fp = output_dir / f"parkoil_{city_name}_prices.txt"
-		_write_parkoil_districts_to_text(city_name, districts, fp)
-		browser.close()
-		return fp
+	with ParkoilSession(url, debug=debug) as session:
+		return session.save_city_prices_txt(city_name, output_dir)
+
+
+def _scrape_city(session: ParkoilSession, city_name: str, output_dir: Path, min_delay: float, max_delay: float, retries: int = 1) -> Tuple[Path, bytes]:
+	"""Fetch one city on a worker's session (with retries) and render its txt file (written later in one batch)."""
+	try:
+		for attempt in range(retries + 1):
+			try:
+				return session.render_city_prices(city_name, output_dir)
+			except PWTimeoutError:
+				if attempt >= retries:
+					raise
+				time.sleep(0.7 * (attempt + 1) * random.uniform(1.0, 1.5))
+			except Exception:
+				if attempt >= retries:
+					raise
+				time.sleep(0.6 * (attempt + 1) * random.uniform(1.0, 1.4))
+	finally:
+		time.sleep(random.uniform(min_delay, max_delay))
 
 
 def save_all_cities_prices_txt(
@@ -147,61 +277,44 @@ def save_all_cities_prices_txt(
 	min_delay: float = 0.6,
 	max_delay: float = 1.2,
 	retries: int = 1,
+	workers: int = 4,
 ) -> List[Path]:
 	"""
-	Tüm şehirler için #citySelect içindeki seçenekleri sıra ile seçip
+	Tüm şehirler için #citySelect içindeki seçenekleri seçip
 	ilçelerin fiyatlarını txt olarak yazar.
+	Şehirler `workers` adet paralel tarayıcı context'ine dağıtılır (debug modunda 1).
 	"""
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		page.wait_for_selector("#citySelect", state="visible", timeout=15000)
-		options = _get_city_options(page)
-		# Filter out the "Tüm İller" empty option
-		city_options = [o for o in options if (o.get("value") or "").strip()]
-		for o in city_options:
-			city_name = (o.get("text") or "").strip() or (o.get("value") or "").strip()
-			for attempt in range(retries + 1):
-				try:
-					_select_city(page, city_name)
-					_wait_prices_loaded(page, timeout_ms=15000)
-					districts = _extract_district_rows(page)
-					fp = output_dir / f"parkoil_{city_name}_prices.txt"
-					_write_parkoil_districts_to_text(city_name, districts, fp)
-					saved.append(fp)
-					print(f"OK: {city_name} -> {fp.name}")
-					break
-				except PWTimeoutError:
-					if attempt < retries:
-						page.wait_for_timeout(int(700 * (attempt + 1) * random.uniform(1.0, 1.5)))
-						continue
-					else:
-						print(f"Atlandı (timeout): {city_name}")
-				except Exception as e:
-					if attempt < retries:
-						page.wait_for_timeout(int(600 * (attempt + 1) * random.uniform(1.0, 1.4)))
-						continue
-					else:
-						print(f"Hata/atlandı: {city_name} -> {e}")
-			page.wait_for_timeout(int(1000 * random.uniform(min_delay, max_delay)))
-		browser.close()
-	return saved
-
-
+	output_dir.mkdir(parents=True, exist_ok=True)
+	with acquire_context(debug=debug, block_resources=False, **_CONTEXT_KWARGS) as context:
+		options = _get_city_options(_open_parkoil_page(context, url))
+	# Filter out the "Tüm İller" empty option
+	city_names = [
+		(o.get("text") or "").strip() or (o.get("value") or "").strip()
+		for o in options
+		if (o.get("value") or "").strip()
+	]
 
+	rendered: Dict[int, Tuple[Path, bytes]] = {}
+	failed: List[str] = []
+	for idx, city_name, result in iter_parallel_pages(
+		city_names,
+		work=lambda session, city_name: _scrape_city(session, city_name, output_dir, min_delay, max_delay, retries),
+		setup=lambda context: ParkoilSession(url, debug=debug, context=context),
+		workers=1 if debug else workers,
+		debug=debug,
+		context_kwargs=_CONTEXT_KWARGS,
+		block_resources=False,
+	):
+		if isinstance(result, PWTimeoutError):
+			failed.append(city_name)
+			print(f"Atlandı (timeout): {city_name}")
+		elif isinstance(result, Exception):
+			failed.append(city_name)
+			print(f"Hata/atlandı: {city_name} -> {result}")
+		else:
+			rendered[idx] = result
+			print(f"OK: {city_name} -> {result[0].name}")
+	# All files are written together once the browsers are done
+	pending = [rendered[i] for i in sorted(rendered)]
+	write_files(pending)
+	return SavedFiles((fp for fp, _ in pending), failed)
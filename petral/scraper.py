@@ -1,11 +1,31 @@
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import DefaultDict, List, Dict, Optional, Tuple
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import math
 import re
 
+from common.file_writer import write_files
+from common.http_cache import HTTP_CACHE_TTL, cached_get
+from common.http_session import KeepAliveClient, get_client
+from common.price_cache import SavedFiles
+from common.turkish import fold
+
 PETRALL_FUEL_URL = "https://petrall.com.tr/fuelBring"
+# Büyük sayfa boyutu istek sayısını düşürür; sunucu daha düşük bir sınır uygularsa ona uyulur
+PETRALL_PAGE_SIZE = 200
+
+# Dosya adı temizliği: Windows'ta yasak karakterler (\ / : * ? " < > |), tekrarlı boşluk ve tire
+_FN_ILLEGAL = re.compile(r'[\\/:*?"<>|]+')
+_FN_SPACES = re.compile(r"\s{2,}")
+_FN_DASHES = re.compile(r"-{2,}")
+
+_HEADERS = {
+	"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	"Referer": "https://petrall.com.tr/fuel",
+	"Accept": "application/json, text/plain, */*",
+}
 
 
 @dataclass
@@ -18,15 +38,15 @@ class PetrallRow:
 	fueloil: str
 
 
-def _fetch_page(request_ctx, page: int, page_size: int = 10) -> Tuple[List[PetrallRow], Dict]:
-	resp = request_ctx.get(PETRALL_FUEL_URL, params={"page": page, "page_size": page_size})
-	# Playwright APIResponse doesn't have raise_for_status; check ok()/status
+def _cache_dir(output_dir: Path, use_cache: bool) -> Optional[Path]:
+	return output_dir / ".cache" / "petrall" if use_cache else None
+
+
+def _fetch_page(client: KeepAliveClient, page: int, page_size: int = PETRALL_PAGE_SIZE, cache_dir: Optional[Path] = None, cache_ttl: float = HTTP_CACHE_TTL) -> Tuple[List[PetrallRow], Dict]:
+	cache_file = cache_dir / f"page_{page}_{page_size}.json" if cache_dir else None
+	resp = cached_get(client, PETRALL_FUEL_URL, params={"page": page, "page_size": page_size}, headers=_HEADERS, cache_file=cache_file, ttl=cache_ttl)
 	if not resp.ok:
-		try:
-			body = resp.text()
-		except Exception:
-			body = ""
-		raise RuntimeError(f"HTTP {resp.status}: {body[:200]}")
+		raise RuntimeError(f"HTTP {resp.status}: {resp.text()[:200]}")
 	try:
 		js = resp.json()
 	except Exception:
@@ -47,22 +67,50 @@ def _fetch_page(request_ctx, page: int, page_size: int = 10) -> Tuple[List[Petra
 	return rows, js.get("pagination") or {}
 
 
-def _write_city_file(city_name: str, rows: List[PetrallRow], output_file: Path) -> None:
-	lines: List[str] = []
-	lines.append(city_name)
-	for r in rows:
+def _fetch_all_rows(client: KeepAliveClient, page_size: int = PETRALL_PAGE_SIZE, concurrency: int = 16, cache_dir: Optional[Path] = None, cache_ttl: float = HTTP_CACHE_TTL) -> List[PetrallRow]:
+	"""
+	İlk sayfadan toplam kayıt/sayfa sayısını okuyup kalan sayfaları paralel çeker (sayfa sırası korunur).
+	Sunucu page_size'ı kendi üst sınırına indirirse sayfa sayısı o sınıra göre hesaplanır.
+	`cache_dir` verilirse sayfalar diskte `cache_ttl` saniye önbelleklenir (bkz. common.http_cache).
+	"""
+	all_rows, pagination = _fetch_page(client, 1, page_size=page_size, cache_dir=cache_dir, cache_ttl=cache_ttl)
+	if not all_rows:
+		return all_rows
+	# Sunucunun gerçekte uyguladığı sayfa boyutu (per_page bildirilmezse ilk sayfadaki satır sayısı)
+	effective = int(pagination.get("per_page") or 0) or len(all_rows)
+	if pagination.get("total") is not None:
+		last_page = math.ceil(int(pagination["total"]) / effective)
+	elif pagination.get("last_page") is not None:
+		last_page = int(pagination["last_page"])
+	else:
+		# Pagination bilgisi yok: eksik (veya boş) sayfa gelene kadar sırayla çek
+		page = 1
+		rows = all_rows
+		while len(rows) >= effective:
+			page += 1
+			rows, _ = _fetch_page(client, page, page_size=page_size, cache_dir=cache_dir, cache_ttl=cache_ttl)
+			all_rows.extend(rows)
+		return all_rows
+	if last_page < 2:
+		return all_rows
+	# Sayfalar arasında durum yok; istekler ortak keep-alive bağlantı havuzundan paralel gider
+	with ThreadPoolExecutor(max_workers=min(concurrency, last_page - 1)) as ex:
+		for rows, _ in ex.map(lambda pg: _fetch_page(client, pg, page_size=page_size, cache_dir=cache_dir, cache_ttl=cache_ttl), range(2, last_page + 1)):
+			all_rows.extend(rows)
+	return all_rows
+
+
+def _render_city_file(city_name: str, rows: List[PetrallRow]) -> bytes:
+	lines = (
+		f"{r.district} | Motorin: {r.diesel} | Kurşunsuz 95: {r.gasoline} | Kalorifer Yakıtı: {r.heatingoil} | Fuel Oil: {r.fueloil}"
+		for r in rows
 		# İlçe adı sadece "-" ise yazma
-		dname = (r.district or "").strip()
-		if dname == "-":
-			continue
-		lines.append(
-			f"{r.district} | Motorin: {r.diesel} | Kurşunsuz 95: {r.gasoline} | Kalorifer Yakıtı: {r.heatingoil} | Fuel Oil: {r.fueloil}"
-		)
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+		if (r.district or "").strip() != "-"
+	)
+	return "\n".join([city_name, *lines]).encode("utf-8")
 
 def _is_istanbul_variant(name: str) -> bool:
-	up = (name or "").strip().upper()
-	return up.startswith("ISTANBUL") or up.startswith("İSTANBUL")
+	return fold((name or "").strip()).startswith("ISTANBUL")
 
 def _normalize_city_key(name: str) -> str:
 	n = (name or "").strip()
@@ -71,94 +119,58 @@ def _normalize_city_key(name: str) -> str:
 	return n
 
 def _safe_filename_city(name: str) -> str:
-	# Windows illegal chars: \ / : * ? " < > |
-	n = re.sub(r'[\\/:*?"<>|]+', "-", name).strip()
-	# collapse spaces and dashes
-	n = re.sub(r"\s{2,}", " ", n)
-	n = re.sub(r"-{2,}", "-", n)
-	return n
+	# Windows illegal chars become "-", then runs of spaces and dashes are collapsed
+	return _FN_DASHES.sub("-", _FN_SPACES.sub(" ", _FN_ILLEGAL.sub("-", name).strip()))
 
 
-def save_all_cities_prices_txt(output_dir: Path, debug: bool = False, page_size: int = 10) -> List[Path]:
+def save_all_cities_prices_txt(output_dir: Path, debug: bool = False, page_size: int = PETRALL_PAGE_SIZE, use_cache: bool = True, cache_ttl: float = HTTP_CACHE_TTL) -> List[Path]:
 	"""
 	Petrall fuelBring endpoint'ini sayfa sayfa çağırıp tüm satırları topla,
 	şehir adına göre gruplandır ve her şehir için bir txt yaz.
+	Sayfa yanıtları output_dir/.cache/petrall altında cache_ttl saniye önbelleklenir; use_cache=False ile atlanır.
 	"""
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		request_ctx = p.request.new_context(
-			extra_http_headers={
-				"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-				"Referer": "https://petrall.com.tr/fuel",
-				"Accept": "application/json, text/plain, */*",
-			}
-		)
-		# İlk sayfayı çek, toplam sayfa bilgisi al
-		all_rows: List[PetrallRow] = []
-		rows, pagination = _fetch_page(request_ctx, 1, page_size=page_size)
-		all_rows.extend(rows)
-		last_page = int(pagination.get("last_page") or 1)
-		# Güvenlik: eğer pagination bilgisi yoksa, örneğe göre 102 sayfa varsay
-		if not pagination:
-			last_page = 102
-		# Kalan sayfaları çek
-		for pg in range(2, last_page + 1):
-			rows, _ = _fetch_page(request_ctx, pg, page_size=page_size)
-			all_rows.extend(rows)
-		# Şehirlere göre grupla (İstanbul varyantlarını tek anahtar altında topla)
-		city_map: Dict[str, List[PetrallRow]] = {}
-		for r in all_rows:
-			if not r.city:
-				continue
-			key = _normalize_city_key(r.city)
-			city_map.setdefault(key, []).append(r)
-		# Yaz
-		output_dir.mkdir(parents=True, exist_ok=True)
-		for city, rows in city_map.items():
-			city_filename = _safe_filename_city(city)
-			fp = output_dir / f"petral_{city_filename}_prices.txt"
-			_write_city_file(city, rows, fp)
-			saved.append(fp)
-	return saved
-
-
-def save_city_prices_txt(city_name: str, output_dir: Path, debug: bool = False, page_size: int = 10) -> Path:
+	all_rows = _fetch_all_rows(get_client(), page_size=page_size, cache_dir=_cache_dir(output_dir, use_cache), cache_ttl=cache_ttl)
+	# Şehirlere göre grupla (İstanbul varyantlarını tek anahtar altında topla)
+	# Anahtar her farklı ham şehir adı için bir kez hesaplanır (satır başına değil)
+	norm = {c: _normalize_city_key(c) for c in {r.city for r in all_rows} if c}
+	city_map: DefaultDict[str, List[PetrallRow]] = defaultdict(list)
+	for r in all_rows:
+		if r.city:
+			city_map[norm[r.city]].append(r)
+	# Yaz
+	output_dir.mkdir(parents=True, exist_ok=True)
+	pending = [
+		(output_dir / f"petral_{_safe_filename_city(city)}_prices.txt", _render_city_file(city, rows))
+		for city, rows in city_map.items()
+	]
+	write_files(pending)
+	# The whole table comes from one response, so every city in it is written
+	return SavedFiles(fp for fp, _ in pending)
+
+
+def save_city_prices_txt(city_name: str, output_dir: Path, debug: bool = False, page_size: int = PETRALL_PAGE_SIZE, use_cache: bool = True, cache_ttl: float = HTTP_CACHE_TTL) -> Path:
 	"""
 	Belirli bir şehir için tüm sayfaları tarayıp sadece o şehrin satırlarını topla ve tek txt yaz.
 	"""
-	with sync_playwright() as p:
-		request_ctx = p.request.new_context(
-			extra_http_headers={
-				"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-				"Referer": "https://petrall.com.tr/fuel",
-				"Accept": "application/json, text/plain, */*",
-			}
-		)
-		# İlk sayfayı çek
-		target_rows: List[PetrallRow] = []
-		rows, pagination = _fetch_page(request_ctx, 1, page_size=page_size)
-		last_page = int(pagination.get("last_page") or 1) if pagination else 102
-		def _match_city(rcity: str, target: str) -> bool:
-			if _is_istanbul_variant(target) or target.strip().upper() in ["ISTANBUL", "İSTANBUL"]:
-				return _is_istanbul_variant(rcity)
-			ru = (rcity or "").strip().upper()
-			tu = (target or "").strip().upper()
-			return ru == tu or (ru in tu) or (tu in ru)
-		for r in rows:
-			if _match_city(r.city, city_name):
-				target_rows.append(r)
-		# Kalan sayfalar
-		for pg in range(2, last_page + 1):
-			rows, _ = _fetch_page(request_ctx, pg, page_size=page_size)
-			for r in rows:
-				if _match_city(r.city, city_name):
-					target_rows.append(r)
-		if not target_rows:
-			raise RuntimeError(f"Şehir bulunamadı veya veri yok: {city_name}")
-		output_dir.mkdir(parents=True, exist_ok=True)
-		final_city = _normalize_city_key(city_name)
-		fp = output_dir / f"petral_{_safe_filename_city(final_city)}_prices.txt"
-		_write_city_file(final_city, target_rows, fp)
-		return fp
+	target_rows: List[PetrallRow] = []
+	all_rows = _fetch_all_rows(get_client(), page_size=page_size, cache_dir=_cache_dir(output_dir, use_cache), cache_ttl=cache_ttl)
+	# Hedef şehrin karşılaştırma anahtarı döngü dışında bir kez hesaplanır
+	tu = fold((city_name or "").strip())
+	want_istanbul = _is_istanbul_variant(city_name)
+	def _match_city(rcity: str) -> bool:
+		if want_istanbul:
+			return _is_istanbul_variant(rcity)
+		ru = fold((rcity or "").strip())
+		return ru == tu or (ru in tu) or (tu in ru)
+	for r in all_rows:
+		if _match_city(r.city):
+			target_rows.append(r)
+	if not target_rows:
+		raise RuntimeError(f"Şehir bulunamadı veya veri yok: {city_name}")
+	output_dir.mkdir(parents=True, exist_ok=True)
+	final_city = _normalize_city_key(city_name)
+	fp = output_dir / f"petral_{_safe_filename_city(final_city)}_prices.txt"
+	fp.write_bytes(_render_city_file(final_city, target_rows))
+	return fp
 
 
@@ -1,3 +1,3 @@
-from .scraper import save_city_prices_txt, save_all_cities_prices_txt
+from .scraper import save_city_prices_txt, save_all_cities_prices_txt, iter_all_cities_prices_txt
 
 
@@ -1,11 +1,33 @@
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from playwright.sync_api import TimeoutError as PWTimeoutError
+import json
 import re
 
+from common.browser import MEDIA_RESOURCE_TYPES, SELECT_OPTIONS_JS, SET_SELECT_VALUE_JS, goto_ready, wait_stable
+from common.browser_pool import acquire_context
+from common.html_text import parse_list_items
+from common.http_session import get_client
+from common.price_cache import SavedFiles
+from common.xhr import cookie_header, request_carries, substitute_value
+
 QPLUS_URL = "https://www.qplus.com.tr/tr/akaryakit-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+_SORGULA_RE = re.compile(r"sorgula", re.I)
+# Dosya adı temizliği: Windows'ta yasak karakterler, tekrarlı boşluk ve tire
+_FN_ILLEGAL = re.compile(r'[\\/:*?"<>|]+')
+_FN_SPACES = re.compile(r"\s{2,}")
+_FN_DASHES = re.compile(r"-{2,}")
+
 
 def _ensure_cookie_accepted(page) -> None:
 	try:
@@ -27,9 +49,7 @@ def _find_city_select(page):
 def _get_options(select_handle) -> List[Dict[str, str]]:
 	if select_handle is None:
 		return []
-	return select_handle.evaluate(
-		"s => Array.from(s.options).map(o => ({ value: o.value, text: (o.textContent||'').trim() }))"
-	)
+	return select_handle.evaluate(SELECT_OPTIONS_JS)
 
 
 def _select_option(select_handle, value: str) -> None:
@@ -38,10 +58,7 @@ def _select_option(select_handle, value: str) -> None:
 		return
 	except Exception:
 		pass
-	select_handle.evaluate(
-		"(el, val)=>{ el.value=val; el.dispatchEvent(new Event('input',{bubbles:true})); el.dispatchEvent(new Event('change',{bubbles:true})); }",
-		value
-	)
+	select_handle.evaluate(SET_SELECT_VALUE_JS, value)
 
 
 def _click_query(page) -> None:
@@ -49,9 +66,9 @@ def _click_query(page) -> None:
 	btn = page.locator('button[name="sorgula"]')
 	if btn.count() == 0:
 		# Fallback: any button containing SORGULA
-		btn = page.get_by_role("button", name=re.compile(r"sorgula", re.I))
+		btn = page.get_by_role("button", name=_SORGULA_RE)
 		if btn.count() == 0:
-			btn = page.locator("button, input[type=submit]").filter(has_text=re.compile(r"sorgula", re.I))
+			btn = page.locator("button, input[type=submit]").filter(has_text=_SORGULA_RE)
 	if btn.count() == 0:
 		btn = page.locator("button, input[type=submit]")
 	handle = btn.first
@@ -73,57 +90,134 @@ class QPlusPrice:
 	lpg: str
 
 
+# At least 3 li elements under div.html (Il, Tarih, Benzin), in a list rendered after _mark_results_stale
+_RESULTS_READY_JS = """() => {
+	const c = document.querySelector('div.html');
+	if (!c) return false;
+	const ul = c.querySelector('ul');
+	if (!ul || ul.hasAttribute('data-stale')) return false;
+	return c.querySelectorAll('ul li').length >= 3;
+}"""
+
+
+_MARK_STALE_JS = "() => document.querySelectorAll('div.html ul').forEach(u => u.setAttribute('data-stale', ''))"
+
+
+def _mark_results_stale(page) -> None:
+	# Tag the previous city's list so the ready check only accepts the list injected for the next query
+	page.evaluate(_MARK_STALE_JS)
+
+
 def _wait_results(page, timeout_ms: int = 12000) -> None:
-	# QPlus injects response HTML into div.html as a list (<ul><li>...</li>...)
+	# QPlus injects response HTML into div.html as a list (<ul><li>...</li>...); the DOM is the completion signal
 	try:
-		# Wait for at least 3 li elements under .html (Il, Tarih, Benzin)
-		page.wait_for_function(
-			"""() => {
-				const c = document.querySelector('div.html');
-				if (!c) return false;
-				const li = c.querySelectorAll('ul li');
-				return li && li.length >= 3;
-			}""",
-			timeout=timeout_ms
-		)
+		page.wait_for_function(_RESULTS_READY_JS, timeout=timeout_ms)
 	except Exception:
-		page.wait_for_timeout(800)
-	page.wait_for_load_state("networkidle")
-	page.wait_for_timeout(200)
+		wait_stable(page, _RESULTS_READY_JS, timeout_ms=800)
+
+
+def _price_from_values(vals: List[str], fallback_city: str) -> QPlusPrice:
+	city = (vals[0] if len(vals) > 0 and vals[0] else fallback_city).strip()
+	benzin = vals[2] if len(vals) > 2 else ""
+	motorin = vals[3] if len(vals) > 3 else ""
+	lpg = vals[4] if len(vals) > 4 else ""
+	return QPlusPrice(city=city, benzin=benzin, motorin=motorin, lpg=lpg)
 
 
 def _extract_city_prices(page, fallback_city: str) -> Optional[QPlusPrice]:
 	# Read values from div.html -> <ul><li>Il</li><li>Tarih</li><li>Benzin</li><li>Motorin</li><li>LPG</li><li>QPLUS Max</li><li>Para Birimi</li>
-	container = page.locator("div.html")
-	if container.count() == 0:
+	try:
+		# All list texts in one round-trip
+		vals: List[str] = page.eval_on_selector_all("div.html ul li", "lis => lis.slice(0, 7).map(li => li.innerText.trim())")
+	except Exception:
+		return None
+	if len(vals) < 3:
 		return None
+	return _price_from_values(vals, fallback_city)
+
+
+def _query_and_discover(page, city_sel, value: str) -> Optional[Dict[str, str]]:
+	"""Run the UI query for one city while listening for the XHR that carries its value.
+
+	Returns a replayable request template, or None if the query did not go out as a
+	request carrying the city value (results are then only available through the UI).
+	"""
+	def _carries_city(req) -> bool:
+		return req.resource_type in ("xhr", "fetch") and request_carries(req.url, req.post_data, value)
+
+	_select_option(city_sel, value)
+	_mark_results_stale(page)
 	try:
-		lis = container.locator("ul li")
-		if lis.count() < 3:
-			return None
-		vals: List[str] = []
-		for i in range(min(7, lis.count())):
-			try:
-				vals.append(lis.nth(i).inner_text().strip())
-			except Exception:
-				vals.append("")
-		city = (vals[0] if len(vals) > 0 and vals[0] else fallback_city).strip()
-		benzin = vals[2] if len(vals) > 2 else ""
-		motorin = vals[3] if len(vals) > 3 else ""
-		lpg = vals[4] if len(vals) > 4 else ""
-		return QPlusPrice(city=city, benzin=benzin, motorin=motorin, lpg=lpg)
+		with page.expect_request(_carries_city, timeout=4000) as req_info:
+			_click_query(page)
+		req = req_info.value
 	except Exception:
 		return None
+	return {
+		"method": req.method,
+		"url": req.url,
+		"post_data": req.post_data or "",
+		"headers": {k: v for k, v in req.headers.items() if k.lower() in ("x-requested-with", "content-type", "accept", "referer")},
+		"value": value,
+	}
+
+
+def _html_fragments(body: str) -> List[str]:
+	"""The response is either the HTML fragment itself or JSON wrapping it."""
+	try:
+		data = json.loads(body)
+	except ValueError:
+		return [body]
+	found: List[str] = []
+	stack = [data]
+	while stack:
+		node = stack.pop()
+		if isinstance(node, dict):
+			stack.extend(node.values())
+		elif isinstance(node, list):
+			stack.extend(node)
+		elif isinstance(node, str) and "<li" in node:
+			found.append(node)
+	return found
+
+
+def _fetch_city_http(template: Dict[str, str], value: str, fallback_city: str, cookies: str = "") -> Optional[QPlusPrice]:
+	"""Replay the discovered query for another city; None if the response has no result list."""
+	url = substitute_value(template["url"], template["value"], value)
+	data = substitute_value(template["post_data"], template["value"], value)
+	headers = dict(template["headers"])
+	if cookies:
+		headers["Cookie"] = cookies
+	try:
+		resp = get_client().request(template["method"], url, body=data.encode("utf-8") if data else None, headers=headers)
+	except Exception:
+		return None
+	if not resp.ok:
+		return None
+	for fragment in _html_fragments(resp.text()):
+		vals = parse_list_items(fragment)
+		if len(vals) >= 3:
+			return _price_from_values(vals[:7], fallback_city)
+	return None
+
+
+_ISTANBUL_PREFIXES = ("ISTANBUL", "İSTANBUL")
+# Common variants of the placeholder option
+_DEFAULT_CITY_TEXTS = frozenset({"IL SECINIZ", "İL SEÇİNİZ", "İL SECİNİZ", "IL SEÇİNİZ"})
 
 
 def _is_istanbul_variant(name: str) -> bool:
-	up = (name or "").strip().upper()
-	return up.startswith("ISTANBUL") or up.startswith("İSTANBUL")
+	return (name or "").strip().upper().startswith(_ISTANBUL_PREFIXES)
 
 def _is_default_city_text(text: str) -> bool:
-	up = (text or "").strip().upper()
-	# Common variants
-	return up in {"IL SECINIZ", "İL SEÇİNİZ", "İL SECİNİZ", "IL SEÇİNİZ"}
+	return (text or "").strip().upper() in _DEFAULT_CITY_TEXTS
+
+
+def _find_option(options: List[Dict[str, str]], city_name: str) -> Optional[Dict[str, str]]:
+	"""Option whose text equals `city_name` (case-insensitive), else the first one containing it."""
+	want = city_name.strip().upper()
+	keyed = [((o.get("text") or "").strip().upper(), o) for o in options]
+	return next((o for up, o in keyed if up == want), None) or next((o for up, o in keyed if want in up), None)
 
 
 def _normalize_city(name: str) -> str:
@@ -134,49 +228,25 @@ def _normalize_city(name: str) -> str:
 
 
 def _safe_city_for_filename(name: str) -> str:
-	n = re.sub(r'[\\/:*?"<>|]+', "-", name).strip()
-	n = re.sub(r"\s{2,}", " ", n)
-	n = re.sub(r"-{2,}", "-", n)
-	return n
+	return _FN_DASHES.sub("-", _FN_SPACES.sub(" ", _FN_ILLEGAL.sub("-", name).strip()))
 
 
 def save_city_prices_txt(city_name: str, output_dir: Path, url: str = QPLUS_URL, debug: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
 		page = context.new_page()
 		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
+		goto_ready(page, url, ready_selector="select")
 		_ensure_cookie_accepted(page)
-		page.wait_for_timeout(400)
 		city_sel = _find_city_select(page)
 		if city_sel is None:
 			raise RuntimeError("Şehir seçimi için select bulunamadı.")
 		options = _get_options(city_sel)
 		# Find target option (exact, then contains)
-		target = None
-		for o in options:
-			if (o.get("text") or "").strip().upper() == city_name.strip().upper():
-				target = o
-				break
-		if target is None:
-			for o in options:
-				if city_name.strip().upper() in (o.get("text") or "").strip().upper():
-					target = o
-					break
+		target = _find_option(options, city_name)
 		if target is None:
 			raise RuntimeError(f"Şehir bulunamadı: {city_name}")
 		_select_option(city_sel, target.get("value") or "")
+		_mark_results_stale(page)
 		_click_query(page)
 		_wait_results(page, timeout_ms=12000)
 		price = _extract_city_prices(page, fallback_city=(target.get("text") or city_name).strip())
@@ -193,45 +263,54 @@ def save_city_prices_txt(city_name: str, output_dir: Path, url: str = QPLUS_URL,
 		lines.append(final_city)
 		lines.append(f"Benzin: {price.benzin} | Motorin: {price.motorin} | LPG: {price.lpg}")
 		fp.write_text("\n".join(lines), encoding="utf-8")
-		browser.close()
 		return fp
 
 
-def save_all_cities_prices_txt(output_dir: Path, url: str = QPLUS_URL, debug: bool = False, min_delay: float = 0.5, max_delay: float = 1.1) -> List[Path]:
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
+def iter_all_cities_prices_txt(output_dir: Path, url: str = QPLUS_URL, debug: bool = False, min_delay: float = 0.5, max_delay: float = 1.1, failed_cities: Optional[List[str]] = None) -> Iterator[Path]:
+	"""Write each city's file as soon as it is scraped and yield its path (İstanbul, merged, comes last).
+
+	Cities that could not be scraped are appended to `failed_cities` when it is given.
+	"""
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
 		page = context.new_page()
 		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
+		goto_ready(page, url, ready_selector="select")
 		_ensure_cookie_accepted(page)
-		page.wait_for_timeout(300)
 		city_sel = _find_city_select(page)
 		if city_sel is None:
 			raise RuntimeError("Şehir seçimi için select bulunamadı.")
 		options = _get_options(city_sel)
+		# The select survives the AJAX query; resolve it once and reuse the handle for every city
+		city_sel = city_sel.element_handle()
 		# Filter out default/empty
 		opts = [o for o in options if (o.get("value") or "").strip() and not _is_default_city_text(o.get("text") or "")]
 		istanbul_prices: List[QPlusPrice] = []
 		output_dir.mkdir(parents=True, exist_ok=True)
+		# The first query is run through the UI while its XHR is captured; the rest are replayed over HTTP
+		template: Optional[Dict[str, str]] = None
+		cookies = ""
+		discovery_tried = False
 		for o in opts:
 			try:
-				_select_option(city_sel, o.get("value") or "")
-				_click_query(page)
-				_wait_results(page, timeout_ms=12000)
-				price = _extract_city_prices(page, fallback_city=(o.get("text") or "").strip())
+				value = o.get("value") or ""
+				price = _fetch_city_http(template, value, (o.get("text") or "").strip(), cookies) if template else None
+				if price is None:
+					if not discovery_tried:
+						discovery_tried = True
+						template = _query_and_discover(page, city_sel, value)
+						if template:
+							cookies = cookie_header(context, template["url"])
+					else:
+						# Replay stopped matching (or never worked): stay on the UI path
+						template = None
+						_select_option(city_sel, value)
+						_mark_results_stale(page)
+						_click_query(page)
+					_wait_results(page, timeout_ms=12000)
+					price = _extract_city_prices(page, fallback_city=(o.get("text") or "").strip())
 				if price is None:
+					if failed_cities is not None:
+						failed_cities.append((o.get("text") or "").strip())
 					price = QPlusPrice(city=(o.get("text") or "").strip(), benzin="", motorin="", lpg="")
 				# Skip default option if somehow captured
 				if _is_default_city_text(price.city):
@@ -243,9 +322,11 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = QPLUS_URL, debug: bo
 				fp = output_dir / f"qplus_{_safe_city_for_filename(final_city)}_prices.txt"
 				lines = [final_city, f"Benzin: {price.benzin} | Motorin: {price.motorin} | LPG: {price.lpg}"]
 				fp.write_text("\n".join(lines), encoding="utf-8")
-				saved.append(fp)
 			except Exception:
+				if failed_cities is not None:
+					failed_cities.append((o.get("text") or "").strip())
 				continue
+			yield fp
 			page.wait_for_timeout(int(1000 * min_delay))
 		# Merge İstanbul variants
 		if istanbul_prices:
@@ -255,8 +336,12 @@ def save_all_cities_prices_txt(output_dir: Path, url: str = QPLUS_URL, debug: bo
 			for pr in istanbul_prices:
 				lines.append(f"{pr.city} | Benzin: {pr.benzin} | Motorin: {pr.motorin} | LPG: {pr.lpg}")
 			fp.write_text("\n".join(lines), encoding="utf-8")
-			saved.append(fp)
-		browser.close()
-	return saved
+			yield fp
+
+
+def save_all_cities_prices_txt(output_dir: Path, url: str = QPLUS_URL, debug: bool = False, min_delay: float = 0.5, max_delay: float = 1.1) -> List[Path]:
+	failed: List[str] = []
+	files = list(iter_all_cities_prices_txt(output_dir, url=url, debug=debug, min_delay=min_delay, max_delay=max_delay, failed_cities=failed))
+	return SavedFiles(files, failed)
 
 
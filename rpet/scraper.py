@@ -1,11 +1,25 @@
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
-import random
+from playwright.sync_api import TimeoutError as PWTimeoutError
+
+from common.browser import goto_ready
+from common.browser_pool import acquire_context
+from common.file_writer import write_files
+from common.html_text import parse_tables
+from common.http_session import get_client
+from common.price_cache import SavedFiles
 
 RPET_URL = "https://rpet.com.tr/yakit-fiyatlari/"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
 
 def _ensure_cookie_accepted(page) -> None:
 	try:
@@ -37,134 +51,109 @@ class RpetCityRow:
 
 
 def _extract_rows(table_locator) -> List[RpetCityRow]:
-	rows = table_locator.locator("tbody tr")
-	rc = rows.count()
-	results: List[RpetCityRow] = []
-	for i in range(rc):
-		tr = rows.nth(i)
-		tds = tr.locator("td")
-		if tds.count() < 4:
-			continue
-		def cell_text(idx: int) -> str:
-			try:
-				return tds.nth(idx).inner_text().replace("\xa0", " ").strip()
-			except Exception:
-				return ""
-		results.append(
-			RpetCityRow(
-				city=cell_text(0),
-				benzin=cell_text(1),
-				motorin=cell_text(2),
-				date=cell_text(3),
-			)
-		)
-	return results
-
-
-def _write_city_to_text(row: RpetCityRow, output_file: Path) -> None:
-	lines: List[str] = []
-	lines.append(f"{row.city}")
-	lines.append(f"Benzin: {row.benzin} | Motorin: {row.motorin}")
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+	# One evaluate for the whole table: cell texts per row, non-breaking spaces normalized
+	cells = table_locator.evaluate(
+		"t => [...t.querySelectorAll('tbody tr')].map(tr => [...tr.querySelectorAll('td')].map(td => td.innerText.replace(/\\u00a0/g, ' ').trim()))"
+	)
+	return _rows_from_cells(cells)
 
-def _is_istanbul_variant(name: str) -> bool:
-	up = (name or "").strip().upper()
-	return up.startswith("ISTANBUL") or up.startswith("İSTANBUL")
 
-def _write_istanbul_group_to_text(rows: List[RpetCityRow], output_file: Path) -> None:
-	lines: List[str] = []
-	lines.append("ISTANBUL")
-	for r in rows:
-		# Örneğin: ISTANBUL (ANADOLU) | Benzin: ... | Motorin: ... | Tarih: ...
-		lines.append(f"{r.city} | Benzin: {r.benzin} | Motorin: {r.motorin}")
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+def _rows_from_cells(cells: List[List[str]]) -> List[RpetCityRow]:
+	return [
+		RpetCityRow(city=c[0], benzin=c[1], motorin=c[2], date=c[3])
+		for c in cells
+		if len(c) >= 4
+	]
 
 
-def save_all_cities_prices_txt(output_dir: Path, url: str = RPET_URL, debug: bool = False, min_delay: float = 0.5, max_delay: float = 1.1) -> List[Path]:
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
+def _fetch_rows_http(url: str) -> List[RpetCityRow]:
+	"""Read the table straight from the server HTML (wpDataTables renders it statically).
+
+	Returns [] on any failure (bad status, challenge page, table not found) so the caller
+	falls back to the browser.
+	"""
+	try:
+		resp = get_client().get(url, headers={"Accept": "text/html,application/xhtml+xml"})
+	except Exception:
+		return []
+	if not resp.ok:
+		return []
+	tables = [t for t in parse_tables(resp.text()) if t["rows"]]
+	# Same preference order as _find_prices_table
+	table = next((t for t in tables if t["attrs"].get("id") == "wpdtSimpleTable-1"), None)
+	if table is None:
+		table = next((t for t in tables if {"wpdtSimpleTable", "wpDataTable"} <= set((t["attrs"].get("class") or "").split())), None)
+	if table is None:
+		return []
+	return _rows_from_cells(table["rows"])
+
+
+def _fetch_rows_browser(url: str, debug: bool = False) -> List[RpetCityRow]:
+	with acquire_context(debug=debug, **_CONTEXT_KWARGS) as context:
 		page = context.new_page()
 		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
+		goto_ready(page, url, ready_selector="table tbody tr")
 		_ensure_cookie_accepted(page)
 		table = _find_prices_table(page)
 		page.wait_for_selector("tbody tr", timeout=15000)
-		rows = _extract_rows(table)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		# İstanbul'u tek dosyada birleştir
-		istanbul_rows = [r for r in rows if _is_istanbul_variant(r.city)]
-		other_rows = [r for r in rows if not _is_istanbul_variant(r.city)]
-		if istanbul_rows:
-			fp_ist = output_dir / "rpet_ISTANBUL_prices.txt"
-			_write_istanbul_group_to_text(istanbul_rows, fp_ist)
-			saved.append(fp_ist)
-		for r in other_rows:
-			fp = output_dir / f"rpet_{r.city}_prices.txt"
-			_write_city_to_text(r, fp)
-			saved.append(fp)
-			page.wait_for_timeout(int(1000 * random.uniform(min_delay, max_delay)))
-		browser.close()
-	return saved
+		return _extract_rows(table)
+
+
+def _fetch_rows(url: str, debug: bool = False) -> List[RpetCityRow]:
+	# Debug mode always shows the browser
+	rows = [] if debug else _fetch_rows_http(url)
+	if not rows:
+		rows = _fetch_rows_browser(url, debug=debug)
+	return rows
+
+
+def _render_city(row: RpetCityRow) -> bytes:
+	return f"{row.city}\nBenzin: {row.benzin} | Motorin: {row.motorin}".encode("utf-8")
+
+_ISTANBUL_PREFIXES = ("ISTANBUL", "İSTANBUL")
+
+def _is_istanbul_variant(name: str) -> bool:
+	return (name or "").strip().upper().startswith(_ISTANBUL_PREFIXES)
+
+def _render_istanbul_group(rows: List[RpetCityRow]) -> bytes:
+	# Örneğin: ISTANBUL (ANADOLU) | Benzin: ... | Motorin: ...
+	return "\n".join(["ISTANBUL", *(f"{r.city} | Benzin: {r.benzin} | Motorin: {r.motorin}" for r in rows)]).encode("utf-8")
+
+
+def save_all_cities_prices_txt(output_dir: Path, url: str = RPET_URL, debug: bool = False, min_delay: float = 0.5, max_delay: float = 1.1) -> List[Path]:
+	# min_delay/max_delay are kept for call compatibility: the whole table comes from one request
+	pending: List[Tuple[Path, bytes]] = []
+	rows = _fetch_rows(url, debug=debug)
+	output_dir.mkdir(parents=True, exist_ok=True)
+	# İstanbul'u tek dosyada birleştir
+	istanbul_rows = [r for r in rows if _is_istanbul_variant(r.city)]
+	if istanbul_rows:
+		pending.append((output_dir / "rpet_ISTANBUL_prices.txt", _render_istanbul_group(istanbul_rows)))
+	pending.extend((output_dir / f"rpet_{r.city}_prices.txt", _render_city(r)) for r in rows if not _is_istanbul_variant(r.city))
+	write_files(pending)
+	# The whole table comes from one response, so every city in it is written
+	return SavedFiles(fp for fp, _ in pending)
 
 
 def save_city_prices_txt(city_name: str, output_dir: Path, url: str = RPET_URL, debug: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
-		table = _find_prices_table(page)
-		page.wait_for_selector("tbody tr", timeout=15000)
-		rows = _extract_rows(table)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		# İstanbul isteği: iki yakanın tek dosyada birleştirilmesi
-		if _is_istanbul_variant(city_name) or city_name.strip().upper() in ["ISTANBUL", "İSTANBUL"]:
-			istanbul_rows = [r for r in rows if _is_istanbul_variant(r.city)]
-			if not istanbul_rows:
-				raise RuntimeError("İstanbul satırları bulunamadı.")
-			fp = output_dir / "rpet_ISTANBUL_prices.txt"
-			_write_istanbul_group_to_text(istanbul_rows, fp)
-		else:
-			# Tek şehir dosyası
-			target = None
-			for r in rows:
-				if (r.city or "").strip().upper() == city_name.strip().upper():
-					target = r
-					break
-			if target is None:
-				for r in rows:
-					if city_name.strip().upper() in (r.city or "").strip().upper():
-						target = r
-						break
-			if target is None:
-				raise RuntimeError(f"Şehir bulunamadı: {city_name}")
-			fp = output_dir / f"rpet_{target.city}_prices.txt"
-			_write_city_to_text(target, fp)
-		browser.close()
-		return fp
+	rows = _fetch_rows(url, debug=debug)
+	output_dir.mkdir(parents=True, exist_ok=True)
+	# İstanbul isteği: iki yakanın tek dosyada birleştirilmesi
+	want = city_name.strip().upper()
+	if want.startswith(_ISTANBUL_PREFIXES):
+		istanbul_rows = [r for r in rows if _is_istanbul_variant(r.city)]
+		if not istanbul_rows:
+			raise RuntimeError("İstanbul satırları bulunamadı.")
+		fp = output_dir / "rpet_ISTANBUL_prices.txt"
+		fp.write_bytes(_render_istanbul_group(istanbul_rows))
+	else:
+		# Tek şehir dosyası
+		keyed = [((r.city or "").strip().upper(), r) for r in rows]
+		target = next((r for up, r in keyed if up == want), None) or next((r for up, r in keyed if want in up), None)
+		if target is None:
+			raise RuntimeError(f"Şehir bulunamadı: {city_name}")
+		fp = output_dir / f"rpet_{target.city}_prices.txt"
+		fp.write_bytes(_render_city(target))
+	return fp
 
 
@@ -1,11 +1,33 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import urlencode, urljoin
+from playwright.sync_api import TimeoutError as PWTimeoutError
 import re
 
+from common.browser import SELECT_OPTIONS_JS, goto_ready, wait_stable
+from common.browser_pool import acquire_context
+from common.city_cache import city_cache_path, load_cached_cities, save_cached_cities, invalidate_cached_cities
+from common.html_text import parse_forms, parse_tables
+from common.http_session import get_client
+from common.price_cache import SavedFiles
+from common.workers import iter_parallel_pages
+
 SAHOIL_URL = "https://sahhoil.com.tr/tr/akaryakit-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+_WS_RE = re.compile(r"\s{2,}")
+_TABLE_CLASSES = {"table", "table-striped", "table-hover"}
+
 
 def _ensure_cookie_accepted(page) -> None:
 	try:
@@ -15,6 +37,14 @@ def _ensure_cookie_accepted(page) -> None:
 		pass
 
 
+def _open_sahoil_page(context, url: str):
+	page = context.new_page()
+	page.set_default_navigation_timeout(45000)
+	goto_ready(page, url, ready_selector="select")
+	_ensure_cookie_accepted(page)
+	return page
+
+
 def _find_city_select(page):
 	# On sample HTML the city select is: select[name="il"]
 	sel = page.locator('select[name="il"]')
@@ -26,8 +56,8 @@ def _find_city_select(page):
 	for i in range(cnt):
 		s = selects.nth(i)
 		try:
-			opts = s.evaluate("el => Array.from(el.options).map(o => (o.textContent||'').trim())")
-			if opts and len(opts) >= 20 and any(x.upper() == "ADANA" for x in opts):
+			opts = s.evaluate(SELECT_OPTIONS_JS)
+			if opts and len(opts) >= 20 and any(o["text"].upper() == "ADANA" for o in opts):
 				return s
 		except Exception:
 			continue
@@ -35,12 +65,12 @@ def _find_city_select(page):
 
 
 def _select_city_and_submit(page, select_handle, value: str) -> None:
-	# The form uses onchange=this.form.submit(). select then wait for navigation
-	select_handle.select_option(value)
+	# The form uses onchange=this.form.submit(): wait for that navigation, callers then wait for the table rows
 	try:
-		page.wait_for_load_state("networkidle", timeout=15000)
-	except Exception:
-		page.wait_for_timeout(800)
+		with page.expect_navigation(wait_until="domcontentloaded", timeout=15000):
+			select_handle.select_option(value)
+	except PWTimeoutError:
+		wait_stable(page, "() => document.querySelectorAll('table tbody tr').length > 0", timeout_ms=800)
 
 
 @dataclass
@@ -64,45 +94,35 @@ def _dedupe_districts(rows: List[SahoilDistrictRow]) -> List[SahoilDistrictRow]:
 		out.append(r)
 	return out
 
-def _extract_district_table(page) -> List[SahoilDistrictRow]:
-	# Prefer the specific table classes present in the site
-	tables = page.locator("table.table.table-striped.table-hover")
-	if tables.count() == 0:
-		tables = page.locator("table.table-striped.table-hover, table")
-	tc = tables.count()
-	for i in range(tc):
-		tb = tables.nth(i)
+# Candidate tables in one round-trip: header text (thead, else the first body row) and
+# raw cell texts of every body row
+_DUMP_TABLES_JS = """() => {
+	let tables = document.querySelectorAll('table.table.table-striped.table-hover');
+	if (!tables.length) tables = document.querySelectorAll('table.table-striped.table-hover, table');
+	return [...tables].map(t => {
+		const thead = t.querySelector('thead');
+		const first = t.querySelector('tbody tr');
+		return {
+			head: thead ? thead.innerText : (first ? first.innerText : ''),
+			rows: [...t.querySelectorAll('tbody tr')].map(tr => [...tr.querySelectorAll('td')].map(td => td.innerText)),
+		};
+	});
+}"""
+
+def _clean_cell(text: str) -> str:
+	return _WS_RE.sub(" ", text.replace("\xa0", " ").strip())
+
+def _district_rows(tables: List[Dict]) -> List[SahoilDistrictRow]:
+	# `tables`: {"head": text, "rows": [[cell text, ...], ...]} from the DOM dump or the HTTP parse
+	for table in tables:
 		# Basic header check (thead may use td instead of th)
-		head_text = ""
-		try:
-			head_text = tb.locator("thead").inner_text().upper()
-		except Exception:
-			try:
-				# Sometimes headers are first row in tbody
-				head_text = tb.locator("tbody tr").first.inner_text().upper()
-			except Exception:
-				pass
+		head_text = (table["head"] or "").upper()
 		if ("BENZ" in head_text or "KURŞUNSUZ" in head_text or "KURSUNSUZ" in head_text) and ("MOTOR" in head_text or "MOTORİN" in head_text or "MOTORIN" in head_text):
-			try:
-				rows = tb.locator("tbody tr")
-			except Exception:
-				continue
-			rc = rows.count()
 			results: List[SahoilDistrictRow] = []
-			for r in range(rc):
-				tr = rows.nth(r)
-				tds = tr.locator("td")
-				if tds.count() < 3:
+			for cells in table["rows"]:
+				if len(cells) < 3:
 					continue
-				def cell(idx: int) -> str:
-					try:
-						txt = tds.nth(idx).inner_text().replace("\xa0", " ").strip()
-						return re.sub(r"\s{2,}", " ", txt)
-					except Exception:
-						return ""
-				name = cell(0)
-				benzin = cell(1)
-				motorin = cell(2)
+				name, benzin, motorin = (_clean_cell(c) for c in cells[:3])
 				# Skip header-like or empty rows
 				if not name or any(k in name.upper() for k in ["KURŞUNSUZ", "MOTOR", "KURSUNSUZ"]):
 					continue
@@ -111,56 +131,94 @@ def _extract_district_table(page) -> List[SahoilDistrictRow]:
 				return results
 	return []
 
+def _extract_district_table(page) -> List[SahoilDistrictRow]:
+	# Prefer the specific table classes present in the site
+	return _district_rows(page.evaluate(_DUMP_TABLES_JS))
+
+def _tables_from_html(html: str) -> List[Dict]:
+	"""Parsed tables in the shape of _DUMP_TABLES_JS, with the same class preference."""
+	tables = parse_tables(html)
+	preferred = [t for t in tables if _TABLE_CLASSES <= set((t["attrs"].get("class") or "").split())]
+	return [
+		{"head": " ".join(t["head"] or (t["rows"][0] if t["rows"] else [])), "rows": t["rows"]}
+		for t in (preferred or tables)
+	]
 
-def _write_city_file(city_name: str, districts: List[SahoilDistrictRow], output_file: Path) -> None:
-	lines: List[str] = []
-	lines.append(city_name)
-	for d in districts:
-		lines.append(f"{d.name} | Benzin: {d.benzin} | Motorin: {d.motorin}")
-	output_file.write_text("\n".join(lines), encoding="utf-8")
 
+def _load_form_http(url: str) -> Optional[Dict]:
+	"""GET the prices page and read the city form; None if the page or the form is not there.
 
-def save_city_prices_txt(city_name: str, output_dir: Path, url: str = SAHOIL_URL, debug: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
+	Returns {"action", "method", "fields", "options", "headers"} where `fields` are the
+	form's own (name, value) pairs and `headers` carry the Referer and any session cookie.
+	"""
+	try:
+		resp = get_client().get(url, headers={"Accept": "text/html,application/xhtml+xml"})
+	except Exception:
+		return None
+	if not resp.ok:
+		return None
+	form = next((f for f in parse_forms(resp.text()) if "il" in f["selects"]), None)
+	if form is None:
+		return None
+	headers = {"Referer": url, "Accept": "text/html,application/xhtml+xml"}
+	set_cookie = next((v for k, v in resp.headers.items() if k.lower() == "set-cookie"), "")
+	if set_cookie:
+		jar = SimpleCookie()
 		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
+			jar.load(set_cookie)
+		except CookieError:
 			pass
-		_ensure_cookie_accepted(page)
+		if jar:
+			headers["Cookie"] = "; ".join(f"{k}={m.value}" for k, m in jar.items())
+	return {
+		"action": urljoin(url, form["attrs"].get("action") or url),
+		"method": (form["attrs"].get("method") or "get").upper(),
+		"fields": form["fields"],
+		"options": [o for o in form["selects"]["il"] if o["value"].strip()],
+		"headers": headers,
+	}
+
+
+def _fetch_city_http(form: Dict, value: str) -> List[SahoilDistrictRow]:
+	"""Submit the city form for `value` without a browser; [] if the response has no district table."""
+	body = urlencode([(k, value if k == "il" else v) for k, v in form["fields"]])
+	try:
+		if form["method"] == "POST":
+			headers = {**form["headers"], "Content-Type": "application/x-www-form-urlencoded"}
+			resp = get_client().request("POST", form["action"], body=body.encode("utf-8"), headers=headers)
+		else:
+			action = form["action"].split("#", 1)[0]
+			resp = get_client().get(f"{action}{'&' if '?' in action else '?'}{body}", headers=form["headers"])
+	except Exception:
+		return []
+	if not resp.ok:
+		return []
+	return _district_rows(_tables_from_html(resp.text()))
+
+
+def _render_city_file(city_name: str, districts: List[SahoilDistrictRow]) -> bytes:
+	return "\n".join([city_name, *(f"{d.name} | Benzin: {d.benzin} | Motorin: {d.motorin}" for d in districts)]).encode("utf-8")
+
+
+def save_city_prices_txt(city_name: str, output_dir: Path, url: str = SAHOIL_URL, debug: bool = False) -> Path:
+	with acquire_context(debug=debug, **_CONTEXT_KWARGS) as context:
+		page = _open_sahoil_page(context, url)
 		city_sel = _find_city_select(page)
 		if city_sel is None:
 			raise RuntimeError("Şehir seçimi için select bulunamadı.")
 		# Find option by text (exact/contains)
-		options: List[Dict[str, str]] = city_sel.evaluate(
-			"s => Array.from(s.options).map(o => ({ value: o.value, text: (o.textContent||'').trim() }))"
-		)
+		options: List[Dict[str, str]] = city_sel.evaluate(SELECT_OPTIONS_JS)
+		# Option texts are normalized once for all the matching below
+		want = city_name.strip().upper()
+		keyed = [((o.get("text") or "").strip().upper(), o) for o in options]
 		targets: List[Dict[str, str]] = []
 		# İstanbul tek dosya: iki varyant varsa ikisini de ekle
-		if _is_istanbul_variant(city_name):
-			targets = [o for o in options if _is_istanbul_variant(o.get("text") or "")]
+		if want.startswith("ISTANBUL"):
+			targets = [o for up, o in keyed if up.startswith("ISTANBUL")]
 		if not targets:
-			# exact
-			for o in options:
-				if (o.get("text") or "").strip().upper() == city_name.strip().upper():
-					targets = [o]
-					break
-		if not targets:
-			# contains
-			for o in options:
-				if city_name.strip().upper() in (o.get("text") or "").strip().upper():
-					targets = [o]
-					break
+			# exact, then contains
+			target = next((o for up, o in keyed if up == want), None) or next((o for up, o in keyed if want in up), None)
+			targets = [target] if target is not None else []
 		if not targets:
 			raise RuntimeError(f"Şehir bulunamadı: {city_name}")
 		# Collect districts across one or more targets (İstanbul)
@@ -168,7 +226,7 @@ def save_city_prices_txt(city_name: str, output_dir: Path, url: str = SAHOIL_URL
 		for t in targets:
 			_select_city_and_submit(page, city_sel, t.get("value") or "")
 			try:
-				page.wait_for_selector("table.table.table-striped.table-hover tbody tr", timeout=12000)
+				page.wait_for_selector("table.table.table-striped.table-hover tbody tr", timeout=10000)
 			except Exception:
 				pass
 			merged.extend(_extract_district_table(page))
@@ -176,73 +234,115 @@ def save_city_prices_txt(city_name: str, output_dir: Path, url: str = SAHOIL_URL
 		output_dir.mkdir(parents=True, exist_ok=True)
 		final_city = "ISTANBUL" if _is_istanbul_variant(city_name) else city_name
 		fp = output_dir / f"sahoil_{final_city}_prices.txt"
-		_write_city_file(final_city, districts, fp)
-		browser.close()
+		fp.write_bytes(_render_city_file(final_city, districts))
 		return fp
 
 
-def save_all_cities_prices_txt(output_dir: Path, url: str = SAHOIL_URL, debug: bool = False, min_delay: float = 0.6, max_delay: float = 1.2) -> List[Path]:
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-		_ensure_cookie_accepted(page)
+def _scrape_city(page, url: str, o: Dict[str, str]) -> List[SahoilDistrictRow]:
+	"""Submit one city on a worker's page and read its district table.
+
+	The submitted page carries the same form, so the next city is selected right there;
+	the base page is only reloaded after a failure, before the error is passed on.
+	"""
+	try:
 		city_sel = _find_city_select(page)
 		if city_sel is None:
 			raise RuntimeError("Şehir seçimi için select bulunamadı.")
-		options: List[Dict[str, str]] = city_sel.evaluate("s => Array.from(s.options).map(o => ({ value: o.value, text: (o.textContent||'').trim() }))")
-		options = [o for o in options if (o.get('value') or '').strip()]
-		output_dir.mkdir(parents=True, exist_ok=True)
-		istanbul_rows: List[SahoilDistrictRow] = []
-		for o in options:
-			try:
-				# Reload base page each iteration to avoid stale handles after submit refresh
-				page.goto(url, wait_until="domcontentloaded")
-				try:
-					page.wait_for_load_state("networkidle", timeout=8000)
-				except Exception:
-					pass
-				_ensure_cookie_accepted(page)
+		_select_city_and_submit(page, city_sel, o.get("value") or "")
+		# Wait table rows appear
+		try:
+			page.wait_for_selector("table.table.table-striped.table-hover tbody tr", timeout=10000)
+		except Exception:
+			pass
+		return _extract_district_table(page)
+	except Exception:
+		try:
+			page.goto(url, wait_until="domcontentloaded")
+		except Exception:
+			pass
+		raise
+	finally:
+		page.wait_for_timeout(800)
+
+
+def iter_all_cities_prices_txt(output_dir: Path, url: str = SAHOIL_URL, debug: bool = False, workers: int = 4, failed_cities: Optional[List[str]] = None) -> Iterator[Path]:
+	"""Write each city's file as soon as it is scraped and yield its path (İstanbul, merged, comes last).
+
+	Cities go over HTTP first; the rest are spread over `workers` browser contexts (1 in debug mode).
+	Cities that could not be scraped are appended to `failed_cities` when it is given.
+	"""
+	output_dir.mkdir(parents=True, exist_ok=True)
+	istanbul_parts: Dict[int, List[SahoilDistrictRow]] = {}
+	done = set()
+	cached = False
+
+	def _write(idx: int, rows: List[SahoilDistrictRow]) -> Optional[Path]:
+		done.add(idx)
+		city_text = (options[idx].get("text") or "").strip()
+		if _is_istanbul_variant(city_text):
+			istanbul_parts[idx] = rows
+			return None
+		fp = output_dir / f"sahoil_{city_text}_prices.txt"
+		fp.write_bytes(_render_city_file(city_text, rows))
+		return fp
+
+	# The page is a plain form submit: read the form over HTTP once and submit every city without a browser
+	form = None if debug else _load_form_http(url)
+	if form is not None:
+		options = form["options"]
+		with ThreadPoolExecutor(max_workers=workers) as ex:
+			for idx, rows in enumerate(ex.map(lambda o: _fetch_city_http(form, o["value"]), options)):
+				fp = _write(idx, rows) if rows else None
+				if fp is not None:
+					yield fp
+		print(f"Sahoil: {len(done)}/{len(options)} şehir HTTP ile alındı.")
+	else:
+		# City options come from the local cache, else from one bootstrap page
+		cache_file = city_cache_path(output_dir, "sahoil")
+		options = load_cached_cities(cache_file, url)
+		cached = options is not None
+		if options is None:
+			with acquire_context(debug=debug, **_CONTEXT_KWARGS) as context:
+				page = _open_sahoil_page(context, url)
 				city_sel = _find_city_select(page)
 				if city_sel is None:
 					raise RuntimeError("Şehir seçimi için select bulunamadı.")
-				_select_city_and_submit(page, city_sel, o.get("value") or "")
-				# Wait table rows appear
-				try:
-					page.wait_for_selector("table.table.table-striped.table-hover tbody tr", timeout=12000)
-				except Exception:
-					pass
-				districts = _extract_district_table(page)
-				city_text = (o.get("text") or "").strip()
-				if _is_istanbul_variant(city_text):
-					istanbul_rows.extend(districts)
-				else:
-					fp = output_dir / f"sahoil_{city_text}_prices.txt"
-					_write_city_file(city_text, districts, fp)
-					saved.append(fp)
-			except Exception as e:
-				print(f"Hata/atlandı: {o.get('text')} -> {e}")
-			page.wait_for_timeout(800)
-		# Write merged İstanbul if any
-		if istanbul_rows:
-			merged = _dedupe_districts(istanbul_rows)
-			fp_ist = output_dir / "sahoil_ISTANBUL_prices.txt"
-			_write_city_file("ISTANBUL", merged, fp_ist)
-			saved.append(fp_ist)
-		browser.close()
-	return saved
+				options = city_sel.evaluate(SELECT_OPTIONS_JS)
+			options = [o for o in options if (o.get('value') or '').strip()]
+			save_cached_cities(cache_file, url, options)
+
+	# Cities the HTTP path could not read are spread over the browser workers
+	failed = False
+	for _, idx, result in iter_parallel_pages(
+		[i for i in range(len(options)) if i not in done],
+		work=lambda page, i: _scrape_city(page, url, options[i]),
+		setup=lambda context: _open_sahoil_page(context, url),
+		workers=1 if debug else workers,
+		debug=debug,
+		context_kwargs=_CONTEXT_KWARGS,
+	):
+		if isinstance(result, Exception):
+			print(f"Hata/atlandı: {options[idx].get('text')} -> {result}")
+			failed = True
+			if failed_cities is not None:
+				failed_cities.append((options[idx].get("text") or "").strip())
+			continue
+		fp = _write(idx, result)
+		if fp is not None:
+			yield fp
+	if cached and failed:
+		# A cached option may no longer exist on the site; re-read the list next run
+		invalidate_cached_cities(cache_file)
+
+	# Write merged İstanbul if any (sides in option order)
+	istanbul_rows = [r for i in sorted(istanbul_parts) for r in istanbul_parts[i]]
+	if istanbul_rows:
+		fp_ist = output_dir / "sahoil_ISTANBUL_prices.txt"
+		fp_ist.write_bytes(_render_city_file("ISTANBUL", _dedupe_districts(istanbul_rows)))
+		yield fp_ist
 
 
+def save_all_cities_prices_txt(output_dir: Path, url: str = SAHOIL_URL, debug: bool = False, min_delay: float = 0.6, max_delay: float = 1.2, workers: int = 4) -> List[Path]:
+	failed: List[str] = []
+	files = list(iter_all_cities_prices_txt(output_dir, url=url, debug=debug, workers=workers, failed_cities=failed))
+	return SavedFiles(files, failed)
@@ -1,12 +1,27 @@
 from pathlib import Path
-from typing import List
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from typing import Dict, List
+from playwright.sync_api import TimeoutError as PWTimeoutError
 import random
 import re
 from dataclasses import dataclass
 
+from common.browser import MEDIA_RESOURCE_TYPES, block_trackers
+from common.browser_pool import acquire_context
+from common.price_cache import SavedFiles
+from common.workers import iter_parallel_pages
+
 SHELL_URL = "https://www.shell.com.tr/suruculer/shell-yakitlari/akaryakit-pompa-satis-fiyatlari.html"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+_PRICES_FRAME_URL_RE = re.compile(r"turkiyeshell\.com/.+pompa", re.I)
+
 def _ensure_cookie_accepted(page) -> None:
 	try:
 		if page.locator("#onetrust-accept-btn-handler").is_visible():
@@ -22,7 +37,7 @@ def _find_prices_frame(page):
 	# Prefer frame by URL
 	target = page.wait_for_event("frameattached", timeout=5000)
 	for _ in range(8):
-		frame_by_url = page.frame(url=re.compile(r"turkiyeshell\.com/.+pompa", re.I))
+		frame_by_url = page.frame(url=_PRICES_FRAME_URL_RE)
 		if frame_by_url:
 			return frame_by_url
 		page.wait_for_timeout(300)
@@ -79,6 +94,33 @@ def _open_province_dropdown(scope) -> None:
 	except Exception:
 		pass
 
+# Find the list item in-page (exact text first, then case-insensitive substring like has_text) and click it.
+# Also hooks DevExpress EndCallback once (grid and its callback panel) and clears the ready flag, so the
+# grid wait can resolve on the server round-trip that this click starts.
+_CLICK_LIST_ITEM_JS = """(text) => {
+	if (!window.__fuelGridHooked && window.ASPxClientControl && ASPxClientControl.GetControlCollection) {
+		const coll = ASPxClientControl.GetControlCollection();
+		for (const name of ['cb_all_grdPrices', 'cb_all']) {
+			const c = coll.GetByName(name);
+			if (c && c.EndCallback && c.EndCallback.AddHandler) {
+				c.EndCallback.AddHandler(() => { window.__fuelGridReady = true; });
+				window.__fuelGridHooked = true;
+			}
+		}
+	}
+	window.__fuelGridReady = false;
+	const items = Array.from(document.querySelectorAll('td.dxeListBoxItem'));
+	const want = text.toUpperCase();
+	const it = items.find(e => (e.textContent || '').trim() === text)
+		|| items.find(e => (e.textContent || '').toUpperCase().includes(want));
+	if (!it) return false;
+	it.scrollIntoView({ block: 'nearest' });
+	for (const type of ['mousedown', 'mouseup', 'click']) {
+		it.dispatchEvent(new MouseEvent(type, { bubbles: true, cancelable: true, view: window }));
+	}
+	return true;
+}"""
+
 def _click_city_in_list(scope, city_name: str) -> None:
 	# Ensure dropdown is open, then click the list item by text
 	try:
@@ -86,23 +128,18 @@ def _click_city_in_list(scope, city_name: str) -> None:
 			_open_province_dropdown(scope)
 	except Exception:
 		_open_province_dropdown(scope)
-	# Prefer filter(has_text=...) for robustness
-	item = scope.locator('td.dxeListBoxItem').filter(has_text=city_name).first
-	try:
-		item.wait_for(state="visible", timeout=4000)
-	except Exception:
-		# Try to open via DevExpress and wait again
-		_open_dropdown_via_devexpress(scope)
-		try:
-			item.wait_for(state="visible", timeout=4000)
-		except Exception:
-			pass
 	try:
-		item.click()
+		clicked = scope.evaluate(_CLICK_LIST_ITEM_JS, city_name)
+		if not clicked:
+			# Try to open via DevExpress and look again
+			_open_dropdown_via_devexpress(scope)
+			clicked = scope.evaluate(_CLICK_LIST_ITEM_JS, city_name)
 	except Exception:
+		clicked = False
+	if not clicked:
 		# Fallback: select via DevExpress client-side API
 		try:
-			scope.evaluate("""(name, text) => {
+			scope.evaluate("""([name, text]) => {
 				try {
 					if (window.ASPxClientControl && ASPxClientControl.GetControlCollection) {
 						var c = ASPxClientControl.GetControlCollection().GetByName(name);
@@ -116,7 +153,7 @@ def _click_city_in_list(scope, city_name: str) -> None:
 						}
 					}
 				} catch (e) {}
-			}""", "cb_all_cb_province", city_name)
+			}""", ["cb_all_cb_province", city_name])
 		except Exception:
 			# Last attempt: type into input then press Enter
 			try:
@@ -138,137 +175,116 @@ class ShellPriceRow:
 	fuel_oil: str
 	autogas: str
 
+# Ready when the DevExpress callback has ended, or (no hook available) the first cell names the city
+_GRID_UPDATED_JS = """(city) => {
+	if (window.__fuelGridReady === true) return true;
+	const cell = document.querySelector('#cb_all_grdPrices_DXMainTable tr.dxgvDataRow td');
+	return !!cell && (cell.innerText || '').toUpperCase().includes(city.toUpperCase());
+}"""
+
+def _wait_grid_updated(scope, city_name: str, timeout_ms: int = 8000) -> None:
+	# Best-effort: returns as soon as the grid callback completes or the grid shows the selected city
+	try:
+		scope.wait_for_function(_GRID_UPDATED_JS, arg=city_name, timeout=timeout_ms)
+	except Exception:
+		pass
+
+_GRID_ROWS_JS = "rows => rows.map(r => Array.from(r.querySelectorAll('td')).map(td => (td.innerText || '').trim()))"
+
 def _extract_prices_from_scope(scope) -> List[ShellPriceRow]:
-	rows = scope.locator("#cb_all_grdPrices_DXMainTable tr.dxgvDataRow")
-	count = rows.count()
-	results: List[ShellPriceRow] = []
-	for i in range(count):
-		tds = rows.nth(i).locator("td")
-		# Expecting 8 columns as per headers
-		def cell(idx: int) -> str:
-			try:
-				return tds.nth(idx).inner_text().strip()
-			except Exception:
-				return "-"
-		results.append(
-			ShellPriceRow(
-				name=cell(0),
-				benzin_95=cell(1),
-				motorin=cell(2),
-				gazyagi=cell(3),
-				kalyak=cell(4),
-				fuel_oil_high=cell(5),
-				fuel_oil=cell(6),
-				autogas=cell(7),
-			)
-		)
-	return results
+	# Whole grid in one round-trip; missing cells (expecting 8 columns as per headers) become "-"
+	grid: List[List[str]] = scope.eval_on_selector_all("#cb_all_grdPrices_DXMainTable tr.dxgvDataRow", _GRID_ROWS_JS)
+	return [ShellPriceRow(*(cells[:8] + ["-"] * (8 - len(cells)))) for cells in grid]
 
 def _write_shell_prices_to_text(prices: List[ShellPriceRow], output_file: Path) -> None:
-	lines: List[str] = []
-	for p in prices:
-		lines.append(
-			f"{p.name} | K.Benzin 95 Oktan: {p.benzin_95} | Motorin: {p.motorin} | Gaz Yağı: {p.gazyagi} | "
-			f"Kalyak: {p.kalyak} | Yüksek Kükürtlü Fuel Oil: {p.fuel_oil_high} | Fuel Oil: {p.fuel_oil} | Otogaz: {p.autogas}"
-		)
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+	# One join, encoded once, written in a single call
+	output_file.write_bytes("\n".join(
+		f"{p.name} | K.Benzin 95 Oktan: {p.benzin_95} | Motorin: {p.motorin} | Gaz Yağı: {p.gazyagi} | "
+		f"Kalyak: {p.kalyak} | Yüksek Kükürtlü Fuel Oil: {p.fuel_oil_high} | Fuel Oil: {p.fuel_oil} | Otogaz: {p.autogas}"
+		for p in prices
+	).encode("utf-8"))
 
 def save_city_prices_txt(city_name: str, output_dir: Path, url: str = SHELL_URL, debug: bool = False) -> Path:
 	"""Open Shell prices page, select given city, extract price table, and write txt (no HTML)."""
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		_ensure_cookie_accepted(page)
-		scope = _find_prices_frame(page)
-		_open_province_dropdown(scope)
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
+		scope = _open_shell_scope(context, url)
 		try:
 			scope.wait_for_selector('td.dxeListBoxItem', timeout=8000)
 		except Exception:
 			pass
 		_click_city_in_list(scope, city_name)
-		# Wait first cell in grid to reflect selected city (best-effort)
-		try:
-			for _ in range(20):
-				first_cell = scope.locator("#cb_all_grdPrices_DXMainTable tr.dxgvDataRow td").first
-				if first_cell.count() > 0 and city_name.upper() in first_cell.inner_text().upper():
-					break
-				scope.wait_for_timeout(300)
-		except Exception:
-			pass
-		scope.wait_for_timeout(600)
+		_wait_grid_updated(scope, city_name)
 		prices = _extract_prices_from_scope(scope)
 		output_dir.mkdir(parents=True, exist_ok=True)
 		fp = output_dir / f"shell_{city_name}_prices.txt"
 		_write_shell_prices_to_text(prices, fp)
-		browser.close()
 		return fp
 
-def save_all_cities_prices_txt(output_dir: Path, url: str = SHELL_URL, debug: bool = False, min_delay: float = 0.6, max_delay: float = 1.4, retries: int = 1) -> List[Path]:
-	"""Open Shell prices page, iterate all cities, write per-city txt files to output_dir."""
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		page.goto(url, wait_until="domcontentloaded")
-		_ensure_cookie_accepted(page)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		scope = _find_prices_frame(page)
-		_open_province_dropdown(scope)
+def _open_shell_scope(context, url: str):
+	"""Open the prices page in a context and return the frame holding the province dropdown (opened)."""
+	page = context.new_page()
+	page.set_default_navigation_timeout(45000)
+	block_trackers(context, page)
+	page.goto(url, wait_until="domcontentloaded")
+	_ensure_cookie_accepted(page)
+	scope = _find_prices_frame(page)
+	_open_province_dropdown(scope)
+	return scope
+
+def _scrape_city(scope, name: str, output_dir: Path, min_delay: float, max_delay: float, retries: int) -> Path:
+	"""Select one province on a worker's frame (with retries), extract the grid and write the txt file."""
+	try:
+		for attempt in range(retries + 1):
+			try:
+				_open_province_dropdown(scope)
+				_click_city_in_list(scope, name)
+				_wait_grid_updated(scope, name)
+				prices = _extract_prices_from_scope(scope)
+				fp = output_dir / f"shell_{name}_prices.txt"
+				_write_shell_prices_to_text(prices, fp)
+				return fp
+			except PWTimeoutError:
+				if attempt >= retries:
+					raise
+				scope.wait_for_timeout(int(600 * (attempt + 1) * random.uniform(1.0, 1.4)))
+			except Exception:
+				if attempt >= retries:
+					raise
+				scope.wait_for_timeout(int(500 * (attempt + 1) * random.uniform(1.0, 1.3)))
+	finally:
+		scope.wait_for_timeout(int(1000 * random.uniform(min_delay, max_delay)))
+
+def save_all_cities_prices_txt(output_dir: Path, url: str = SHELL_URL, debug: bool = False, min_delay: float = 0.6, max_delay: float = 1.4, retries: int = 1, workers: int = 4) -> List[Path]:
+	"""
+	Open Shell prices page, iterate all cities, write per-city txt files to output_dir.
+	Cities are spread over `workers` parallel browser contexts (1 in debug mode).
+	"""
+	output_dir.mkdir(parents=True, exist_ok=True)
+	# City names are read once on a bootstrap page, then spread over the workers
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
+		scope = _open_shell_scope(context, url)
 		city_names: List[str] = scope.eval_on_selector_all(
 			'td.dxeListBoxItem',
 			'els => els.map(e => (e.textContent || "").trim()).filter(Boolean)'
 		)
-		for name in city_names:
-			for attempt in range(retries + 1):
-				try:
-					_open_province_dropdown(scope)
-					_click_city_in_list(scope, name)
-					# Wait grid reflects selected city
-					try:
-						for _ in range(20):
-							first_cell = scope.locator("#cb_all_grdPrices_DXMainTable tr.dxgvDataRow td").first
-							if first_cell.count() > 0 and name.upper() in first_cell.inner_text().upper():
-								break
-							scope.wait_for_timeout(300)
-					except Exception:
-						pass
-					scope.wait_for_timeout(600)
-					prices = _extract_prices_from_scope(scope)
-					fp = output_dir / f"shell_{name}_prices.txt"
-					_write_shell_prices_to_text(prices, fp)
-					saved.append(fp)
-					print(f"OK: {name} -> {fp.name}")
-					break
-				except PWTimeoutError:
-					if attempt < retries:
-						scope.wait_for_timeout(int(600 * (attempt + 1) * random.uniform(1.0, 1.4)))
-						continue
-					else:
-						print(f"Atlandı (timeout): {name}")
-				except Exception as e:
-					if attempt < retries:
-						scope.wait_for_timeout(int(500 * (attempt + 1) * random.uniform(1.0, 1.3)))
-						continue
-					else:
-						print(f"Hata/atlandı: {name} -> {e}")
-			scope.wait_for_timeout(int(1000 * random.uniform(min_delay, max_delay)))
-		browser.close()
-	return saved
-
+	saved: Dict[int, Path] = {}
+	failed: List[str] = []
+	for idx, name, result in iter_parallel_pages(
+		city_names,
+		work=lambda scope, name: _scrape_city(scope, name, output_dir, min_delay, max_delay, retries),
+		setup=lambda context: _open_shell_scope(context, url),
+		workers=1 if debug else workers,
+		debug=debug,
+		context_kwargs=_CONTEXT_KWARGS,
+		block_resources=MEDIA_RESOURCE_TYPES,
+	):
+		if isinstance(result, PWTimeoutError):
+			failed.append(name)
+			print(f"Atlandı (timeout): {name}")
+		elif isinstance(result, Exception):
+			failed.append(name)
+			print(f"Hata/atlandı: {name} -> {result}")
+		else:
+			print(f"OK: {name} -> {result.name}")
+			saved[idx] = result
+	return SavedFiles((saved[i] for i in sorted(saved)), failed)
@@ -1,25 +1,56 @@
 from pathlib import Path
-from typing import List, Dict, Set
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Set, Tuple
 import random
 import time
 import re
 
-from playwright.sync_api import sync_playwright, Page, TimeoutError as PWTimeoutError
+from playwright.sync_api import Page, TimeoutError as PWTimeoutError
+
+from common.browser import MEDIA_RESOURCE_TYPES, block_trackers, goto_ready
+from common.browser_pool import acquire_context
+from common.html_text import parse_tables
+from common.http_session import get_client
+from common.price_cache import SavedFiles
+from common.workers import iter_parallel_pages
 
 SUNPET_URL = "https://www.sunpettr.com.tr/yakit-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+
+# Turkish letters -> ASCII, separators -> "_" (single pass via str.translate)
+_TR_FILENAME_TABLE = str.maketrans({
+	"İ": "I",
+	"ı": "i",
+	"Ş": "S",
+	"ş": "s",
+	"Ğ": "G",
+	"ğ": "g",
+	"Ü": "U",
+	"ü": "u",
+	"Ö": "O",
+	"ö": "o",
+	"Ç": "C",
+	"ç": "c",
+	"-": "_",
+	" ": "_",
+})
+_FILENAME_STRIP_RE = re.compile(r"[^A-Z0-9_]")
+
+_SPACES_RE = re.compile(r"\s+")
+_PRICE_STRIP_RE = re.compile(r"[^\d,.]")
+
 
 def _normalize_city_name_for_filename(city_name: str) -> str:
 	"""Normalize city name for filenames (uppercase ASCII-ish)."""
-	replacements = {
-		"İ": "I", "ı": "i", "Ş": "S", "ş": "s", "Ğ": "G", "ğ": "g",
-		"Ü": "U", "ü": "u", "Ö": "O", "ö": "o", "Ç": "C", "ç": "c",
-		"-": "_", " ": "_",
-	}
-	n = city_name
-	for src, dst in replacements.items():
-		n = n.replace(src, dst)
-	return re.sub(r"[^A-Z0-9_]", "", n.upper())
+	return _FILENAME_STRIP_RE.sub("", city_name.translate(_TR_FILENAME_TABLE).upper())
 
 
 def _get_city_options(page: Page, debug: bool = False) -> List[Dict[str, str]]:
@@ -56,80 +87,117 @@ def _get_city_options(page: Page, debug: bool = False) -> List[Dict[str, str]]:
 	for opt_data in options_data:
 		text = opt_data['text'].strip()
 		value = opt_data['value'].strip()
-		city_key = re.sub(r"\s+", " ", text.upper()).strip()
+		city_key = _SPACES_RE.sub(" ", text.upper()).strip()
 		if city_key not in seen_cities:
 			seen_cities.add(city_key)
 			result.append({"value": value, "text": text})
 	return result
 
 
-def _extract_price_from_cell(cell) -> str:
-	"""Extract price from a table cell."""
-	try:
-		price_span = cell.locator("span b")
-		if price_span.count() > 0:
-			price_text = price_span.first.inner_text().strip()
-			return re.sub(r"[^\d,.]", "", price_text).replace(",", ".")
-	except Exception:
-		pass
-	return ""
+def _clean_price(price_text: str) -> str:
+	"""Keep the numeric part of a price cell, with a dot as decimal separator."""
+	return _PRICE_STRIP_RE.sub("", price_text or "").replace(",", ".")
+
+
+# District name plus the bold price of every cell, for all rows in one evaluate
+_TABLE_ROWS_JS = """rows => rows.map(r => Array.from(r.querySelectorAll('td')).map((td, i) => {
+	if (i === 0) return (td.innerText || '').trim();
+	const b = td.querySelector('span b');
+	return b ? (b.innerText || '').trim() : '';
+}))"""
+
+_PRICE_COLUMNS = ("benzin_95", "motorin", "gazyagi", "fuel_oil", "yuksek_kukurtlu_fuel_oil", "kalorifer_yakiti")
 
 
 def _extract_fuel_prices_from_table(page: Page, debug: bool = False) -> List[Dict[str, str]]:
 	"""Extract all fuel prices from the table for all districts."""
 	try:
 		page.wait_for_selector("table.primary-table", state="visible", timeout=15000)
-		page.wait_for_timeout(1000)
 	except PWTimeoutError:
 		return []
+	try:
+		page.wait_for_function("() => document.querySelectorAll('table.primary-table tbody tr').length > 0", timeout=5000)
+	except Exception:
+		pass
 
 	results: List[Dict[str, str]] = []
 	try:
-		rows = page.locator("table.primary-table tbody tr")
-		for i in range(rows.count()):
-			row = rows.nth(i)
-			district = (row.locator("td").first.inner_text() or "").strip()
-			if not district:
-				continue
-			cells = row.locator("td")
-			if cells.count() < 8:
-				continue
-			results.append({
-				"district": district,
-				"benzin_95": _extract_price_from_cell(cells.nth(2)),
-				"motorin": _extract_price_from_cell(cells.nth(3)),
-				"gazyagi": _extract_price_from_cell(cells.nth(4)),
-				"fuel_oil": _extract_price_from_cell(cells.nth(5)),
-				"yuksek_kukurtlu_fuel_oil": _extract_price_from_cell(cells.nth(6)),
-				"kalorifer_yakiti": _extract_price_from_cell(cells.nth(7)),
-			})
+		results = _rows_from_cells(page.eval_on_selector_all("table.primary-table tbody tr", _TABLE_ROWS_JS))
 	except Exception as e:
 		if debug:
 			print(f"  Debug: Error extracting prices: {e}")
 	return results
 
 
-def _write_sunpet_prices_to_text(city_name: str, prices: List[Dict[str, str]], output_file: Path, append: bool = False) -> None:
+def _rows_from_cells(rows: List[List[str]]) -> List[Dict[str, str]]:
+	results: List[Dict[str, str]] = []
+	for cells in rows:
+		if len(cells) < 8 or not cells[0]:
+			continue
+		row = {"district": cells[0]}
+		# Price columns start at the third cell
+		row.update((key, _clean_price(text)) for key, text in zip(_PRICE_COLUMNS, cells[2:8]))
+		results.append(row)
+	return results
+
+
+def _fetch_city_http(city_url: str) -> List[Dict[str, str]]:
+	"""Read a city's price table from the server HTML; [] on any failure so the browser can retry it."""
+	try:
+		resp = get_client().get(city_url, headers={"Accept": "text/html,application/xhtml+xml"})
+	except Exception:
+		return []
+	if not resp.ok:
+		return []
+	table = next((t for t in parse_tables(resp.text()) if "primary-table" in (t["attrs"].get("class") or "").split()), None)
+	if table is None:
+		return []
+	# Same cells as _TABLE_ROWS_JS: the district text, then only each cell's <span><b> price
+	return _rows_from_cells([cells[:1] + bold[1:] for cells, bold in zip(table["rows"], table["bold"])])
+
+
+def _iter_cities_http(cities: List[Dict[str, str]], workers: int) -> Iterator[Tuple[int, List[Dict[str, str]]]]:
+	"""Yield `(index, prices)` for the cities readable without a browser.
+
+	The first city is a probe: if its page has no static table, nothing else is requested.
+	"""
+	if not cities:
+		return
+	first = _fetch_city_http(cities[0]["value"])
+	if not first:
+		return
+	yield 0, first
+	with ThreadPoolExecutor(max_workers=workers) as ex:
+		for idx, prices in enumerate(ex.map(lambda c: _fetch_city_http(c["value"]), cities[1:]), 1):
+			if prices:
+				yield idx, prices
+
+
+_PRICE_LABEL_PREFIXES = tuple(f"{label}: " for label in ("Kurşunsuz Benzin 95", "Motorin", "Gazyağı", "Fuel Oil", "Yuksek Kukurtlu Fuel Oil", "Kalorifer Yakıtı"))
+
+
+def _render_district(price_data: Dict[str, str]) -> str:
+	parts = ", ".join(prefix + price_data[ft] for prefix, ft in zip(_PRICE_LABEL_PREFIXES, _PRICE_COLUMNS) if price_data.get(ft))
+	return f"{price_data['district']}: {parts}" if parts else ""
+
+
+def _write_sunpet_prices_to_text(city_name: str, prices: List[Dict[str, str]], output_file: Path) -> None:
 	"""Write fuel prices to txt file in format: DISTRICT: PRICE_TYPE: PRICE."""
 	if not prices:
 		return
 
-	fuel_types = ["benzin_95", "motorin", "gazyagi", "fuel_oil", "yuksek_kukurtlu_fuel_oil", "kalorifer_yakiti"]
-	fuel_labels = ["Kurşunsuz Benzin 95", "Motorin", "Gazyağı", "Fuel Oil", "Yuksek Kukurtlu Fuel Oil", "Kalorifer Yakıtı"]
-	
-	lines = []
-	for price_data in prices:
-		parts = [f"{fuel_labels[i]}: {price_data[ft]}" for i, ft in enumerate(fuel_types) if price_data.get(ft)]
-		if parts:
-			lines.append(f"{price_data['district']}: {', '.join(parts)}")
+	content = "\n".join(line for line in map(_render_district, prices) if line)
+	if content:
+		output_file.write_bytes(content.encode("utf-8"))
+
 
-	if lines:
-		content = "\n".join(lines)
-		if append and output_file.exists():
-			existing = output_file.read_text(encoding="utf-8").strip()
-			output_file.write_text(f"{existing}\n{content}" if existing else content, encoding="utf-8")
-		else:
-			output_file.write_text(content, encoding="utf-8")
+def _accept_cookies(page: Page, visible_timeout: int = 3000, click_timeout: int = 2000) -> None:
+	try:
+		page.wait_for_selector("#cookieModal", state="visible", timeout=visible_timeout)
+		page.click("#cookieModal button.btn-apply-all", timeout=click_timeout)
+		page.wait_for_selector("#cookieModal", state="hidden", timeout=2000)
+	except Exception:
+		pass
 
 
 def _select_city_and_get_prices(page: Page, city_value: str, city_text: str, debug: bool = False) -> List[Dict[str, str]]:
@@ -137,18 +205,8 @@ def _select_city_and_get_prices(page: Page, city_value: str, city_text: str, deb
 	try:
 		if not city_value.startswith("http"):
 			return []
-		page.goto(city_value, wait_until="domcontentloaded")
-		page.wait_for_timeout(2000)
-		try:
-			page.wait_for_load_state("networkidle", timeout=10000)
-		except Exception:
-			page.wait_for_timeout(2000)
-		try:
-			page.wait_for_selector("#cookieModal", state="visible", timeout=2000)
-			page.click("#cookieModal button.btn-apply-all", timeout=1000)
-			page.wait_for_timeout(500)
-		except Exception:
-			pass
+		goto_ready(page, city_value, ready_selector="table.primary-table tbody tr", timeout_ms=10000)
+		_accept_cookies(page, visible_timeout=2000, click_timeout=1000)
 		return _extract_fuel_prices_from_table(page, debug=debug)
 	except Exception as e:
 		if debug:
@@ -156,45 +214,45 @@ def _select_city_and_get_prices(page: Page, city_value: str, city_text: str, deb
 		return []
 
 
+def _new_sunpet_page(context) -> Page:
+	page = context.new_page()
+	page.set_default_navigation_timeout(45000)
+	block_trackers(context, page)
+	return page
+
+
+def _scrape_city(page: Page, city: Dict[str, str], min_delay: float, max_delay: float, debug: bool = False) -> List[Dict[str, str]]:
+	"""Load one city's URL on a worker's page and return its district prices."""
+	try:
+		return _select_city_and_get_prices(page, city["value"], city["text"].strip(), debug=debug)
+	finally:
+		time.sleep(random.uniform(min_delay, max_delay))
+
+
 def save_all_cities_prices_txt(
 	output_dir: Path,
 	url: str = SUNPET_URL,
 	debug: bool = False,
 	min_delay: float = 0.8,
 	max_delay: float = 1.6,
+	workers: int = 4,
 ) -> List[Path]:
 	"""
 	Tüm şehirler için Sunpet akaryakıt fiyatlarını çekip txt dosyalarına yazar.
 	Çıktılar: sunpet/sunpet_<ŞEHİR>_prices.txt
 	İstanbul (Anadolu ve Avrupa) birleştirilir: sunpet_ISTANBUL_prices.txt
+	Şehir sayfaları önce HTTP ile okunur; okunamayanlar `workers` adet paralel tarayıcı
+	context'ine dağıtılır (debug modunda 1).
 	"""
 	output_dir.mkdir(parents=True, exist_ok=True)
-	saved_files: List[Path] = []
-
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-
-		page.goto(url, wait_until="domcontentloaded")
-		try:
-			page.wait_for_load_state("networkidle", timeout=8000)
-		except Exception:
-			pass
-
-		try:
-			page.wait_for_selector("#cookieModal", state="visible", timeout=3000)
-			page.click("#cookieModal button.btn-apply-all", timeout=2000)
-			page.wait_for_timeout(500)
-		except Exception:
-			pass
+
+	# City options are read once on a bootstrap page, then spread over the workers
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
+		page = _new_sunpet_page(context)
+		# The city list is ready once Choices.js has rendered its items
+		goto_ready(page, url, ready_selector=".choices__item[data-value^='http']")
+
+		_accept_cookies(page)
 
 		print("Sunpet: Şehirler listeleniyor...")
 		cities = _get_city_options(page, debug=debug)
@@ -203,45 +261,58 @@ def save_all_cities_prices_txt(
 		if not cities:
 			if debug:
 				page.screenshot(path=str(output_dir / "debug_dropdown.png"))
-			browser.close()
-			return saved_files
+			return []
 
+	saved: Dict[int, Path] = {}
+	istanbul_parts: Dict[int, List[Dict[str, str]]] = {}
+	done = set()
+	failed: List[str] = []
+
+	def _write(idx: int, prices: List[Dict[str, str]]) -> None:
+		done.add(idx)
+		text = cities[idx]["text"].strip()
+		# Check if this is Istanbul (Anadolu or Avrupa) - combine into single file
+		# Normalize Turkish characters for comparison
+		normalized = text.upper().replace("İ", "I").replace("ı", "I")
+		if "ISTANBUL" in normalized:
+			istanbul_parts[idx] = prices
+			print(f"[{idx + 1}/{len(cities)}] {text}: {len(prices)} ilçe (Istanbul birleştirilecek)")
+			return
+
+		norm = _normalize_city_name_for_filename(text)
+		fp = output_dir / f"sunpet_{norm}_prices.txt"
+		_write_sunpet_prices_to_text(text, prices, fp)
+		saved[idx] = fp
+		print(f"[{idx + 1}/{len(cities)}] {text}: {len(prices)} ilçe ✓ Kaydedildi: {fp.name}")
+
+	# City pages are server-rendered: read them over HTTP and keep the browser for the rest
+	if not debug:
+		for idx, prices in _iter_cities_http(cities, workers):
+			_write(idx, prices)
+		print(f"Sunpet: {len(done)}/{len(cities)} şehir HTTP ile alındı.")
+
+	for _, idx, prices in iter_parallel_pages(
+		[i for i in range(len(cities)) if i not in done],
+		work=lambda page, i: _scrape_city(page, cities[i], min_delay, max_delay, debug=debug),
+		setup=_new_sunpet_page,
+		workers=1 if debug else workers,
+		debug=debug,
+		context_kwargs=_CONTEXT_KWARGS,
+		block_resources=MEDIA_RESOURCE_TYPES,
+	):
+		if isinstance(prices, Exception) or not prices:
+			failed.append(cities[idx]["text"].strip())
+			print(f"[{idx + 1}/{len(cities)}] ⚠ Fiyat alınamadı: {cities[idx]['text'].strip()}")
+			continue
+		_write(idx, prices)
+
+	# İstanbul sides are written in option order, whichever worker finished first
+	if istanbul_parts:
 		istanbul_output = output_dir / "sunpet_ISTANBUL_prices.txt"
-		istanbul_first = True
-
-		for idx, city in enumerate(cities, 1):
-			value = city["value"]
-			text = city["text"].strip()
-			print(f"\n[{idx}/{len(cities)}] Şehir: {text}")
-
-			prices = _select_city_and_get_prices(page, value, text, debug=debug)
-			if not prices:
-				print(f"  ⚠ Fiyat alınamadı: {text}")
-				continue
-
-			print(f"  {len(prices)} ilçe için fiyat bulundu")
-
-			# Check if this is Istanbul (Anadolu or Avrupa) - combine into single file
-			# Normalize Turkish characters for comparison
-			normalized = text.upper().replace("İ", "I").replace("ı", "I")
-			is_istanbul = "ISTANBUL" in normalized
-			
-			if is_istanbul:
-				_write_sunpet_prices_to_text(text, prices, istanbul_output, append=not istanbul_first)
-				if istanbul_first:
-					saved_files.append(istanbul_output)
-					istanbul_first = False
-				print(f"  ✓ Kaydedildi: {istanbul_output.name} (Istanbul birleştirildi)")
-			else:
-				norm = _normalize_city_name_for_filename(text)
-				fp = output_dir / f"sunpet_{norm}_prices.txt"
-				_write_sunpet_prices_to_text(text, prices, fp)
-				saved_files.append(fp)
-				print(f"  ✓ Kaydedildi: {fp.name}")
-
-			time.sleep(random.uniform(min_delay, max_delay))
-
-		browser.close()
+		_write_sunpet_prices_to_text("İstanbul", [p for i in sorted(istanbul_parts) for p in istanbul_parts[i]], istanbul_output)
+		saved[min(istanbul_parts)] = istanbul_output
+		print(f"  ✓ Kaydedildi: {istanbul_output.name} (Istanbul birleştirildi)")
 
+	saved_files = SavedFiles((saved[i] for i in sorted(saved)), failed)
 	print(f"\nToplam {len(saved_files)} dosya yazıldı -> {output_dir}")
 	return saved_files
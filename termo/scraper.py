@@ -1,20 +1,52 @@
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from operator import attrgetter
+from playwright.sync_api import TimeoutError as PWTimeoutError
 import re
 import time
 import random
 
+from common.browser import MEDIA_RESOURCE_TYPES, block_trackers
+from common.browser_pool import acquire_context
+from common.price_cache import SavedFiles
+from common.workers import iter_parallel_pages
+
 TERMO_URL = "https://termopet.com.tr/tr-tr/pompa-fiyatlari"
 
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
+
+# Turkish letters -> ASCII, separators -> "_" (single pass via str.translate)
+_TR_FILENAME_TABLE = str.maketrans({
+	"İ": "I",
+	"ı": "i",
+	"Ş": "S",
+	"ş": "s",
+	"Ğ": "G",
+	"ğ": "g",
+	"Ü": "U",
+	"ü": "u",
+	"Ö": "O",
+	"ö": "o",
+	"Ç": "C",
+	"ç": "c",
+	"-": "_",
+	" ": "_",
+})
+_FILENAME_STRIP_RE = re.compile(r"[^A-Z0-9_]")
+
+_PRICE_RE = re.compile(r"(\d+[.,]\d+)")
+
 
 def _normalize_city_name(city_name: str) -> str:
-	replacements = {"İ": "I", "ı": "i", "Ş": "S", "ş": "s", "Ğ": "G", "ğ": "g", "Ü": "U", "ü": "u", "Ö": "O", "ö": "o", "Ç": "C", "ç": "c", "-": "_", " ": "_"}
-	n = city_name
-	for src, dst in replacements.items():
-		n = n.replace(src, dst)
-	return re.sub(r"[^A-Z0-9_]", "", n.upper())
+	return _FILENAME_STRIP_RE.sub("", city_name.translate(_TR_FILENAME_TABLE).upper())
 
 
 @dataclass
@@ -30,26 +62,36 @@ class TermoPriceRow:
 
 
 def _extract_price(text: str) -> str:
-	match = re.search(r"(\d+[.,]\d+)", (text or "").strip())
+	match = _PRICE_RE.search(text or "")
 	return match.group(1).replace(",", ".") if match else ""
 
 
-def _select_city_select2(page, city_value: str):
+_CITY_SELECT = 'select[name="city"]'
+_DISTRICT_SELECT = 'select[name="district"]'
+
+# Fallback for select_option: set the value and let Select2 (or a plain change listener) react
+_SELECT2_SET_VALUE_JS = """(el, val) => {
+	el.value = val;
+	if (window.$ && window.$(el).data('select2')) {
+		window.$(el).val(val).trigger('change');
+	} else {
+		el.dispatchEvent(new Event('change', { bubbles: true }));
+	}
+}"""
+
+
+def _form_selects(page):
+	"""Resolve the city and district select locators once; they stay valid across Select2 updates."""
+	return page.locator(_CITY_SELECT).first, page.locator(_DISTRICT_SELECT).first
+
+
+def _select_city_select2(page, city_select, city_value: str):
 	# Select2: try native select_option first, then use JS to trigger Select2
-	city_select = page.locator('select[name="city"]').first
 	try:
 		city_select.select_option(city_value)
 	except Exception:
 		# Fallback: use JS to set value and trigger Select2
-		city_select.evaluate("""(el, val) => {
-			el.value = val;
-			if (window.$ && window.$(el).data('select2')) {
-				window.$(el).val(val).trigger('change');
-			} else {
-				el.dispatchEvent(new Event('change', { bubbles: true }));
-			}
-		}""", city_value)
-	page.wait_for_timeout(2000)
+		city_select.evaluate(_SELECT2_SET_VALUE_JS, city_value)
 	# Wait for district dropdown to be populated (has more than just "Seçiniz: İlçe")
 	try:
 		page.wait_for_function("""() => {
@@ -62,36 +104,52 @@ def _select_city_select2(page, city_value: str):
 		page.wait_for_timeout(3000)
 
 
-def _get_district_options(page) -> List[dict]:
-	district_select = page.locator('select[name="district"]').first
+def _get_district_options(district_select) -> List[dict]:
 	options = district_select.evaluate("""s => Array.from(s.options).filter(o => o.value && o.value !== '').map(o => ({ value: o.value, text: o.textContent?.trim() }))""")
 	return options if options else []
 
 
-def _select_district_select2(page, district_value: str):
-	district_select = page.locator('select[name="district"]').first
+def _select_district_select2(page, district_select, district_value: str):
 	try:
 		district_select.select_option(district_value)
 	except Exception:
 		# Fallback: use JS to set value and trigger Select2
-		district_select.evaluate("""(el, val) => {
-			el.value = val;
-			if (window.$ && window.$(el).data('select2')) {
-				window.$(el).val(val).trigger('change');
-			} else {
-				el.dispatchEvent(new Event('change', { bubbles: true }));
-			}
-		}""", district_value)
-	page.wait_for_timeout(800)
+		district_select.evaluate(_SELECT2_SET_VALUE_JS, district_value)
+	try:
+		page.wait_for_function("""(val) => {
+			const select = document.querySelector('select[name="district"]');
+			return !!select && select.value === val;
+		}""", arg=district_value, timeout=3000)
+	except Exception:
+		pass
+
+
+# Tags the previous district's row as stale and reports the selected city, in one round-trip
+_PREPARE_DISTRICT_JS = """() => {
+	document.querySelectorAll('#pricesTable tbody#dataRows tr').forEach(r => r.setAttribute('data-stale', ''));
+	const city = document.querySelector('select[name="city"]');
+	return city ? city.value : '';
+}"""
+
+_RESULT_READY_JS = """() => {
+	const row = document.querySelector('#pricesTable tbody#dataRows tr');
+	return !!row && !row.hasAttribute('data-stale') && row.querySelectorAll('td').length >= 7;
+}"""
+
+
+def _prepare_district(page) -> str:
+	"""Call before each district: the ready check then only accepts the row rendered for the next submit.
+
+	Returns the city select's current value so callers can resync it (form submission might reset it).
+	"""
+	return page.evaluate(_PREPARE_DISTRICT_JS)
 
 
 def _click_submit_button(page):
 	submit_btn = page.locator('button.btn-submit-form').first
 	submit_btn.click()
-	page.wait_for_timeout(1500)
 	try:
-		page.wait_for_selector('#pricesTable tbody#dataRows tr', state="visible", timeout=15000)
-		page.wait_for_load_state("networkidle", timeout=10000)
+		page.wait_for_function(_RESULT_READY_JS, timeout=15000)
 	except Exception:
 		page.wait_for_timeout(2000)
 
@@ -99,20 +157,18 @@ def _click_submit_button(page):
 def _extract_prices_from_table(page) -> TermoPriceRow:
 	try:
 		page.wait_for_selector('#pricesTable tbody#dataRows tr', state="visible", timeout=10000)
-		page.wait_for_timeout(800)
 	except PWTimeoutError:
 		return None
 	
 	try:
-		row = page.locator('#pricesTable tbody#dataRows tr').first
-		if row.count() == 0:
-			return None
-		cells = row.locator('td')
-		if cells.count() < 7:
+		# First result row's cells in one round-trip (null when there is no row)
+		texts = page.evaluate("""() => {
+			const row = document.querySelector('#pricesTable tbody#dataRows tr');
+			return row ? Array.from(row.querySelectorAll('td')).map(td => (td.innerText || '').trim()) : null;
+		}""")
+		if not texts or len(texts) < 7:
 			return None
-		
-		cell_text = lambda i: (cells.nth(i).inner_text() or "").strip()
-		prices = [_extract_price(cell_text(i)) for i in range(7)]
+		prices = [_extract_price(t) for t in texts[:7]]
 		
 		# District name will be set by caller from the selected option
 		return TermoPriceRow(
@@ -129,178 +185,241 @@ def _extract_prices_from_table(page) -> TermoPriceRow:
 		return None
 
 
+# Output label per price field, in file order (prefixes built once)
+_PRICE_FIELDS = ("benzin_95", "motorin", "motorin_xtr", "gazyagi", "fuel_oil3", "kalorifer_yakiti", "lpg")
+_PRICE_LABEL_PREFIXES = tuple(f"{label}: " for label in ("K. Benzin (95 Oktan)", "Motorin", "Motorin XTR", "Gazyağı", "Fuel Oil3", "Kalorifer Yakıtı", "LPG"))
+_price_values = attrgetter(*_PRICE_FIELDS)
+
+
+def _render_row(p: TermoPriceRow) -> str:
+	parts = ", ".join(prefix + price for prefix, price in zip(_PRICE_LABEL_PREFIXES, _price_values(p)) if price)
+	return f"{p.district}: {parts}" if parts else ""
+
+
 def _write_file(city_name: str, prices: List[TermoPriceRow], output_file: Path) -> None:
 	if not prices:
 		return
-	labels = ["K. Benzin (95 Oktan)", "Motorin", "Motorin XTR", "Gazyağı", "Fuel Oil3", "Kalorifer Yakıtı", "LPG"]
-	lines = []
-	for p in prices:
-		parts = [f"{labels[i]}: {price}" for i, price in enumerate([p.benzin_95, p.motorin, p.motorin_xtr, p.gazyagi, p.fuel_oil3, p.kalorifer_yakiti, p.lpg]) if price]
-		if parts:
-			lines.append(f"{p.district}: {', '.join(parts)}")
-	if lines:
-		output_file.write_text("\n".join(lines), encoding="utf-8")
-
-
-def _init_page(browser, url: str):
-	context = browser.new_context(
-		user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-		locale="tr-TR",
-		timezone_id="Europe/Istanbul",
-		viewport={"width": 1280, "height": 900},
-		ignore_https_errors=True,
-	)
-	page = context.new_page()
-	page.set_default_navigation_timeout(45000)
+	content = "\n".join(line for line in map(_render_row, prices) if line)
+	if content:
+		output_file.write_bytes(content.encode("utf-8"))
+
+
+def _load_termo_page(page, url: str) -> None:
 	page.goto(url, wait_until="domcontentloaded")
+	# Wait for the city select to be filled and the page scripts (Select2) to have run
 	try:
-		page.wait_for_load_state("networkidle", timeout=8000)
+		page.wait_for_function("""() => {
+			const select = document.querySelector('select[name="city"]');
+			return !!select && select.options.length > 1 && document.readyState === 'complete';
+		}""", timeout=8000)
 	except Exception:
 		pass
-	page.wait_for_timeout(2000)  # Wait for Select2 to initialize
+
+
+def _open_termo_page(context, url: str):
+	page = context.new_page()
+	page.set_default_navigation_timeout(45000)
+	block_trackers(context, page)
+	_load_termo_page(page, url)
 	return page
 
 
-def save_city_prices_txt(city_name: str, output_dir: Path, url: str = TERMO_URL, debug: bool = False) -> Path:
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		page = _init_page(browser, url)
+_RESET_FORM_JS = """() => {
+	const city = document.querySelector('select[name="city"]');
+	const district = document.querySelector('select[name="district"]');
+	if (!city || !district) return false;
+	for (const el of [district, city]) {
+		if (window.$ && window.$(el).data('select2')) {
+			window.$(el).val('').trigger('change');
+		} else {
+			el.value = '';
+			el.dispatchEvent(new Event('change', { bubbles: true }));
+		}
+	}
+	// Drop the previous city's districts and result rows so the next waits see fresh ones
+	for (const o of Array.from(district.options)) if (o.value) o.remove();
+	document.querySelectorAll('#pricesTable tbody#dataRows tr').forEach(r => r.remove());
+	return true;
+}"""
+
+
+def _reset_termo_page(page, url: str) -> None:
+	"""Clear the city/district form in place; reload the page only if that fails."""
+	try:
+		if page.evaluate(_RESET_FORM_JS):
+			return
+	except Exception:
+		pass
+	_load_termo_page(page, url)
+
+
+_CITY_OPTIONS_JS = """s => Array.from(s.options).map(o => ({ value: o.value, text: (o.textContent||'').trim() })).filter(o => o.value && o.value !== '')"""
+
+
+def _scrape_district(page, city_select, district_select, city_value: str, dist_value: str) -> Optional[TermoPriceRow]:
+	"""Submit one district of the selected city and read its price row."""
+	# Verify/reselect city if needed (form submission might reset it)
+	if _prepare_district(page) != city_value:
+		_select_city_select2(page, city_select, city_value)
+	_select_district_select2(page, district_select, dist_value)
+	_click_submit_button(page)
+	return _extract_prices_from_table(page)
+
+
+def _open_termo_city(context, url: str, city_value: str):
+	"""Worker setup for one city's districts: load the page and select the city once."""
+	page = _open_termo_page(context, url)
+	city_select, district_select = _form_selects(page)
+	_select_city_select2(page, city_select, city_value)
+	return page, city_select, district_select
+
+
+def save_city_prices_txt(city_name: str, output_dir: Path, url: str = TERMO_URL, debug: bool = False, workers: int = 4) -> Path:
+	"""The city's districts are spread over `workers` parallel browser contexts (1 in debug mode)."""
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
+		page = _open_termo_page(context, url)
 		
 		# Get city options
-		city_select = page.locator('select[name="city"]')
+		city_select, district_select = _form_selects(page)
 		if city_select.count() == 0:
 			raise RuntimeError("Şehir seçimi için select bulunamadı.")
-		options = city_select.first.evaluate("""s => Array.from(s.options).map(o => ({ value: o.value, text: (o.textContent||'').trim() })).filter(o => o.value && o.value !== '')""")
+		options = city_select.evaluate(_CITY_OPTIONS_JS)
 		target = next((o for o in options if city_name.upper() in (o.get("text") or "").strip().upper() or (o.get("text") or "").strip().upper() == city_name.upper()), None)
 		if not target:
 			raise RuntimeError(f"Şehir bulunamadı: {city_name}")
 		
 		# Select city
-		_select_city_select2(page, target["value"])
+		_select_city_select2(page, city_select, target["value"])
 		
 		# Get all districts for this city
-		district_options = _get_district_options(page)
+		district_options = _get_district_options(district_select)
 		if not district_options:
 			raise RuntimeError(f"İlçe seçenekleri bulunamadı: {city_name}")
-		
-		# Collect prices for all districts
-		all_prices: List[TermoPriceRow] = []
-		for dist_opt in district_options:
-			dist_value, dist_text = dist_opt.get("value", ""), (dist_opt.get("text") or "").strip()
-			if not dist_value or not dist_text:
-				continue
-			try:
-				_select_district_select2(page, dist_value)
-				_click_submit_button(page)
-				price_row = _extract_prices_from_table(page)
-				if price_row:
-					price_row.district = dist_text  # Use district text from option
-					all_prices.append(price_row)
-			except Exception as e:
+	
+	# Districts are independent form submits: each worker selects the city once, then takes districts
+	district_options = [d for d in district_options if d.get("value") and (d.get("text") or "").strip()]
+	rows: Dict[int, TermoPriceRow] = {}
+	for idx, dist_opt, price_row in iter_parallel_pages(
+		district_options,
+		work=lambda session, d: _scrape_district(*session, target["value"], d["value"]),
+		setup=lambda context: _open_termo_city(context, url, target["value"]),
+		workers=1 if debug else workers,
+		debug=debug,
+		context_kwargs=_CONTEXT_KWARGS,
+		block_resources=MEDIA_RESOURCE_TYPES,
+	):
+		dist_text = dist_opt["text"].strip()
+		if isinstance(price_row, Exception):
+			if debug:
+				print(f"  ⚠ İlçe hatası {dist_text}: {price_row}")
+			continue
+		if price_row:
+			price_row.district = dist_text  # Use district text from option
+			rows[idx] = price_row
+	all_prices = [rows[i] for i in sorted(rows)]
+	
+	if not all_prices:
+		raise RuntimeError(f"Fiyat verisi alınamadı: {city_name}")
+	
+	output_dir.mkdir(parents=True, exist_ok=True)
+	output_file = output_dir / f"termo_{_normalize_city_name(target['text'])}_prices.txt"
+	_write_file(target["text"], all_prices, output_file)
+	return output_file
+
+
+def _scrape_city(page, url: str, opt: Dict[str, str], min_delay: float, max_delay: float, debug: bool = False) -> Tuple[str, Optional[List[TermoPriceRow]]]:
+	"""Collect one city's district prices on a worker's page; None when the city has no districts."""
+	city_value, city_text = opt.get("value", "").strip(), (opt.get("text") or "").strip()
+	# The worker's page stays loaded; only the form is cleared between cities
+	_reset_termo_page(page, url)
+	city_select, district_select = _form_selects(page)
+
+	# Select city
+	_select_city_select2(page, city_select, city_value)
+
+	# Get all districts for this city
+	district_options = _get_district_options(district_select)
+	if not district_options:
+		return city_text, None
+
+	# Collect prices for all districts
+	all_prices: List[TermoPriceRow] = []
+	for dist_idx, dist_opt in enumerate(district_options, 1):
+		dist_value, dist_text = dist_opt.get("value", ""), (dist_opt.get("text") or "").strip()
+		if not dist_value or not dist_text:
+			continue
+		try:
+			if debug:
+				print(f"    [{dist_idx}/{len(district_options)}] İlçe: {dist_text}")
+
+			price_row = _scrape_district(page, city_select, district_select, city_value, dist_value)
+			if price_row:
+				price_row.district = dist_text
+				all_prices.append(price_row)
 				if debug:
-					print(f"  ⚠ İlçe hatası {dist_text}: {e}")
-				continue
-		
-		if not all_prices:
-			raise RuntimeError(f"Fiyat verisi alınamadı: {city_name}")
-		
-		output_dir.mkdir(parents=True, exist_ok=True)
-		output_file = output_dir / f"termo_{_normalize_city_name(target['text'])}_prices.txt"
-		_write_file(target["text"], all_prices, output_file)
-		browser.close()
-		return output_file
+					print(f"      ✓ Fiyat alındı: {dist_text}")
+			time.sleep(random.uniform(0.5, 1.0))
+		except Exception as e:
+			if debug:
+				print(f"      ⚠ İlçe hatası {dist_text}: {e}")
+				import traceback
+				traceback.print_exc()
+			continue
+	if all_prices:
+		time.sleep(random.uniform(min_delay, max_delay))
+	return city_text, all_prices
 
 
-def save_all_cities_prices_txt(output_dir: Path, url: str = TERMO_URL, debug: bool = False, min_delay: float = 1.0, max_delay: float = 2.0) -> List[Path]:
+def save_all_cities_prices_txt(output_dir: Path, url: str = TERMO_URL, debug: bool = False, min_delay: float = 1.0, max_delay: float = 2.0, workers: int = 4) -> List[Path]:
+	"""Cities are spread over `workers` parallel browser contexts (1 in debug mode); files are written as cities finish."""
 	output_dir.mkdir(parents=True, exist_ok=True)
-	saved_files = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		page = _init_page(browser, url)
-		
+	# City options are read once on a bootstrap page, then spread over the workers
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
+		page = _open_termo_page(context, url)
+
 		# Get all city options
-		city_select = page.locator('select[name="city"]')
+		city_select = page.locator(_CITY_SELECT).first
 		if city_select.count() == 0:
 			if debug:
 				page.screenshot(path=str(output_dir / "debug_no_select.png"))
-			browser.close()
-			return saved_files
-		
-		options = city_select.first.evaluate("""s => Array.from(s.options).map(o => ({ value: o.value, text: (o.textContent||'').trim() })).filter(o => o.value && o.value !== '')""")
-		print(f"Termo: {len(options)} şehir bulundu.")
-		
-		for idx, opt in enumerate(options, 1):
-			city_value, city_text = opt.get("value", "").strip(), (opt.get("text") or "").strip()
-			if not city_value or not city_text:
-				continue
-			print(f"\n[{idx}/{len(options)}] Şehir: {city_text}")
-			try:
-				# Reload page for each city to ensure clean state
-				page.goto(url, wait_until="domcontentloaded")
-				try:
-					page.wait_for_load_state("networkidle", timeout=8000)
-				except Exception:
-					pass
-				page.wait_for_timeout(2000)
-				
-				# Select city
-				_select_city_select2(page, city_value)
-				
-				# Get all districts for this city
-				district_options = _get_district_options(page)
-				if not district_options:
-					print(f"  ⚠ İlçe seçenekleri bulunamadı: {city_text}")
-					continue
-				
-				print(f"  {len(district_options)} ilçe bulundu")
-				
-				# Collect prices for all districts
-				all_prices: List[TermoPriceRow] = []
-				for dist_idx, dist_opt in enumerate(district_options, 1):
-					dist_value, dist_text = dist_opt.get("value", ""), (dist_opt.get("text") or "").strip()
-					if not dist_value or not dist_text:
-						continue
-					try:
-						if debug:
-							print(f"    [{dist_idx}/{len(district_options)}] İlçe: {dist_text}")
-						
-						# Verify/reselect city if needed (form submission might reset it)
-						current_city = page.locator('select[name="city"]').first.evaluate("el => el.value")
-						if current_city != city_value:
-							_select_city_select2(page, city_value)
-						
-						_select_district_select2(page, dist_value)
-						_click_submit_button(page)
-						price_row = _extract_prices_from_table(page)
-						if price_row:
-							price_row.district = dist_text
-							all_prices.append(price_row)
-							if debug:
-								print(f"      ✓ Fiyat alındı: {dist_text}")
-						time.sleep(random.uniform(0.5, 1.0))
-					except Exception as e:
-						if debug:
-							print(f"      ⚠ İlçe hatası {dist_text}: {e}")
-							import traceback
-							traceback.print_exc()
-						continue
-				
-				if not all_prices:
-					print(f"  ⚠ Fiyat alınamadı: {city_text}")
-					continue
-				
-				print(f"  ✓ {len(all_prices)} ilçe için fiyat toplandı")
-				output_file = output_dir / f"termo_{_normalize_city_name(city_text)}_prices.txt"
-				_write_file(city_text, all_prices, output_file)
-				saved_files.append(output_file)
-				print(f"  ✓ Kaydedildi: {output_file.name}")
-				time.sleep(random.uniform(min_delay, max_delay))
-			except Exception as e:
-				print(f"  ✗ Hata: {city_text} -> {e}")
-				if debug:
-					import traceback
-					traceback.print_exc()
-		
-		browser.close()
+			return []
+
+		options = city_select.evaluate(_CITY_OPTIONS_JS)
+	print(f"Termo: {len(options)} şehir bulundu.")
+	options = [o for o in options if o.get("value", "").strip() and (o.get("text") or "").strip()]
+
+	saved: Dict[int, Path] = {}
+	failed: List[str] = []
+	for idx, opt, result in iter_parallel_pages(
+		options,
+		work=lambda page, opt: _scrape_city(page, url, opt, min_delay, max_delay, debug=debug),
+		setup=lambda context: _open_termo_page(context, url),
+		workers=1 if debug else workers,
+		debug=debug,
+		context_kwargs=_CONTEXT_KWARGS,
+		block_resources=MEDIA_RESOURCE_TYPES,
+	):
+		city_text = (opt.get("text") or "").strip()
+		prefix = f"[{idx + 1}/{len(options)}] {city_text}"
+		if isinstance(result, Exception):
+			failed.append(city_text)
+			print(f"{prefix}: ✗ Hata -> {result}")
+			continue
+		_, all_prices = result
+		if all_prices is None:
+			failed.append(city_text)
+			print(f"{prefix}: ⚠ İlçe seçenekleri bulunamadı")
+			continue
+		if not all_prices:
+			failed.append(city_text)
+			print(f"{prefix}: ⚠ Fiyat alınamadı")
+			continue
+
+		output_file = output_dir / f"termo_{_normalize_city_name(city_text)}_prices.txt"
+		_write_file(city_text, all_prices, output_file)
+		saved[idx] = output_file
+		print(f"{prefix}: ✓ {len(all_prices)} ilçe -> {output_file.name}")
+
+	saved_files = SavedFiles((saved[i] for i in sorted(saved)), failed)
 	print(f"\nToplam {len(saved_files)} dosya yazıldı -> {output_dir}")
 	return saved_files
@@ -1,340 +1,301 @@
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from functools import partial
 import argparse
-from common.plates import get_plate_codes
-from petrolofisi.scraper import fetch_all_cities_prices
-import petrolofisi
-from shell import save_city_prices_txt, save_all_cities_prices_txt
-import shell
-from opet import save_city_prices_txt as opet_save_city_prices_txt, save_all_cities_prices_txt as opet_save_all_cities_prices_txt
-import opet
-from turkiyepetrolleri.scraper import fetch_all_cities_prices as tppd_fetch_all_cities_prices
-from turkiyepetrolleri import save_city_prices_txt as tppd_save_city_prices_txt, save_all_cities_prices_txt as tppd_save_all_cities_prices_txt
-import turkiyepetrolleri
-from aytemiz.scraper import save_all_cities_prices_txt
-import aytemiz
-from moil.scraper import save_all_cities_prices_txt as moil_save_all_cities_prices_txt
-import moil
-from parkoil import save_city_prices_txt as parkoil_save_city_prices_txt, save_all_cities_prices_txt as parkoil_save_all_cities_prices_txt
-import parkoil
-from rpet import save_city_prices_txt as rpet_save_city_prices_txt, save_all_cities_prices_txt as rpet_save_all_cities_prices_txt
-import rpet
-from hpyco import save_city_prices_txt as hpyco_save_city_prices_txt, save_all_cities_prices_txt as hpyco_save_all_cities_prices_txt
-import hpyco
-from total.scraper import save_all_cities_prices_txt as total_save_all_cities_prices_txt
-import total
-from kadoil.scraper import save_all_cities_prices_txt as kadoil_save_all_cities_prices_txt
-import kadoil
-from lukoil.scraper import save_all_cities_prices_txt as lukoil_save_all_cities_prices_txt
-import lukoil
-from milangaz.scraper import save_all_cities_prices_txt as milangaz_save_all_cities_prices_txt
-import milangaz
-from ipragaz.scraper import save_all_cities_prices_txt as ipragaz_save_all_cities_prices_txt
-import ipragaz
-from sunpet.scraper import save_all_cities_prices_txt as sunpet_save_all_cities_prices_txt
-import sunpet
-from alpet.scraper import save_all_cities_prices_txt as alpet_save_all_cities_prices_txt
-import alpet
-from bpet.scraper import save_all_cities_prices_txt as bpet_save_all_cities_prices_txt
-import bpet
-from enerji.scraper import save_all_cities_prices_txt as enerji_save_all_cities_prices_txt
-import enerji
-from termo.scraper import save_all_cities_prices_txt as termo_save_all_cities_prices_txt
-import termo
-
-def run_opet():
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector")
-	group = parser.add_mutually_exclusive_group()
-	group.add_argument("--city", default="ADANA", help="Tek şehir fiyat txt kaydet (varsayılan: ADANA)")
-	group.add_argument("--all", action="store_true", help="Tüm şehirlerin fiyat txt dosyalarını kaydet")
-	args = parser.parse_args()
-	output_dir = Path(opet.__file__).parent / "prices"
-	if args.all:
-		saved = opet_save_all_cities_prices_txt(output_dir, debug=args.debug)
+import importlib
+import time
+from common.plates import PLATE_CODES
+from common.price_cache import PRICE_CACHE_MAX_AGE, SavedFiles, load_fresh_outputs, save_run_outputs
+
+# Marka modülleri (ve onlarla Playwright) yalnızca ilgili komut çalıştığında içe aktarılır
+_ROOT = Path(__file__).resolve().parent
+BRANDS = ("opet", "petrolofisi", "shell", "parkoil", "rpet", "hpyco", "turkiyepetrolleri", "aytemiz", "moil", "total", "kadoil", "lukoil", "milangaz", "ipragaz", "sunpet", "alpet", "bpet", "enerji", "termo", "petral", "qplus", "sahoil", "7kita")
+
+PETROLOFISI_URL = "https://www.petrolofisi.com.tr/akaryakit-fiyatlari"
+
+# Marka başına çıktı klasörü; bir kez hesaplanır ve oluşturulur
+PRICES_DIRS = {brand: _ROOT / brand / "prices" for brand in BRANDS}
+for _prices_dir in PRICES_DIRS.values():
+	_prices_dir.mkdir(parents=True, exist_ok=True)
+
+
+def _load(module: str, name: str = "save_all_cities_prices_txt"):
+	"""`module` içinden `name` fonksiyonunu ilk kullanımda içe aktarır."""
+	return getattr(importlib.import_module(module), name)
+
+def _save_all_fn(brand: str):
+	"""Markanın tüm şehirleri yazan fonksiyonu: fn(output_dir, debug=...) -> List[Path]"""
+	if brand == "petrolofisi":
+		return _petrolofisi_save_all
+	return _load(_SAVE_ALL_MODULES[brand])
+
+# HTTP yanıtlarını output_dir/.cache altında önbellekleyen markalar (use_cache / cache_ttl alır)
+_HTTP_CACHE_BRANDS = ("total", "petral")
+
+def _cache_kwargs(brand: str, args: argparse.Namespace) -> Dict[str, object]:
+	"""--no-cache yanıt önbelleğini kapatır, --max-age onun süresini de belirler"""
+	if brand not in _HTTP_CACHE_BRANDS:
+		return {}
+	if args.no_cache:
+		return {"use_cache": False}
+	if args.max_age is not None:
+		return {"cache_ttl": args.max_age}
+	return {}
+
+def _cached_outputs(brand: str, args: argparse.Namespace) -> Optional[List[Path]]:
+	"""Yalnızca --max-age verildiyse: markanın son --max-age saniye içinde yazılmış dosyaları"""
+	if args.max_age is None:
+		return None
+	saved = load_fresh_outputs(PRICES_DIRS[brand], args.max_age)
+	if saved is not None:
+		print(f"{brand}: son çalıştırma {args.max_age:.0f} sn'den yeni, yeniden çekilmedi ({len(saved)} dosya)")
+	return saved
+
+def _save_all(brand: str, args: argparse.Namespace) -> List[Path]:
+	"""Markanın tüm şehirlerini yazar; taze çıktısı varsa çekmeden onları döndürür."""
+	saved = _cached_outputs(brand, args)
+	if saved is None:
+		saved = _save_all_fn(brand)(PRICES_DIRS[brand], debug=args.debug, **_cache_kwargs(brand, args))
+		save_run_outputs(PRICES_DIRS[brand], saved)
+	return saved
+
+def _run_parallel(brands, args: argparse.Namespace, max_workers: Optional[int] = None) -> None:
+	"""Taze çıktısı olmayan markaları ayrı süreçlerde paralel çalıştırır ve her biteni raporlar."""
+	from common.runner import run_scrapers_parallel
+	jobs = {
+		brand: (partial(_save_all_fn(brand), **_cache_kwargs(brand, args)), PRICES_DIRS[brand])
+		for brand in brands if _cached_outputs(brand, args) is None
+	}
+
+	def on_result(name: str, saved: List[Path]) -> None:
+		save_run_outputs(PRICES_DIRS[name], saved)
+		print(f"{name}: {len(saved)} dosya yazıldı -> {PRICES_DIRS[name]}")
+
+	run_scrapers_parallel(jobs, debug=args.debug, max_workers=min(len(jobs), max_workers) if max_workers else None, on_result=on_result)
+
+def _make_city_run(brand: str, warning: str):
+	"""
+	--city/--all seçenekli markalar için run_<marka> üretir.
+	`python test.py <marka> --all` => tüm şehirler, `--city ADANA` => sadece o şehir
+	"""
+	def run(args: argparse.Namespace):
+		output_dir = PRICES_DIRS[brand]
+		if args.all:
+			saved = _save_all(brand, args)
+			print(f"{len(saved)} dosya yazıldı -> {output_dir}")
+			if not saved:
+				print(f"Uyarı: Dosya yazılamadı. {warning}")
+		else:
+			fp = _load(brand, "save_city_prices_txt")(args.city, output_dir, debug=args.debug, **_cache_kwargs(brand, args))
+			print(f"Kaydedildi: {fp}")
+	run.__name__ = f"run_{brand}"
+	return run
+
+run_opet = _make_city_run("opet", "Seçici veya tablo bulunamamış olabilir.")
+run_shell = _make_city_run("shell", "Seçici veya tablo bulunamamış olabilir.")
+run_parkoil = _make_city_run("parkoil", "Seçici veya tablo bulunamamış olabilir.")
+run_rpet = _make_city_run("rpet", "Tablo bulunamamış olabilir.")
+run_hpyco = _make_city_run("hpyco", "Seçici veya sonuç tablosu bulunamamış olabilir.")
+run_petral = _make_city_run("petral", "Tablo bulunamamış olabilir.")
+run_qplus = _make_city_run("qplus", "Seçici veya sonuç bulunamamış olabilir.")
+run_sahoil = _make_city_run("sahoil", "Seçici veya tablo bulunamamış olabilir.")
+run_7kita = _make_city_run("7kita", "Tablo bulunamamış olabilir.")
+
+def _make_all_run(brand: str, warning: str, doc: Optional[str] = None):
+	"""Yalnızca tüm şehirleri yazan markalar için run_<marka> üretir; `doc` alt komutun yardım metnidir."""
+	def run(args: argparse.Namespace):
+		output_dir = PRICES_DIRS[brand]
+		saved = _save_all(brand, args)
 		print(f"{len(saved)} dosya yazıldı -> {output_dir}")
 		if not saved:
-			print("Uyarı: Dosya yazılamadı. Seçici veya tablo bulunamamış olabilir.")
-	else:
-		fp = opet_save_city_prices_txt(args.city, output_dir, debug=args.debug)
-		print(f"Kaydedildi: {fp}")
-
-def run_petrolofisi():
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-	target_url = "https://www.petrolofisi.com.tr/akaryakit-fiyatlari"
-	# 81 il plaka kodlarını ortak fonksiyondan al
-	plate_codes = get_plate_codes()
-	# Tüm iller için yalnızca fiyat txt'leri üret (HTML yazılmaz)
-	output_dir = Path(petrolofisi.__file__).parent / "prices"
-	fetch_all_cities_prices(target_url, plate_codes, output_dir, prefer_with_tax=True, debug=args.debug)
+			print(f"Uyarı: Dosya yazılamadı. {warning}")
+	run.__name__ = f"run_{brand}"
+	run.__doc__ = doc
+	return run
+
+def run_petrolofisi(args: argparse.Namespace):
+	# Tüm iller (81 plaka kodu) için yalnızca fiyat txt'leri üret (HTML yazılmaz)
+	_save_all("petrolofisi", args)
 	print("Tüm iller için txt dosyaları 'petrolofisi/prices' klasörüne yazıldı (petrolofisi_<plaka>_prices.txt).")
 
-def run_shell():
-	# .\test.py --all => hepsi   ,   .\test.py --city ADANA => sadece ADANA
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector")
-	group = parser.add_mutually_exclusive_group()
-	group.add_argument("--city", default="ADANA", help="Tek şehir fiyat txt kaydet (varsayılan: ADANA)")
-	group.add_argument("--all", action="store_true", help="Tüm şehirlerin fiyat txt dosyalarını kaydet")
-	args = parser.parse_args()
-	output_dir = Path(shell.__file__).parent / "prices"
-	if args.all:
-		save_all_cities_prices_txt(output_dir, debug=args.debug)
-		print("Tüm şehirlerin fiyat txt dosyaları 'shell/prices' klasörüne yazıldı (shell_<ŞEHİR>_prices.txt).")
-	else:
-		fp = save_city_prices_txt(args.city, output_dir, debug=args.debug)
-		print(f"Kaydedildi: {fp}")
-
-def run_parkoil():
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector")
-	group = parser.add_mutually_exclusive_group()
-	group.add_argument("--city", default="Adana", help="Tek şehir fiyat txt kaydet (varsayılan: Adana)")
-	group.add_argument("--all", action="store_true", help="Tüm şehirlerin fiyat txt dosyalarını kaydet")
-	args = parser.parse_args()
-	output_dir = Path(parkoil.__file__).parent / "prices"
-	if args.all:
-		saved = parkoil_save_all_cities_prices_txt(output_dir, debug=args.debug)
-		print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-		if not saved:
-			print("Uyarı: Dosya yazılamadı. Seçici veya tablo bulunamamış olabilir.")
-	else:
-		fp = parkoil_save_city_prices_txt(args.city, output_dir, debug=args.debug)
-		print(f"Kaydedildi: {fp}")
-
-def run_rpet():
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector")
-	group = parser.add_mutually_exclusive_group()
-	group.add_argument("--city", default="ADANA", help="Tek şehir fiyat txt kaydet (varsayılan: ADANA)")
-	group.add_argument("--all", action="store_true", help="Tüm şehirlerin fiyat txt dosyalarını kaydet")
-	args = parser.parse_args()
-	output_dir = Path(rpet.__file__).parent / "prices"
-	if args.all:
-		saved = rpet_save_all_cities_prices_txt(output_dir, debug=args.debug)
-		print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-		if not saved:
-			print("Uyarı: Dosya yazılamadı. Tablo bulunamamış olabilir.")
-	else:
-		fp = rpet_save_city_prices_txt(args.city, output_dir, debug=args.debug)
-		print(f"Kaydedildi: {fp}")
-		
-def run_hpyco():
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector")
-	group = parser.add_mutually_exclusive_group()
-	group.add_argument("--city", default="Adana", help="Tek şehir fiyat txt kaydet (varsayılan: Adana)")
-	group.add_argument("--all", action="store_true", help="Tüm şehirlerin fiyat txt dosyalarını kaydet")
-	args = parser.parse_args()
-	output_dir = Path(hpyco.__file__).parent / "prices"
-	if args.all:
-		saved = hpyco_save_all_cities_prices_txt(output_dir, debug=args.debug)
-		print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-		if not saved:
-			print("Uyarı: Dosya yazılamadı. Seçici veya sonuç tablosu bulunamamış olabilir.")
-	else:
-		fp = hpyco_save_city_prices_txt(args.city, output_dir, debug=args.debug)
-		print(f"Kaydedildi: {fp}")
-
-def run_turkiyepetrolleri():
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
+def run_turkiyepetrolleri(args: argparse.Namespace):
 	# Tüm şehirler için otomatik olarak fiyat txt'leri üret (Petrolofisi gibi)
-	output_dir = Path(turkiyepetrolleri.__file__).parent / "prices"
-	tppd_fetch_all_cities_prices(output_dir, debug=args.debug)
-
-def run_aytemiz():
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-	# Fetch all cities with benzin and LPG prices (merged) and save to text files
-	output_dir = Path(aytemiz.__file__).parent / "prices"
-	saved = save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya tablo bulunamamış olabilir.")
-
-
-def run_moil():
-	"""
-	Tüm şehirler için Moil pompa fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: moil/moil_<ŞEHİR>_prices.txt
-	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(moil.__file__).parent / "prices"
-	saved = moil_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya tablo / şehir seçimi bulunamamış olabilir.")
-
-def run_total():
-	"""
-	Tüm şehirler için Total pompa fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: total/total_<ŞEHİR>_prices.txt
-	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(total.__file__).parent / "prices"
-	saved = total_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya tablo / şehir seçimi bulunamamış olabilir.")
-
-def run_kadoil():
+	if _save_all("turkiyepetrolleri", args):
+		print("Tüm şehirlerin fiyat txt dosyaları 'turkiyepetrolleri/prices' klasörüne yazıldı (tppd_<ŞEHİR>_prices.txt).")
+	else:
+		print("Uyarı: Hiçbir dosya yazılamadı.")
+
+run_aytemiz = _make_all_run("aytemiz", "Seçici veya tablo bulunamamış olabilir.", "Tüm şehirler için Aytemiz benzin ve LPG fiyatlarını (birleşik) txt dosyalarına yazar.")
+run_moil = _make_all_run("moil", "Seçici veya tablo / şehir seçimi bulunamamış olabilir.", "Tüm şehirler için Moil pompa fiyatlarını çekip txt dosyalarına yazar.")
+run_total = _make_all_run("total", "Seçici veya tablo / şehir seçimi bulunamamış olabilir.", "Tüm şehirler için Total pompa fiyatlarını çekip txt dosyalarına yazar.")
+run_kadoil = _make_all_run("kadoil", "Seçici veya tablo / şehir seçimi bulunamamış olabilir.", "Tüm şehirler için Kadoil pompa fiyatlarını çekip txt dosyalarına yazar.")
+run_lukoil = _make_all_run("lukoil", "Seçici veya tablo / şehir seçimi bulunamamış olabilir.", "Tüm şehirler için Lukoil pompa fiyatlarını çekip txt dosyalarına yazar.")
+run_milangaz = _make_all_run("milangaz", "Seçici veya fiyat bulunamamış olabilir.", "Tüm şehirler için Milangaz Otogaz fiyatlarını çekip txt dosyalarına yazar.")
+run_ipragaz = _make_all_run("ipragaz", "Seçici veya fiyat bulunamamış olabilir.", "Tüm şehirler için Ipragaz fiyatlarını çekip txt dosyalarına yazar.")
+run_sunpet = _make_all_run("sunpet", "Seçici veya fiyat bulunamamış olabilir.", "Tüm şehirler için Sunpet akaryakıt fiyatlarını çekip txt dosyalarına yazar.")
+run_alpet = _make_all_run("alpet", "Seçici veya fiyat bulunamamış olabilir.", "Tüm şehirler için Alpet akaryakıt fiyatlarını çekip txt dosyalarına yazar.")
+run_bpet = _make_all_run("bpet", "Seçici veya fiyat bulunamamış olabilir.", "Tüm şehirler için Bpet akaryakıt fiyatlarını çekip txt dosyalarına yazar.")
+run_enerji = _make_all_run("enerji", "Seçici veya fiyat bulunamamış olabilir.", "Tüm şehirler için Enerji akaryakıt fiyatlarını çekip txt dosyalarına yazar.")
+run_termo = _make_all_run("termo", "Seçici veya fiyat bulunamamış olabilir.", "Tüm şehirler için Termo akaryakıt fiyatlarını çekip txt dosyalarına yazar.")
+
+def run_kadoil_lukoil(args: argparse.Namespace):
 	"""
-	Tüm şehirler için Kadoil pompa fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: kadoil/kadoil_<ŞEHİR>_prices.txt
+	Kadoil ve Lukoil scraperlarını iki ayrı süreçte paralel çalıştırır.
+	Çıktılar: kadoil/prices ve lukoil/prices klasörleri
 	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(kadoil.__file__).parent / "prices"
-	saved = kadoil_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya tablo / şehir seçimi bulunamamış olabilir.")
+	_run_parallel(("kadoil", "lukoil"), args)
 
-def run_lukoil():
+def run_shell_sunpet_termo(args: argparse.Namespace):
 	"""
-	Tüm şehirler için Lukoil pompa fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: lukoil/lukoil_<ŞEHİR>_prices.txt
+	Shell, Sunpet ve Termo scraperlarını ayrı süreçlerde paralel çalıştırır.
+	Headless çalışmada üç süreç tek bir paylaşılan Chromium'a (CDP) bağlanır.
+	Çıktılar: shell/prices, sunpet/prices ve termo/prices klasörleri
 	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(lukoil.__file__).parent / "prices"
-	saved = lukoil_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya tablo / şehir seçimi bulunamamış olabilir.")
+	_run_parallel(("shell", "sunpet", "termo"), args)
 
-def run_aygaz():
+def run_aygaz(args: argparse.Namespace):
 	"""
 	Bu fonksiyon artık kullanılmıyor (Aygaz scraper silindi).
 	Eski çağrılar bozulmasın diye yerinde bırakıldı.
 	"""
-	parser = argparse.ArgumentParser()
-	parser.parse_args()
 	print("Aygaz scraper kaldırıldı. Lütfen Milangaz veya diğer markaları kullanın.")
 
 
-def run_milangaz():
+def _petrolofisi_save_all(output_dir: Path, debug: bool = False) -> List[Path]:
+	# fetch_all_cities_prices returns nothing; report the files this run wrote and the plate codes it missed
+	started = time.time()
+	_load("petrolofisi.scraper", "fetch_all_cities_prices")(PETROLOFISI_URL, PLATE_CODES, output_dir, prefer_with_tax=True, debug=debug)
+	files = [output_dir / f"petrolofisi_{code}_prices.txt" for code in PLATE_CODES]
+	written = [fp.exists() and fp.stat().st_mtime >= started for fp in files]
+	return SavedFiles(
+		(fp for fp, ok in zip(files, written) if ok),
+		(code for code, ok in zip(PLATE_CODES, written) if not ok),
+	)
+
+# run_all: varsayılan olarak aynı anda çalışan marka süreci sayısı; işler G/Ç ağırlıklı, sınır Chromium RAM'i için
+ALL_MAX_WORKERS = 6
+
+# Tüm şehirleri yazan fonksiyonun modülü (save_all_cities_prices_txt); petrolofisi ayrı sarmalanır
+_SAVE_ALL_MODULES = {
+	"opet": "opet",
+	"shell": "shell",
+	"parkoil": "parkoil",
+	"rpet": "rpet",
+	"hpyco": "hpyco",
+	"turkiyepetrolleri": "turkiyepetrolleri",
+	"aytemiz": "aytemiz.scraper",
+	"moil": "moil.scraper",
+	"total": "total.scraper",
+	"kadoil": "kadoil.scraper",
+	"lukoil": "lukoil.scraper",
+	"milangaz": "milangaz.scraper",
+	"ipragaz": "ipragaz.scraper",
+	"sunpet": "sunpet.scraper",
+	"alpet": "alpet.scraper",
+	"bpet": "bpet.scraper",
+	"enerji": "enerji.scraper",
+	"termo": "termo.scraper",
+	"petral": "petral",
+	"qplus": "qplus",
+	"sahoil": "sahoil",
+	"7kita": "7kita",
+}
+
+# run_all'un çalıştırabildiği markalar (--brands için geçerli adlar)
+ALL_BRANDS = (*_SAVE_ALL_MODULES, "petrolofisi")
+
+def _brand_list(value: str) -> Tuple[str, ...]:
+	"""--brands değeri: virgülle ayrılmış marka adları ya da 'all'"""
+	if value == "all":
+		return ALL_BRANDS
+	brands = tuple(dict.fromkeys(b.strip() for b in value.split(",") if b.strip()))
+	unknown = [b for b in brands if b not in ALL_BRANDS]
+	if unknown or not brands:
+		raise argparse.ArgumentTypeError(f"bilinmeyen marka: {', '.join(unknown) or repr(value)} (geçerli: {', '.join(ALL_BRANDS)})")
+	return brands
+
+def _positive_int(value: str) -> int:
+	n = int(value)
+	if n < 1:
+		raise argparse.ArgumentTypeError("1 veya daha büyük olmalı")
+	return n
+
+def run_all(args: argparse.Namespace):
 	"""
-	Tüm şehirler için Milangaz Otogaz fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: milangaz/milangaz_<ŞEHİR>_prices.txt
-	İstanbul (Anadolu) ve İstanbul (Avrupa) birleştirilir: milangaz_ISTANBUL_prices.txt
+	Tüm markaları (ya da --brands ile seçilenleri) ayrı süreçlerde paralel çalıştırır (aynı anda en fazla --jobs marka).
+	Headless çalışmada süreçler tek bir paylaşılan Chromium'a (CDP) bağlanır.
 	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(milangaz.__file__).parent / "prices"
-	saved = milangaz_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya fiyat bulunamamış olabilir.")
-
-def run_ipragaz():
-	"""
-	Tüm şehirler için Ipragaz fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: ipragaz/ipragaz_<ŞEHİR>_prices.txt
-	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(ipragaz.__file__).parent / "prices"
-	saved = ipragaz_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya fiyat bulunamamış olabilir.")
-
-def run_sunpet():
-	"""
-	Tüm şehirler için Sunpet akaryakıt fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: sunpet/sunpet_<ŞEHİR>_prices.txt
-	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(sunpet.__file__).parent / "prices"
-	saved = sunpet_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya fiyat bulunamamış olabilir.")
-
-def run_alpet():
-	"""
-	Tüm şehirler için Alpet akaryakıt fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: alpet/alpet_<ŞEHİR>_prices.txt
-	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(alpet.__file__).parent / "prices"
-	saved = alpet_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya fiyat bulunamamış olabilir.")
-
-def run_bpet():
-	"""
-	Tüm şehirler için Bpet akaryakıt fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: bpet/bpet_<ŞEHİR>_prices.txt
-	İstanbul (TRA ve ANA) birleştirilir: bpet_ISTANBUL_prices.txt
-	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(bpet.__file__).parent / "prices"
-	saved = bpet_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya fiyat bulunamamış olabilir.")
-
-def run_enerji():
-	"""
-	Tüm şehirler için Enerji akaryakıt fiyatlarını çekip txt dosyalarına yazar.
-	Çıktılar: enerji/enerji_<ŞEHİR>_prices.txt
-	İstanbul (Anadolu ve Avrupa) birleştirilir: enerji_ISTANBUL_prices.txt
-	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(enerji.__file__).parent / "prices"
-	saved = enerji_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya fiyat bulunamamış olabilir.")
-
-def run_termo():
-	"""
-	Tüm şehirler için Termo akaryakıt fiyatlarını çekip txt dosyalarına yazar.
-	Her şehir için tüm ilçeler toplanır ve tek bir dosyaya yazılır.
-	Çıktılar: termo/termo_<ŞEHİR>_prices.txt
-	"""
-	parser = argparse.ArgumentParser()
-	parser.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
-	args = parser.parse_args()
-
-	output_dir = Path(termo.__file__).parent / "prices"
-	saved = termo_save_all_cities_prices_txt(output_dir, debug=args.debug)
-	print(f"{len(saved)} dosya yazıldı -> {output_dir}")
-	if not saved:
-		print("Uyarı: Dosya yazılamadı. Seçici veya fiyat bulunamamış olabilir.")
+	_run_parallel(args.brands, args, max_workers=args.jobs)
+
+# --city/--all seçeneği olan markalar: varsayılan şehir
+_CITY_DEFAULTS = {
+	"opet": "ADANA",
+	"shell": "ADANA",
+	"parkoil": "Adana",
+	"rpet": "ADANA",
+	"hpyco": "Adana",
+	"petral": "ADANA",
+	"qplus": "ADANA",
+	"sahoil": "ADANA",
+	"7kita": "ADANA",
+}
+
+DISPATCH = {
+	"opet": run_opet,
+	"petrolofisi": run_petrolofisi,
+	"shell": run_shell,
+	"parkoil": run_parkoil,
+	"rpet": run_rpet,
+	"hpyco": run_hpyco,
+	"turkiyepetrolleri": run_turkiyepetrolleri,
+	"aytemiz": run_aytemiz,
+	"moil": run_moil,
+	"total": run_total,
+	"kadoil": run_kadoil,
+	"lukoil": run_lukoil,
+	"kadoil-lukoil": run_kadoil_lukoil,
+	"shell-sunpet-termo": run_shell_sunpet_termo,
+	"aygaz": run_aygaz,
+	"milangaz": run_milangaz,
+	"ipragaz": run_ipragaz,
+	"sunpet": run_sunpet,
+	"alpet": run_alpet,
+	"bpet": run_bpet,
+	"enerji": run_enerji,
+	"termo": run_termo,
+	"petral": run_petral,
+	"qplus": run_qplus,
+	"sahoil": run_sahoil,
+	"7kita": run_7kita,
+	"all": run_all,
+}
+
+
+def _build_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(description="Akaryakıt fiyatlarını marka bazında çekip txt dosyalarına yazar.")
+	sub = parser.add_subparsers(dest="brand", required=True, metavar="MARKA")
+	for brand, handler in DISPATCH.items():
+		doc = (handler.__doc__ or "").strip()
+		p = sub.add_parser(brand, help=doc.splitlines()[0] if doc else None)
+		p.add_argument("--debug", action="store_true", help="Headful + slow-mo + Inspector (PWDEBUG=1 önerilir)")
+		cache = p.add_mutually_exclusive_group()
+		cache.add_argument("--no-cache", action="store_true", help="total/petral HTTP yanıt önbelleğini atla (şehir listesi, çerez ve son çalıştırma önbellekleri etkilenmez)")
+		cache.add_argument("--max-age", type=float, nargs="?", const=PRICE_CACHE_MAX_AGE, metavar="SANİYE", help=f"Son çalıştırma bu süreden yeniyse markayı yeniden çekme; HTTP yanıtları da en fazla bu kadar eski olur (değersiz: {PRICE_CACHE_MAX_AGE}; verilmezse her zaman çekilir)")
+		if brand in _CITY_DEFAULTS:
+			default = _CITY_DEFAULTS[brand]
+			group = p.add_mutually_exclusive_group()
+			group.add_argument("--city", default=default, help=f"Tek şehir fiyat txt kaydet (varsayılan: {default})")
+			group.add_argument("--all", action="store_true", help="Tüm şehirlerin fiyat txt dosyalarını kaydet")
+		if brand == "all":
+			p.add_argument("--brands", type=_brand_list, default=ALL_BRANDS, metavar="A,B,C", help="Yalnızca bu markaları çalıştır (virgülle ayrılmış; varsayılan: all)")
+			p.add_argument("-j", "--jobs", type=_positive_int, default=ALL_MAX_WORKERS, help=f"Aynı anda çalışan marka süreci sayısı (varsayılan: {ALL_MAX_WORKERS})")
+	return parser
+
+
+# Built once at import; `python test.py <marka> [--debug] [--no-cache | --max-age [SN]] [--city X | --all]`
+# or `python test.py all [--brands opet,shell,petral] [-j 6]`
+PARSER = _build_parser()
 
 if __name__ == "__main__":
-	run_termo()
+	args = PARSER.parse_args()
+	DISPATCH[args.brand](args)
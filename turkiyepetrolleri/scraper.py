@@ -1,12 +1,32 @@
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
-import random
+from playwright.sync_api import TimeoutError as PWTimeoutError
 import re
 
+from common.browser import MEDIA_RESOURCE_TYPES, block_trackers
+from common.browser_pool import acquire_context
+from common.file_writer import BackgroundWriter, write_file
+from common.price_cache import SavedFiles
+from common.rate_limit import TokenBucket, jitter_backoff
+from common.turkish import fold
+from common.workers import iter_parallel_pages
+
 TPPD_URL = "https://www.tppd.com.tr/akaryakit-fiyatlari"
 
+_TITLE_SUFFIX_RE = re.compile(r'\s*GÜNCEL\s*AKARYAKIT\s*FİYATLARI\s*$', re.IGNORECASE)
+_WS_RE = re.compile(r'\s+')
+_CITY_SLUG_RE = re.compile(r'/([^/]+)-akaryakit-fiyatlari')
+_SLUG_SEP_RE = re.compile(r'[^a-z0-9]+')
+
+_CONTEXT_KWARGS = dict(
+	user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	locale="tr-TR",
+	timezone_id="Europe/Istanbul",
+	viewport={"width": 1280, "height": 900},
+	ignore_https_errors=True,
+)
+
 def _ensure_cookie_accepted(page) -> None:
 	try:
 		if page.locator("#onetrust-accept-btn-handler").is_visible():
@@ -21,8 +41,8 @@ def _normalize_city_name(name: str) -> str:
 	if "KAHRAMANMARAŞ" in name or "K.MARAS" in name:
 		return "K.MARAS"
 	# Remove common suffixes
-	name = re.sub(r'\s*GÜNCEL\s*AKARYAKIT\s*FİYATLARI\s*$', '', name, flags=re.IGNORECASE)
-	name = re.sub(r'\s+', ' ', name).strip()
+	name = _TITLE_SUFFIX_RE.sub('', name)
+	name = _WS_RE.sub(' ', name).strip()
 	return name
 
 def _extract_city_links_from_main_page(page) -> List[dict]:
@@ -33,34 +53,31 @@ def _extract_city_links_from_main_page(page) -> List[dict]:
 	except Exception:
 		pass
 	
-	links = page.locator(".otherStations a[href*='-akaryakit-fiyatlari']")
-	count = links.count()
+	# href and text of every link in one round-trip instead of two per link
+	anchors = page.locator(".otherStations a[href*='-akaryakit-fiyatlari']").evaluate_all(
+		"els => els.map(a => [a.getAttribute('href'), a.innerText || ''])"
+	)
 	city_links: List[dict] = []
 	
-	for i in range(count):
-		link = links.nth(i)
-		try:
-			href = link.get_attribute("href")
-			text = link.inner_text().strip()
-			
-			# Extract city name from text
-			city_name = _normalize_city_name(text)
-			
-			# Fallback: Extract from URL if text parsing fails
-			if not city_name and href:
-				url_match = re.search(r'/([^/]+)-akaryakit-fiyatlari', href)
-				if url_match:
-					url_city = url_match.group(1).upper().replace('-', ' ')
-					city_name = _normalize_city_name(url_city)
-			
-			if href and city_name:
-				city_links.append({"name": city_name, "url": href})
-		except Exception:
-			continue
+	for href, text in anchors:
+		# Extract city name from text
+		city_name = _normalize_city_name(text)
+		
+		# Fallback: Extract from URL if text parsing fails
+		if not city_name and href:
+			url_match = _CITY_SLUG_RE.search(href)
+			if url_match:
+				url_city = url_match.group(1).upper().replace('-', ' ')
+				city_name = _normalize_city_name(url_city)
+		
+		if href and city_name:
+			city_links.append({"name": city_name, "url": href})
 	return city_links
 
-@dataclass
+@dataclass(frozen=True)
 class TPPDPriceRow:
+	# Explicit __slots__ (no per-row __dict__); dataclass(slots=True) would need Python 3.10
+	__slots__ = ("district", "kursunsuz_benzin", "gaz_yagi", "motorin_1", "motorin_2", "kalorifer_yakiti", "fuel_oil", "yk_fuel_oil", "gaz")
 	district: str  # İlçe
 	kursunsuz_benzin: str  # KURŞUNSUZ BENZİN (TL/LT)
 	gaz_yagi: str  # GAZ YAĞI (TL/LT)
@@ -71,197 +88,184 @@ class TPPDPriceRow:
 	yk_fuel_oil: str  # Y.K. FUEL OIL (TL/KG)
 	gaz: str  # GAZ
 
+# Every body row's cell texts in one round-trip (whitespace collapsed, empty cells as "-").
+# Prefers the site's price table class and falls back to any table in #results.
+_TABLE_CELLS_JS = """() => {
+	let tables = document.querySelectorAll('#results table.table.table-bordered.cf');
+	if (!tables.length) tables = document.querySelectorAll('#results table');
+	return [...tables].flatMap(t => [...t.querySelectorAll('tbody tr')])
+		.map(tr => [...tr.querySelectorAll('td')].map(td => (td.innerText || '').replace(/\\s+/g, ' ').trim() || '-'));
+}"""
+
 def _extract_prices_from_city_page(page) -> List[TPPDPriceRow]:
 	"""Extract price table from city page."""
-	# Wait for results section
+	# Wait for the price rows themselves rather than a fixed render delay
 	try:
-		page.wait_for_selector("#results", timeout=10000)
+		page.wait_for_selector("#results table tbody tr", state="attached", timeout=8000)
 	except Exception:
 		pass
 	
-	# Wait a bit for table to render
-	page.wait_for_timeout(500)
-	
-	table = page.locator("#results table.table.table-bordered.cf")
-	if table.count() == 0:
-		# Fallback: try any table in results
-		table = page.locator("#results table")
-	
-	if table.count() == 0:
-		return []
-	
-	rows = table.locator("tbody tr")
-	row_count = rows.count()
-	results: List[TPPDPriceRow] = []
-	
-	for i in range(row_count):
-		row = rows.nth(i)
-		tds = row.locator("td")
-		td_count = tds.count()
-		if td_count < 9:
-			continue
-		
-		def get_cell_text(idx: int) -> str:
-			try:
-				cell = tds.nth(idx)
-				# Try to get text from the cell, handling nested elements
-				text = cell.inner_text().strip()
-				# Clean up whitespace and newlines
-				text = re.sub(r'\s+', ' ', text)
-				# Remove any leading/trailing whitespace
-				text = text.strip()
-				return text if text else "-"
-			except Exception:
-				return "-"
-		
-		results.append(
-			TPPDPriceRow(
-				district=get_cell_text(0),
-				kursunsuz_benzin=get_cell_text(1),
-				gaz_yagi=get_cell_text(2),
-				motorin_1=get_cell_text(3),
-				motorin_2=get_cell_text(4),
-				kalorifer_yakiti=get_cell_text(5),
-				fuel_oil=get_cell_text(6),
-				yk_fuel_oil=get_cell_text(7),
-				gaz=get_cell_text(8),
-			)
-		)
-	
-	return results
+	cells = page.evaluate(_TABLE_CELLS_JS)
+	# Rows without a single price (every cell "-") are dropped before building a row object
+	return [TPPDPriceRow(*row[:9]) for row in cells if len(row) >= 9 and any(c != "-" for c in row[1:9])]
 
-def _write_tppd_prices_to_text(city_name: str, prices: List[TPPDPriceRow], output_file: Path) -> None:
-	lines: List[str] = []
-	for p in prices:
-		lines.append(
-			f"{p.district} | K.Benzin 95: {p.kursunsuz_benzin} | Gaz Yağı: {p.gaz_yagi} | "
-			f"Motorin: {p.motorin_1} | Motorin 2: {p.motorin_2} | Kalorifer Yakıtı: {p.kalorifer_yakiti} | "
-			f"Fuel Oil: {p.fuel_oil} | Y.K. Fuel Oil: {p.yk_fuel_oil} | Gaz: {p.gaz}"
-		)
-	output_file.write_text("\n".join(lines), encoding="utf-8")
+def _write_tppd_prices_to_text(city_name: str, prices: List[TPPDPriceRow], output_file: Path, writer: Optional[BackgroundWriter] = None) -> None:
+	write_file(output_file, "\n".join(
+		f"{p.district} | K.Benzin 95: {p.kursunsuz_benzin} | Gaz Yağı: {p.gaz_yagi} | "
+		f"Motorin: {p.motorin_1} | Motorin 2: {p.motorin_2} | Kalorifer Yakıtı: {p.kalorifer_yakiti} | "
+		f"Fuel Oil: {p.fuel_oil} | Y.K. Fuel Oil: {p.yk_fuel_oil} | Gaz: {p.gaz}"
+		for p in prices
+	).encode("utf-8"), writer)
+
+def _direct_city_url(city_name: str) -> str:
+	"""City page URL guessed from the site's slug pattern (e.g. ADANA -> /adana-akaryakit-fiyatlari)."""
+	slug = _SLUG_SEP_RE.sub('-', fold(city_name).lower()).strip('-')
+	return f"https://www.tppd.com.tr/{slug}-akaryakit-fiyatlari"
+
+def _prices_from_direct_url(page, city_name: str) -> List[TPPDPriceRow]:
+	"""Open the guessed city page; [] if it does not exist or has no price table."""
+	try:
+		resp = page.goto(_direct_city_url(city_name), wait_until="domcontentloaded")
+		if resp is None or not resp.ok:
+			return []
+		_ensure_cookie_accepted(page)
+		return _extract_prices_from_city_page(page)
+	except Exception:
+		return []
 
 def save_city_prices_txt(city_name: str, output_dir: Path, url: str = TPPD_URL, debug: bool = False) -> Path:
 	"""Open TPPD prices page, navigate to city page, extract price table, and write txt."""
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
-		page = context.new_page()
-		page.set_default_navigation_timeout(45000)
-		
-		# First, get the main page to find city links
-		page.goto(url, wait_until="domcontentloaded")
-		_ensure_cookie_accepted(page)
-		page.wait_for_timeout(1000)
-		
-		# Extract city links
-		city_links = _extract_city_links_from_main_page(page)
-		
-		# Find matching city
-		target_link = None
-		for link in city_links:
-			if link["name"].upper() == city_name.upper():
-				target_link = link
-				break
+	# Pooled browser: repeated calls only pay for a new context, not a Chromium launch
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
+		page = _new_city_page(context)
 		
-		# Fallback: try partial match
-		if not target_link:
+		# The city's own page usually sits at a predictable URL; skip the main page when it does
+		prices = _prices_from_direct_url(page, city_name)
+		if not prices:
+			# Fallback: get the main page to find city links
+			page.goto(url, wait_until="domcontentloaded")
+			_ensure_cookie_accepted(page)
+			
+			# Extract city links
+			city_links = _extract_city_links_from_main_page(page)
+			
+			# Find matching city
+			target_link = None
 			for link in city_links:
-				if city_name.upper() in link["name"].upper() or link["name"].upper() in city_name.upper():
+				if link["name"].upper() == city_name.upper():
 					target_link = link
 					break
-		
-		if not target_link:
-			raise RuntimeError(f"Şehir bulunamadı: {city_name}")
-		
-		# Navigate to city page
-		city_url = target_link["url"]
-		if not city_url.startswith("http"):
-			city_url = f"https://www.tppd.com.tr{city_url}"
-		
-		page.goto(city_url, wait_until="domcontentloaded")
-		page.wait_for_timeout(1500)
-		
-		# Extract prices
-		prices = _extract_prices_from_city_page(page)
+			
+			# Fallback: try partial match
+			if not target_link:
+				for link in city_links:
+					if city_name.upper() in link["name"].upper() or link["name"].upper() in city_name.upper():
+						target_link = link
+						break
+			
+			if not target_link:
+				raise RuntimeError(f"Şehir bulunamadı: {city_name}")
+			
+			# Navigate to city page
+			page.goto(_city_url(target_link), wait_until="domcontentloaded")
+			
+			# Extract prices
+			prices = _extract_prices_from_city_page(page)
 		
 		output_dir.mkdir(parents=True, exist_ok=True)
 		fp = output_dir / f"tppd_{city_name}_prices.txt"
 		_write_tppd_prices_to_text(city_name, prices, fp)
-		
-		browser.close()
 		return fp
 
-def save_all_cities_prices_txt(output_dir: Path, url: str = TPPD_URL, debug: bool = False, min_delay: float = 0.8, max_delay: float = 1.6, retries: int = 1) -> List[Path]:
-	"""Open TPPD prices page, iterate all cities, write per-city txt files to output_dir."""
-	saved: List[Path] = []
-	with sync_playwright() as p:
-		browser = p.chromium.launch(headless=not debug, slow_mo=400 if debug else 0)
-		context = browser.new_context(
-			user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			locale="tr-TR",
-			timezone_id="Europe/Istanbul",
-			viewport={"width": 1280, "height": 900},
-			ignore_https_errors=True,
-		)
+def _city_url(link: dict) -> str:
+	city_url = link["url"]
+	return city_url if city_url.startswith("http") else f"https://www.tppd.com.tr{city_url}"
+
+def _load_city_links(url: str, debug: bool = False) -> List[dict]:
+	"""Open the main prices page once and read the city links."""
+	with acquire_context(debug=debug, block_resources=MEDIA_RESOURCE_TYPES, **_CONTEXT_KWARGS) as context:
 		page = context.new_page()
+		block_trackers(context, page)
 		page.set_default_navigation_timeout(45000)
-		
-		# Get main page and extract city links
 		page.goto(url, wait_until="domcontentloaded")
 		_ensure_cookie_accepted(page)
-		page.wait_for_timeout(1000)
-		
-		city_links = _extract_city_links_from_main_page(page)
-		output_dir.mkdir(parents=True, exist_ok=True)
-		
-		for link in city_links:
+		return _extract_city_links_from_main_page(page)
+
+def _new_city_page(context):
+	page = context.new_page()
+	block_trackers(context, page)
+	page.set_default_navigation_timeout(45000)
+	return page
+
+def _scrape_city_to_file(page, link: dict, output_dir: Path, bucket: TokenBucket, retries: int, writer: BackgroundWriter) -> Optional[Path]:
+	"""Open one city page on a worker's page (with retries) and write its txt; None if the table is empty."""
+	for attempt in range(retries + 1):
+		# Shared pacing between cities; slows down after timeouts
+		bucket.acquire()
+		try:
+			resp = page.goto(_city_url(link), wait_until="domcontentloaded")
+			if resp is not None and (resp.status == 429 or resp.status >= 500):
+				# Throttled / overloaded: slow every worker down, then retry this city
+				bucket.backoff()
+				raise RuntimeError(f"HTTP {resp.status} for {_city_url(link)}")
+			prices = _extract_prices_from_city_page(page)
+			if not prices:
+				return None
+			fp = output_dir / f"tppd_{link['name']}_prices.txt"
+			_write_tppd_prices_to_text(link["name"], prices, fp, writer)
+			return fp
+		except Exception as e:
+			if isinstance(e, PWTimeoutError):
+				bucket.backoff()
+			if attempt >= retries:
+				raise
+			page.wait_for_timeout(jitter_backoff(attempt, base=1000))
+
+def save_all_cities_prices_txt(output_dir: Path, url: str = TPPD_URL, debug: bool = False, min_delay: float = 0.8, max_delay: float = 1.6, retries: int = 1, workers: int = 4) -> List[Path]:
+	"""
+	Open TPPD prices page, iterate all cities, write per-city txt files to output_dir.
+	City pages are spread over `workers` parallel browser contexts (1 in debug mode).
+	Requests are paced by a per-brand TokenBucket; on the first run it starts at the pace
+	of one city per mean(min_delay, max_delay) seconds per worker, and it never goes faster
+	than one city per min_delay seconds per worker. 429/5xx responses back off and retry.
+	"""
+	workers = 1 if debug else workers
+	bucket = TokenBucket.for_brand(
+		"turkiyepetrolleri",
+		default_rps=workers / ((min_delay + max_delay) / 2),
+		max_rps=workers / min_delay,
+	)
+	city_links = _load_city_links(url, debug=debug)
+	output_dir.mkdir(parents=True, exist_ok=True)
+	saved: List[Tuple[int, Path]] = []
+	failed: List[str] = []
+	# Page workers only extract; the files are written on the writer's thread
+	with BackgroundWriter() as writer:
+		for idx, link, result in iter_parallel_pages(
+			city_links,
+			work=lambda page, link: _scrape_city_to_file(page, link, output_dir, bucket, retries, writer),
+			setup=_new_city_page,
+			workers=workers,
+			debug=debug,
+			context_kwargs=_CONTEXT_KWARGS,
+			block_resources=MEDIA_RESOURCE_TYPES,
+		):
 			city_name = link["name"]
-			for attempt in range(retries + 1):
-				try:
-					# Navigate to city page
-					city_url = link["url"]
-					if not city_url.startswith("http"):
-						city_url = f"https://www.tppd.com.tr{city_url}"
-					
-					page.goto(city_url, wait_until="domcontentloaded")
-					page.wait_for_timeout(1500)
-					
-					# Extract prices
-					prices = _extract_prices_from_city_page(page)
-					
-					if prices:
-						fp = output_dir / f"tppd_{city_name}_prices.txt"
-						_write_tppd_prices_to_text(city_name, prices, fp)
-						saved.append(fp)
-						print(f"OK: {city_name} -> {fp.name}")
-					else:
-						print(f"Uyarı: {city_name} için fiyat bulunamadı")
-					
-					break
-				except PWTimeoutError:
-					if attempt < retries:
-						page.wait_for_timeout(int(1000 * (attempt + 1) * random.uniform(1.0, 1.4)))
-						continue
-					else:
-						print(f"Atlandı (timeout): {city_name}")
-				except Exception as e:
-					if attempt < retries:
-						page.wait_for_timeout(int(800 * (attempt + 1) * random.uniform(1.0, 1.3)))
-						continue
-					else:
-						print(f"Hata/atlandı: {city_name} -> {e}")
-			
-			# Delay between cities
-			page.wait_for_timeout(int(1000 * random.uniform(min_delay, max_delay)))
-		
-		browser.close()
-		return saved
+			if isinstance(result, PWTimeoutError):
+				failed.append(city_name)
+				print(f"Atlandı (timeout): {city_name}")
+			elif isinstance(result, Exception):
+				failed.append(city_name)
+				print(f"Hata/atlandı: {city_name} -> {result}")
+			elif result is None:
+				failed.append(city_name)
+				print(f"Uyarı: {city_name} için fiyat bulunamadı")
+			else:
+				saved.append((idx, result))
+				print(f"OK: {city_name} -> {result.name}")
+	bucket.persist()
+	# Same order as the city links, whatever order the workers finished in
+	return SavedFiles((fp for _, fp in sorted(saved, key=lambda x: x[0])), failed)
 
 def fetch_all_cities_prices(output_dir: Path, url: str = TPPD_URL, debug: bool = False, min_delay: float = 0.8, max_delay: float = 1.6, retries: int = 1) -> None:
 	"""Automatically fetch all cities' prices (like Petrolofisi). Opens TPPD prices page, iterates all cities, writes per-city txt files."""